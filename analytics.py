@@ -0,0 +1,266 @@
+from neo4j import GraphDatabase
+import numpy as np
+import scipy.sparse as sp
+import argparse
+import json
+import os
+import threading
+import time
+
+import graph_version
+import link_prediction
+import rules
+import schema
+
+# --- GRAPH ANALYTICS ---
+# Structure metrics written back on every Person:
+#   p.degree    - number of distinct persons linked by RELATION_TYPES
+#   p.pagerank  - PageRank over the same graph (sums to 1)
+#   p.community - label propagation community, 0 = largest
+# The relationships are exported once into a link_prediction.FriendGraph, so
+# the same-house friendships implied by the House hub (rules.IMPLICIT_FRIENDS)
+# count as if stored and both modes give the same scores. PageRank is a power
+# iteration of sparse products; label propagation starts from the houses
+# (a house is a clique of friends) and moves every person at once to the
+# label most of its neighbours carry, until no label changes.
+# Scores are written in batches of BATCH_SIZE (indexed by the schema.py
+# migrations) and the graph version is bumped, so the search index, /winder
+# and the graph views reload them.
+# Run it on demand (this script, POST /api/admin/analytics) or on a schedule
+# (--every SECONDS, or cron). It needs the schema at the latest version (the
+# p.pagerank / p.community indexes) and stops with an error otherwise:
+# migrations are applied by get_insert.py or `python schema.py`, never from
+# the web process.
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "testpassword")
+BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "5000"))
+# Social relationships only: enmity does not make two persons a community
+RELATION_TYPES = ['FRIEND_OF', 'SAME_FAMILY', 'ROMANTIC_WITH']
+DAMPING = 0.85
+TOLERANCE = 1e-10
+MAX_ITERATIONS = 100
+MAX_PROPAGATIONS = 30
+# A run recorded as running but started longer ago belongs to a dead process
+STALE_SECONDS = int(os.getenv("ANALYTICS_STALE_SECONDS", "3600"))
+
+def fetch_persons(tx):
+    return tx.run("""
+        MATCH (p:Person)
+        WHERE p.name IS NOT NULL
+        RETURN p.name AS name, p.house AS house,
+               [(p)-[:BELONGS_TO]->(h:House) | h.name][0] AS hub
+        ORDER BY p.name
+    """).data()
+
+def fetch_edges(tx, types):
+    return tx.run("""
+        MATCH (a:Person)-[r]->(b:Person)
+        WHERE type(r) IN $types
+        RETURN a.name AS a, b.name AS b
+    """, {"types": types}).values()
+
+def load_graph(session, types=RELATION_TYPES):
+    persons = session.execute_read(fetch_persons)
+    edges = session.execute_read(fetch_edges, types)
+    return link_prediction.FriendGraph(persons, edges, rules.IMPLICIT_FRIENDS, rules.EXCLUDED_HOUSES)
+
+# --- METRICS ---
+
+def pagerank(graph, damping=DAMPING, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    # (scores, iterations); persons without links spread their rank evenly
+    n = len(graph)
+    if not n:
+        return np.zeros(0), 0
+    degree = graph.degree
+    dangling = degree == 0
+    inverse = np.where(dangling, 0.0, 1.0 / np.maximum(degree, 1.0))
+    rank = np.full(n, 1.0 / n)
+    for iteration in range(1, max_iterations + 1):
+        spread = graph.adjacency_dot(rank * inverse) + rank[dangling].sum() / n
+        new_rank = (1.0 - damping) / n + damping * spread
+        delta = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if delta < tolerance:
+            break
+    return rank, iteration
+
+def row_argmax(S):
+    # Column of the largest value of every row of a CSR matrix without empty
+    # rows, ties to the lowest column
+    rows = np.repeat(np.arange(S.shape[0]), np.diff(S.indptr))
+    order = np.lexsort((S.indices, -S.data, rows))
+    first = order[S.indptr[:-1]]
+    return S.indices[first]
+
+def label_propagation(graph, max_iterations=MAX_PROPAGATIONS):
+    # (community per person, iterations). Labels start as the house (or the
+    # person itself). Every person also votes for its current label and ties
+    # go to the lowest label, so the synchronous update settles instead of
+    # two neighbours swapping labels forever.
+    n = len(graph)
+    if not n:
+        return np.zeros(0, dtype=np.int64), 0
+    houses = {}
+    labels = np.array([houses.setdefault(rules.house_key(p), len(houses)) if rules.house_key(p) else -1
+                       for p in graph.persons], dtype=np.int64)
+    alone = labels < 0
+    labels[alone] = len(houses) + np.arange(alone.sum())
+    for iteration in range(1, max_iterations + 1):
+        L = sp.csr_matrix((np.ones(n), (np.arange(n), labels)), shape=(n, labels.max() + 1))
+        votes = graph.adjacency_times(L.T.tocsr()).T.tocsr() + L
+        votes.sum_duplicates()
+        new_labels = row_argmax(votes)
+        changed = int((new_labels != labels).sum())
+        labels = new_labels
+        if not changed:
+            break
+    # Communities numbered by size, largest first (ties by first member)
+    _, first, inverse, sizes = np.unique(labels, return_index=True, return_inverse=True, return_counts=True)
+    order = np.lexsort((first, -sizes))
+    number = np.empty(len(order), dtype=np.int64)
+    number[order] = np.arange(len(order))
+    return number[inverse], iteration
+
+# --- WRITE-BACK ---
+
+def write_scores(tx, rows):
+    tx.run("""
+        UNWIND $rows AS row
+        MATCH (p:Person {name: row.name})
+        SET p.pagerank = row.pagerank, p.degree = row.degree, p.community = row.community
+    """, {"rows": rows})
+
+def require_schema(session):
+    state = schema.status(session)
+    if state["pending"] or state["missing"]:
+        raise RuntimeError(f"Schema v{state['version']} is not at v{state['latest']} "
+                           f"(missing: {', '.join(state['missing']) or 'none'}), run python schema.py first")
+
+def run(batch_size=BATCH_SIZE, log=print):
+    start = time.perf_counter()
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), max_connection_pool_size=2)
+    try:
+        with driver.session() as session:
+            # The read paths order by p.pagerank (schema v5)
+            require_schema(session)
+            graph = load_graph(session)
+            loaded = time.perf_counter()
+            log(f"📊 Graph loaded: {len(graph)} persons, {graph.friendships()} links in {loaded - start:.2f}s")
+            rank, rank_iterations = pagerank(graph)
+            community, label_iterations = label_propagation(graph)
+            computed = time.perf_counter()
+            communities = int(community.max()) + 1 if len(community) else 0
+            log(f"  PageRank in {rank_iterations} iterations, {communities} communities in "
+                f"{label_iterations} iterations ({computed - loaded:.2f}s)")
+            for lo in range(0, len(graph), batch_size):
+                hi = min(lo + batch_size, len(graph))
+                session.execute_write(write_scores, [
+                    {"name": graph.names[i], "pagerank": float(rank[i]),
+                     "degree": int(graph.degree[i]), "community": int(community[i])}
+                    for i in range(lo, hi)
+                ])
+            session.execute_write(graph_version.bump)
+    finally:
+        driver.close()
+    stats = {
+        "persons": len(graph),
+        "communities": communities,
+        "pagerank_iterations": rank_iterations,
+        "propagation_iterations": label_iterations,
+        "seconds": round(time.perf_counter() - start, 3),
+        "finished_at": time.time()
+    }
+    log(f"✅ Wrote scores for {stats['persons']} persons in {stats['seconds']}s")
+    return stats
+
+# --- JOB STATUS ---
+# Kept on (:Meta {name: 'analytics'}), next to the graph version node; `last`
+# is the stats dict of the last successful run, as JSON.
+
+def claim_run(tx, now):
+    # Marks a run as started; False when one is already running
+    record = tx.run("""
+        MERGE (m:Meta {name: 'analytics'})
+        SET m.claim = $now
+        WITH m
+        WHERE NOT coalesce(m.running, false) OR m.started_at < $now - $stale
+        SET m.running = true, m.started_at = $now, m.error = null
+        RETURN count(m) AS claimed
+    """, {"now": now, "stale": STALE_SECONDS}).single()
+    return record["claimed"] > 0
+
+def finish_run(tx, last, error):
+    tx.run("""
+        MATCH (m:Meta {name: 'analytics'})
+        SET m.running = false, m.error = $error, m.last = coalesce($last, m.last)
+    """, {"last": json.dumps(last) if last is not None else None, "error": error})
+
+def read_status(tx):
+    record = tx.run("""
+        MATCH (m:Meta {name: 'analytics'})
+        RETURN m.running AS running, m.started_at AS started_at, m.last AS last, m.error AS error
+    """).single()
+    if record is None:
+        return {"running": False, "last": None, "error": None}
+    return {
+        "running": bool(record["running"]) and time.time() - record["started_at"] < STALE_SECONDS,
+        "last": json.loads(record["last"]) if record["last"] else None,
+        "error": record["error"]
+    }
+
+class AnalyticsJob:
+    # Runs the job in a background thread of the web process. The status is
+    # on the Meta node, so every worker of a pre-fork server reports the same
+    # run and none starts a second one while it is going.
+    def __init__(self, driver):
+        self.driver = driver
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def status(self):
+        with self.driver.session() as session:
+            return session.execute_read(read_status)
+
+    def start(self, batch_size=BATCH_SIZE):
+        # False when a run is already in progress
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            with self.driver.session() as session:
+                if not session.execute_write(claim_run, time.time()):
+                    return False
+            self._thread = threading.Thread(target=self._run, args=(batch_size,), name="graph-analytics", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, batch_size):
+        last, error = None, None
+        try:
+            last = run(batch_size)
+        except Exception as e:
+            error = str(e)
+            print(f"⚠️ Graph analytics failed: {e}")
+        try:
+            with self.driver.session() as session:
+                session.execute_write(finish_run, last, error)
+        except Exception as e:
+            print(f"⚠️ Could not record the graph analytics status: {e}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write PageRank, degree and community scores on every Person")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="persons per write transaction")
+    parser.add_argument("--every", type=float, metavar="SECONDS", help="keep running, once every SECONDS")
+    args = parser.parse_args()
+
+    while True:
+        try:
+            run(args.batch_size)
+        except Exception as e:
+            if not args.every:
+                raise
+            print(f"⚠️ Graph analytics failed: {e}")
+        if not args.every:
+            break
+        time.sleep(args.every)
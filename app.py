@@ -1,248 +1,361 @@
-from flask import Flask, render_template, request, jsonify
-import pickle
-import pandas as pd
-import numpy as np
-from neo4j import GraphDatabase
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, request, jsonify
+from neo4j import READ_ACCESS
+import gzip
+import hmac
+import io
+import json
 import os
+import threading
+
+import analytics
+import cache
+import db
+import ego_graph
+import feature_store
+import graph_summary
+import graph_version
+import layout
+import link_prediction
+import metrics
+import model_registry
+import profiler
+import registration
+import rules
+import scoring
+import search
 
 app = Flask(__name__)
+# Per-route latency histograms, served on /metrics
+metrics.instrument(app)
+# Slow-request sampling profiler, switchable at runtime on /api/profiler
+request_profiler = profiler.Profiler(
+    enabled=os.getenv("PROFILE_ENABLED", "0") == "1",
+    threshold=float(os.getenv("PROFILE_SLOW_MS", "1000")) / 1000,
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "10")) / 1000
+)
+profiler.instrument(app, request_profiler)
 
 # --- CONFIG ---
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "testpassword")
+# Admin endpoints (POST /api/profiler, /api/admin/*) require it in the
+# X-Admin-Token header; without it they are disabled (403)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def token_allowed(token):
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+def admin_allowed():
+    return token_allowed(request.headers.get('X-Admin-Token'))
+
+# Bolt pool settings. The driver itself is created on first use in each
+# process, so pre-fork workers (gunicorn.conf.py) each get their own pool.
+driver = db.ForkSafeDriver(
+    NEO4J_URI, (NEO4J_USER, NEO4J_PASSWORD),
+    fetch_size=int(os.getenv("NEO4J_FETCH_SIZE", "1000")),
+    max_connection_pool_size=int(os.getenv("NEO4J_POOL_SIZE", "50")),
+    connection_acquisition_timeout=float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30")),
+    session_wrapper=metrics.InstrumentedSession
+)
+POOL_WARM = int(os.getenv("NEO4J_POOL_WARM", "4"))
+# In-memory indexes and models warm up in background threads. A preloading
+# server sets WARM_IN_BACKGROUND=0 so they are built in the master before fork.
+WARM_IN_BACKGROUND = os.getenv("WARM_IN_BACKGROUND", "1") == "1"
+
+def warm_worker():
+    # Per-process start-up: open the Bolt pool and read the graph version
+    driver.warm(POOL_WARM)
+    version.current()
 
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+def read_records(tx, query, params=None):
+    return list(tx.run(query, params or {}))
 
-# --- ML MODEL LOADING ---
+# Used to invalidate in-process caches: the graph counter (ingestion,
+# analytics) and the users counter (registrations), the latter read at most
+# every REGISTRATION_REFRESH seconds (graph_version.py)
+REGISTRATION_REFRESH = float(os.getenv("REGISTRATION_REFRESH", "60"))
+version = graph_version.Versions(
+    graph_version.GraphVersion(driver, ttl=float(os.getenv("GRAPH_VERSION_TTL", "5"))),
+    graph_version.GraphVersion(driver, ttl=REGISTRATION_REFRESH, reader=graph_version.read_users)
+)
+
+# --- NAME SEARCH ---
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", "10"))
+SEARCH_MAX_LIMIT = 50
+search_index = search.SearchIndex(driver, version)
+search_index.warm(background=WARM_IN_BACKGROUND)
+
+# --- USER REGISTRATION ---
+# WRITE_BEHIND=1 queues registrations and writes them from a background thread
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"
+registration_queue = registration.RegistrationQueue(
+    driver,
+    maxsize=int(os.getenv("REGISTRATION_QUEUE_SIZE", "1000")),
+    batch_size=int(os.getenv("REGISTRATION_BATCH_SIZE", "100"))
+) if WRITE_BEHIND else None
+
+def save_registrations(registrations):
+    # The local house index learns the users at once; views and the other
+    # workers see them within REGISTRATION_REFRESH (no touch(), which would
+    # rebuild every view of this process on each registration)
+    for r in registrations:
+        house_index.set(r["name"], r["house"])
+    if registration_queue:
+        for r in registrations:
+            registration_queue.submit(r)
+    else:
+        registration.write_registrations(driver, registrations)
+
+# --- ML MODELS ---
+# Loaded lazily by the registry and swapped in when the files change on disk
+# (retrain with train_fix.py, then compiled_model.py). Set USE_COMPILED_MODELS=0
+# to ignore the compiled .npz exports.
 MODEL_FILE = "house_classifier.pkl"
 ENCODERS_FILE = "encoders.pkl"
+SURVIVAL_MODEL_FILE = "survival_model.pkl"
+SURVIVAL_ENCODER_FILE = "survival_encoder.pkl"
+USE_COMPILED_MODELS = os.getenv("USE_COMPILED_MODELS", "1") == "1"
 
-try:
-    with open(MODEL_FILE, 'rb') as f:
-        model = pickle.load(f)
-    with open(ENCODERS_FILE, 'rb') as f:
-        encoders = pickle.load(f)
-    print("✅ ML Model Loaded")
-except FileNotFoundError:
-    print("⚠️ ML Model not found. Training now...")
-    import ml_model
-    ml_model.train_model()
-    with open(MODEL_FILE, 'rb') as f:
-        model = pickle.load(f)
-    with open(ENCODERS_FILE, 'rb') as f:
-        encoders = pickle.load(f)
-    print("✅ ML Model Trained and Loaded")
+models = model_registry.ModelRegistry(
+    check_interval=float(os.getenv("MODEL_CHECK_INTERVAL", "5")),
+    use_compiled=USE_COMPILED_MODELS
+)
+models.register('house', MODEL_FILE, ENCODERS_FILE)
+models.register('survival', SURVIVAL_MODEL_FILE, SURVIVAL_ENCODER_FILE)
+models.warm(background=WARM_IN_BACKGROUND)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/predict', methods=['POST'])
-def predict():
+# --- HOUSE FEATURES ---
+# Neighbour houses come from the in-memory feature store index, no Bolt round-trip
+FEATURE_COLUMNS = feature_store.FEATURE_COLUMNS
+house_index = feature_store.HouseIndex(driver, version)
+
+# --- PREDICTION CACHE ---
+# Predictions keyed on the model inputs and the model file signature: the
+# house feature vector (the neighbour houses of the profile, from the
+# in-memory index) or the survival counts and house. No graph version in the
+# keys, so a registration does not make the next identical profile miss.
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "600"))
+house_prediction_cache = metrics.CACHE_REQUESTS.add("house_prediction", cache.LRUCache(
+    maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL))
+survival_prediction_cache = metrics.CACHE_REQUESTS.add("survival_prediction", cache.LRUCache(
+    maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL))
+
+def house_prediction_key(model, features):
+    return (tuple(features), model.signature)
+
+# Handlers return (body, status) and are shared with the async app
+def predict_house(data):
+    model = models.get('house')
     if not model:
-        return jsonify({'error': 'Model not loaded'}), 500
+        return {'error': 'Model not loaded'}, 500
 
-    data = request.json
     name = data.get('name', 'Unknown')
     
-    friends = data.get('friends', [])
-    enemies = data.get('enemies', [])
-    family = data.get('family', [])
-    partners = data.get('partners', []) # List?
-    
     # Process features: Count houses for each group
-    # We need to look up these people in DB to see their houses.
-    
-    def get_house_counts(names):
-        if not names:
-            return {'Gryffindor': 0, 'Slytherin': 0, 'Ravenclaw': 0, 'Hufflepuff': 0}
-            
-        with driver.session() as session:
-            result = session.run("""
-                MATCH (p:Person)
-                WHERE p.name IN $names
-                RETURN p.house, count(p) as c
-            """, {"names": names})
-            
-            counts = {'Gryffindor': 0, 'Slytherin': 0, 'Ravenclaw': 0, 'Hufflepuff': 0}
-            for r in result:
-                h = r['p.house']
-                c = r['c']
-                if h in counts:
-                    counts[h] += c
-            return counts
-
-    f_counts = get_house_counts(friends)
-    e_counts = get_house_counts(enemies)
-    fam_counts = get_house_counts(family)
-    p_counts = get_house_counts(partners)
-    
-    # Feature Vector (order must match training)
-    features = [
-        f_counts['Gryffindor'], f_counts['Slytherin'], f_counts['Ravenclaw'], f_counts['Hufflepuff'],
-        e_counts['Gryffindor'], e_counts['Slytherin'], e_counts['Ravenclaw'], e_counts['Hufflepuff'],
-        fam_counts['Gryffindor'], fam_counts['Slytherin'], fam_counts['Ravenclaw'], fam_counts['Hufflepuff'],
-        p_counts['Gryffindor'], p_counts['Slytherin'], p_counts['Ravenclaw'], p_counts['Hufflepuff']
-    ]
-    
-    # Predict
-    df = pd.DataFrame([features], columns=[
-        'friend_g', 'friend_s', 'friend_r', 'friend_h',
-        'enemy_g', 'enemy_s', 'enemy_r', 'enemy_h',
-        'fam_g', 'fam_s', 'fam_r', 'fam_h',
-        'love_g', 'love_s', 'love_r', 'love_h'
-    ])
-    
-    prediction = model.predict(df)[0]
+    features = feature_store.profile_features(data, house_index.houses())
+    key = house_prediction_key(model, features)
+    prediction = house_prediction_cache.get(key)
+    if prediction is None:
+        prediction = str(model.predict([features], FEATURE_COLUMNS)[0])
+        house_prediction_cache.set(key, prediction)
     
     # "Enregistrer mon nom" - Save User to Graph? only if name is provided
     if name and name != "Unknown":
-        with driver.session() as session:
-            # Create User Node
-             session.run("""
-                MERGE (u:Person {name: $name})
-                SET u.house = $house, u.isUser = true
-            """, {"name": name, "house": prediction})
-            
-            # Create Relationships (Optional but cool)
-             if friends:
-                 session.run("""
-                    MATCH (u:Person {name: $name}), (f:Person)
-                    WHERE f.name IN $friends
-                    MERGE (u)-[:FRIEND_OF]->(f)
-                 """, {"name": name, "friends": friends})
-             if enemies:
-                 session.run("""
-                    MATCH (u:Person {name: $name}), (e:Person)
-                    WHERE e.name IN $enemies
-                    MERGE (u)-[:ENEMY_OF]->(e)
-                 """, {"name": name, "enemies": enemies})
-             if family:
-                 session.run("""
-                    MATCH (u:Person {name: $name}), (fam:Person)
-                    WHERE fam.name IN $family
-                    MERGE (u)-[:SAME_FAMILY]->(fam)
-                 """, {"name": name, "family": family})
-             if partners:
-                 session.run("""
-                    MATCH (u:Person {name: $name}), (p:Person)
-                    WHERE p.name IN $partners
-                    MERGE (u)-[:ROMANTIC_WITH]->(p)
-                 """, {"name": name, "partners": partners})
-
-# ... Helper function or imports if needed
-
-# --- SURVIVAL MODEL LOADING ---
-SURVIVAL_MODEL_FILE = "survival_model.pkl"
-SURVIVAL_ENCODER_FILE = "survival_encoder.pkl"
+        save_registrations([registration.build_registration(name, prediction, data)])
 
-try:
-    with open(SURVIVAL_MODEL_FILE, 'rb') as f:
-        survival_model = pickle.load(f)
-    with open(SURVIVAL_ENCODER_FILE, 'rb') as f:
-        survival_le = pickle.load(f)
-    print("✅ Survival Model Loaded")
-except FileNotFoundError:
-    print("⚠️ Survival Model missing")
-    survival_model = None
-    survival_le = None
+    return {'name': name, 'house': str(prediction)}, 200
 
-@app.route('/predict_survival', methods=['POST'])
-def predict_survival():
+@app.route('/predict', methods=['POST'])
+def predict():
+    body, status = predict_house(request.json)
+    return jsonify(body), status
+
+def predict_houses(data):
+    model = models.get('house')
+    if not model:
+        return {'error': 'Model not loaded'}, 500
+
+    profiles = data.get('profiles', [])
+    if not profiles:
+        return [], 200
+
+    # Cached profiles first, then one vectorised predict for the others
+    houses = house_index.houses()
+    features = [feature_store.profile_features(p, houses) for p in profiles]
+    keys = [house_prediction_key(model, f) for f in features]
+    predictions = [house_prediction_cache.get(key) for key in keys]
+    missing = [i for i, h in enumerate(predictions) if h is None]
+    if missing:
+        rows = [features[i] for i in missing]
+        for i, h in zip(missing, model.predict(rows, FEATURE_COLUMNS)):
+            predictions[i] = str(h)
+            house_prediction_cache.set(keys[i], predictions[i])
+
+    save_registrations([
+        registration.build_registration(p['name'], h, p)
+        for p, h in zip(profiles, predictions)
+        if p.get('name') and p.get('name') != "Unknown"
+    ])
+
+    return [
+        {'name': p.get('name', 'Unknown'), 'house': str(h)}
+        for p, h in zip(profiles, predictions)
+    ], 200
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    body, status = predict_houses(request.json)
+    return jsonify(body), status
+
+def predict_alive(data):
+    survival_model = models.get('survival')
     if not survival_model:
-        return jsonify({'error': 'Survival Model not loaded'}), 500
+        return {'error': 'Survival Model not loaded'}, 500
         
-    data = request.json
-    friends = data.get('friends', [])
-    enemies = data.get('enemies', [])
-    family = data.get('family', [])
-    house = data.get('house', 'Gryffindor')
+    # Features: friends_count, enemy_count, fam_count (list lengths, as sent),
+    # house_code encoded as the bulk job does (scoring.py)
+    counts = tuple(len(data.get(key) or []) for key in ('friends', 'enemies', 'family'))
+    house = data.get('house', scoring.SURVIVAL_FALLBACK_HOUSE)
     
-    # Features: friends_count, enemy_count, fam_count, house_code
-    f_count = len(friends)
-    e_count = len(enemies)
-    fam_count = len(family)
+    key = counts + (house, survival_model.signature)
+    alive = survival_prediction_cache.get(key)
+    if alive is not None:
+        return {'alive': alive}, 200
     
-    try:
-        # Check if house is valid
-        if house not in survival_le.classes_:
-             house = 'Gryffindor' # Fallback
-        house_code = survival_le.transform([house])[0]
-    except:
-        house_code = 0 
-        
-    df = pd.DataFrame([[f_count, e_count, fam_count, house_code]], 
-                      columns=['friends_count', 'enemy_count', 'fam_count', 'house_code'])
-                      
-    pred = survival_model.predict(df)[0]
+    rows = scoring.survival_rows([counts], [house], survival_model)
+    pred = survival_model.predict(rows, scoring.SURVIVAL_COLUMNS)[0]
+    survival_prediction_cache.set(key, bool(pred))
     
-    return jsonify({'alive': bool(pred)})
+    return {'alive': bool(pred)}, 200
+
+@app.route('/predict_survival', methods=['POST'])
+def predict_survival():
+    body, status = predict_alive(request.json)
+    return jsonify(body), status
 
 @app.route('/characters')
 def characters_page():
     return render_template('characters.html')
 
+# --- CHARACTER LISTING ---
+# Bodies are serialised once per (fields, page, graph version) straight from
+# the driver records into a (gzip) buffer and served from an LRU afterwards.
+CHARACTER_FIELDS = ['name', 'house', 'species', 'alive', 'image']
+CHARACTER_EXTRA_FIELDS = ['gender', 'id']
+CHARACTERS_MAX_LIMIT = 1000
+CHARACTERS_GZIP = os.getenv("CHARACTERS_GZIP", "1") == "1"
+characters_cache = metrics.CACHE_REQUESTS.add("characters", cache.LRUCache(
+    maxsize=int(os.getenv("CHARACTERS_CACHE_SIZE", "64"))))
+
+def character_fields(param):
+    if not param:
+        return CHARACTER_FIELDS
+    allowed = CHARACTER_FIELDS + CHARACTER_EXTRA_FIELDS
+    fields = []
+    for f in param.split(','):
+        f = f.strip()
+        if f in allowed and f not in fields:
+            fields.append(f)
+    return fields or CHARACTER_FIELDS
+
+def serialise_characters(records, fields, limit):
+    buf = io.BytesIO()
+    out = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) if CHARACTERS_GZIP else buf
+    out.write(b'[' if limit is None else b'{"characters": [')
+    count = 0
+    last_name = None
+    for record in records:
+        p = record['p']
+        if count:
+            out.write(b',')
+        out.write(json.dumps({f: p.get(f) for f in fields}).encode('utf-8'))
+        last_name = record['name']
+        count += 1
+    if limit is None:
+        out.write(b']')
+    else:
+        # Keyset cursor: pass it back as ?after= to get the next page
+        next_after = last_name if count == limit else None
+        out.write(b'], "next": ' + json.dumps(next_after).encode('utf-8') + b'}')
+    if out is not buf:
+        out.close()
+    return buf.getvalue()
+
+def read_characters(tx, query, params, fields, limit):
+    return serialise_characters(tx.run(query, params), fields, limit)
+
 @app.route('/api/characters')
 def get_all_characters():
-    with driver.session() as session:
-        result = session.run("""
+    fields = character_fields(request.args.get('fields'))
+    after = request.args.get('after')
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, CHARACTERS_MAX_LIMIT))
+
+    key = (tuple(fields), after, limit, version.current())
+    body = characters_cache.get(key)
+    if body is None:
+        # Only the requested properties are projected; the name cursor is
+        # served by the person_name constraint index.
+        projection = ", ".join(f".{f}" for f in fields)
+        where = "WHERE p.name > $after" if after is not None else "WHERE p.name IS NOT NULL"
+        query = f"""
             MATCH (p:Person)
-            RETURN p
-            ORDER BY p.name
-        """)
-        chars = []
-        for record in result:
-            p = record['p']
-            chars.append({
-                "name": p.get("name"),
-                "house": p.get("house"),
-                "species": p.get("species"),
-                "alive": p.get("alive"),
-                "image": p.get("image")
-            })
-        return jsonify(chars)
+            {where}
+            RETURN p {{{projection}}} AS p, p.name AS name
+            ORDER BY name
+            {"LIMIT $limit" if limit is not None else ""}
+        """
+        with driver.session() as session:
+            body = session.execute_read(read_characters, query, {"after": after, "limit": limit}, fields, limit)
+        characters_cache.set(key, body)
+
+    if not CHARACTERS_GZIP:
+        return Response(body, mimetype='application/json')
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = Response(body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(body), mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# --- WINDER (LINK PREDICTION) ---
+# Scores come from the in-memory sparse FRIEND_OF matrix (link_prediction.py).
+# WINDER_PRECOMPUTE=k also keeps top-k candidate lists per existing person.
+# The matrix is rebuilt at most every WINDER_REBUILD_INTERVAL seconds.
+WINDER_MATCHES = 3
+link_predictor = link_prediction.LinkPredictor(
+    driver, version, precompute_k=int(os.getenv("WINDER_PRECOMPUTE", "0")),
+    min_interval=float(os.getenv("WINDER_REBUILD_INTERVAL", "30"))
+)
 
 @app.route('/winder', methods=['POST'])
 def winder_match():
     data = request.json
     friends = data.get('friends', [])
-    
+    metric = data.get('metric', request.args.get('metric', 'common_neighbours'))
+    metric = link_prediction.METRIC_ALIASES.get(metric, metric)
+    if metric not in link_prediction.METRICS:
+        return jsonify({'error': f'Unknown metric, use one of {", ".join(link_prediction.METRICS)}'}), 400
+
+    graph = link_predictor.current()
     if not friends:
+        # Existing characters can be served from their precomputed list
+        matches = link_predictor.recommend_for(graph, data.get('name'), metric, WINDER_MATCHES)
+        if matches is not None:
+            return jsonify(matches)
         return jsonify({'error': 'No friends provided to base matches on!'}), 400
-        
-    with driver.session() as session:
-        # Link Prediction: Common Neighbors
-        # "Find people who are friends with my friends"
-        query = """
-        MATCH (f:Person)
-        WHERE f.name IN $friends
-        MATCH (f)-[:FRIEND_OF]-(candidate:Person)
-        WHERE NOT candidate.name IN $friends
-        
-        WITH candidate, count(f) as common_friends, collect(f.name) as shared_with
-        RETURN candidate.name as name, 
-               candidate.house as house, 
-               candidate.image as image, 
-               common_friends,
-               shared_with
-        ORDER BY common_friends DESC
-        LIMIT 3
-        """
-        
-        result = session.run(query, {"friends": friends})
-        matches = []
-        for r in result:
-             matches.append({
-                 "name": r["name"],
-                 "house": r["house"],
-                 "image": r["image"],
-                 "score": r["common_friends"],
-                 "reason": r["shared_with"]
-             })
-             
-             
-    return jsonify(matches)
+
+    # Link Prediction: "Find people who are friends with my friends"
+    return jsonify(graph.recommend(friends, metric, WINDER_MATCHES))
 
 @app.route('/graph')
 def graph_page():
@@ -250,117 +363,377 @@ def graph_page():
 
 
 
-@app.route('/api/graph/<name>')
-def get_graph(name):
-    with driver.session() as session:
-        # 1. Fetch direct connections (Person -[r]- Other)
-        result = session.run("""
-            MATCH (p:Person {name: $name})-[r]-(m)
-            RETURN p, r, m
-            LIMIT 500
-        """, {"name": name})
+# --- GRAPH VIEWS ---
+# Queries and record -> Cytoscape elements builders are shared with the async
+# app (asgi_app.py), so both serve the same JSON.
+GRAPH_QUERY = metrics.name_query("graph_direct", """
+    MATCH (p:Person {name: $name})-[r]-(m)
+    RETURN p, r, m
+    LIMIT $limit
+""")
+GRAPH_LIMIT = 500
+GRAPH_FALLBACK_LIMIT = 50
+HOUSEMATES_QUERY = metrics.name_query("graph_housemates", """
+    MATCH (p:Person {name: $target_name})-[:BELONGS_TO]->(h:House)<-[:BELONGS_TO]-(mate:Person)
+    RETURN p, h, mate
+    LIMIT 100
+""")
+# Most central persons first (p.pagerank, analytics.py), so the LIMIT keeps
+# the core of the houses rather than an arbitrary part
+HOUSES_PERSONS_QUERY = metrics.name_query("houses_persons", """
+    MATCH (p:Person)
+    WHERE p.house IN $houses
+    WITH p ORDER BY coalesce(p.pagerank, 0.0) DESC, p.name
+    OPTIONAL MATCH (p)-[r]-(m:Person)
+    WHERE m.house IN $houses
+    RETURN p, r, m
+    LIMIT 5000
+""")
+HOUSES_QUERY = metrics.name_query("houses_belongs_to", """
+    MATCH (h:House)
+    WHERE h.name IN $houses
+    OPTIONAL MATCH (p:Person)-[r:BELONGS_TO]->(h)
+    RETURN h, r, p
+""")
+
+# Element generators yield ("nodes" | "edges", data) and skip nodes already
+# in `seen`; the full views collect them, the streaming views write them as
+# NDJSON lines as the records arrive.
+
+def person_id(node):
+    # Nodes without an id fall back to their name, as in ego_graph.py and
+    # graph_summary.py (users always have one since schema v7)
+    return node.get("id", node.get("name"))
+
+def housemate_elements(records, seen):
+    # Housemates Connections (Source=Mate, Target=House, Rel=Implicit BELONGS_TO)
+    # Note: In the query `(p)->(h)<-[mate]`, we want to show the connection `mate->h`.
+    # And we assume `p->h` is already covered by the direct connections query if `p` has a house.
+    # The first query `MATCH (p)-[r]-(m)` matches ANY neighbor `m`, so if `p` is connected to House, it shows up.
+    # So we just need to add `mate -> House`.
+    for record in records:
+        h = record['h']
+        mate = record['mate']
         
-        nodes = []
-        edges = []
-        added_nodes = set()
+        h_data = {"id": h.get("id", h["name"]), "label": h["name"], "group": "house"}
+        mate_label = mate.get("name", "Unknown")
+        mate_data = {"id": person_id(mate), "label": mate_label, "group": "person", "house": mate.get("house")}
         
-        records = list(result)
+        # Add House Node
+        if h_data["id"] not in seen:
+            seen.add(h_data["id"])
+            yield "nodes", h_data
         
-        # If input not found directly, try partial match for the MAIN person
-        if not records:
-             # Try Partial match to find the main person 'p'
-            result = session.run("""
-                MATCH (p:Person)-[r]-(m)
-                WHERE toLower(p.name) CONTAINS toLower($name)
-                RETURN p, r, m
-                LIMIT 50
-            """, {"name": name})
-            records = list(result)
-
-        # 2. Fetch Housemates (Person -> House <- Mate) using the NAME found in records (or input name if exact)
-        # We need to know the specific 'p' we are dealing with to find its housemates correctly.
-        # Let's extract 'p' from the first record if available, or just use the name input if we assume exact match logic.
+        # Add Mate Node
+        if mate_data["id"] not in seen:
+            seen.add(mate_data["id"])
+            yield "nodes", mate_data
         
-        target_name = name
-        if records:
-             target_name = records[0]['p']['name']
+        # Add Edge (Mate -> House)
+        yield "edges", {"source": mate_data["id"], "target": h_data["id"], "label": "BELONGS_TO"}
 
-        housemates_result = session.run("""
-            MATCH (p:Person {name: $target_name})-[:BELONGS_TO]->(h:House)<-[:BELONGS_TO]-(mate:Person)
-            RETURN h, mate
-            LIMIT 100
-        """, {"target_name": target_name})
+        # Implied same-house friendship (rules.IMPLICIT_FRIENDS), drawn the way
+        # the stored rule edge was: from the first name to the second
+        if rules.IMPLICIT_FRIENDS and h["name"] not in rules.EXCLUDED_HOUSES:
+            a, b = sorted([record['p'], mate], key=lambda n: n["name"])
+            yield "edges", {"source": person_id(a), "target": person_id(b), "label": "FRIEND_OF", "implied": True}
+
+def direct_elements(records, seen):
+    for record in records:
+        p = record['p']
+        m = record['m']
+        r = record['r']
         
-        housemates_records = list(housemates_result)
+        p_data = {"id": person_id(p), "label": p.get("name", "Unknown"), "group": "person", "house": p.get("house")}
+        m_label = m.get("name", m.get("id"))
+        m_group = "house" if "House" in m.labels else "person"
+        m_data = {"id": m.get("id", m_label), "label": m_label, "group": m_group}
         
-        # Helper to process records
-        all_records = []
+        if p_data["id"] not in seen:
+            seen.add(p_data["id"])
+            yield "nodes", p_data
         
-        # Add Direct Connections
-        for record in records:
-            all_records.append({
-                'source': record['p'],
-                'target': record['m'],
-                'rel': record['r']
-            })
+        if m_data["id"] not in seen:
+            seen.add(m_data["id"])
+            yield "nodes", m_data
             
-        # Add Housemates Connections (Source=Mate, Target=House, Rel=Implicit BELONGS_TO)
-        # Note: In the query `(p)->(h)<-[mate]`, we want to show the connection `mate->h`.
-        # And we assume `p->h` is already covered by the direct connections query if `p` has a house.
-        # But wait, `p-[r]-m` might NOT include `p->House` if `m` is only People?
-        # The first query `MATCH (p)-[r]-(m)` matches ANY neighbor `m`, so if `p` is connected to House, it shows up.
-        # So we just need to add `mate -> House`.
+        yield "edges", {"source": p_data["id"], "target": m_data["id"], "label": r.type}
+
+def house_person_elements(records, seen):
+    # Persons and Internal Relationships
+    for record in records:
+        p = record['p']
+        r = record['r']
+        m = record['m']
         
-        for record in housemates_records:
-            h = record['h']
-            mate = record['mate']
-            # Create a fake relationship object or just dict for consistency
-            # Neo4j python driver returns Relationship objects, but we can mock it or just handle data directly.
-            # Only need type for the graph.
-            
-            # Check if this edge is already added? 
-            # We filter by nodes later, but explicit edges need handling.
-            # Let's just add to nodes/edges lists directly.
-            
-            h_data = {"id": h.get("id", h["name"]), "label": h["name"], "group": "house"}
-            mate_label = mate.get("name", "Unknown")
-            mate_data = {"id": mate["id"], "label": mate_label, "group": "person", "house": mate.get("house")}
-            
-            # Add House Node
-            if h_data["id"] not in added_nodes:
-                nodes.append({"data": h_data})
-                added_nodes.add(h_data["id"])
-            
-            # Add Mate Node
-            if mate_data["id"] not in added_nodes:
-                nodes.append({"data": mate_data})
-                added_nodes.add(mate_data["id"])
-            
-            # Add Edge (Mate -> House)
-            edges.append({"data": {"source": mate_data["id"], "target": h_data["id"], "label": "BELONGS_TO"}})
-
-        # Process Direct Connections
-        for record in records:
-            p = record['p']
-            m = record['m']
-            r = record['r']
+        p_data = {"id": person_id(p), "label": p.get("name", "Unknown"), "group": "person", "house": p.get("house")}
+        
+        if p_data["id"] not in seen:
+            seen.add(p_data["id"])
+            yield "nodes", p_data
             
-            p_data = {"id": p["id"], "label": p.get("name", "Unknown"), "group": "person", "house": p.get("house")}
+        if r and m:
             m_label = m.get("name", m.get("id"))
-            m_group = "house" if "House" in m.labels else "person"
-            m_data = {"id": m.get("id", m_label), "label": m_label, "group": m_group}
+            m_data = {"id": m.get("id", m_label), "label": m_label, "group": "person", "house": m.get("house")}
             
-            if p_data["id"] not in added_nodes:
-                nodes.append({"data": p_data})
-                added_nodes.add(p_data["id"])
+            if m_data["id"] not in seen:
+                seen.add(m_data["id"])
+                yield "nodes", m_data
             
-            if m_data["id"] not in added_nodes:
-                nodes.append({"data": m_data})
-                added_nodes.add(m_data["id"])
-                
-            edges.append({"data": {"source": p_data["id"], "target": m_data["id"], "label": r.type}})
+            yield "edges", {"source": p_data["id"], "target": m_data["id"], "label": r.type}
+
+def house_hub_elements(records, seen):
+    # House Nodes and BELONGS_TO Relationships
+    # This ensures the "House Connection" filter works and we see the House Node hub.
+    for record in records:
+        h = record['h']
+        r = record['r']
+        p = record['p']
+        
+        h_data = {"id": h.get("id", h["name"]), "label": h["name"], "group": "house"}
+        if h_data["id"] not in seen:
+            seen.add(h_data["id"])
+            yield "nodes", h_data
+            
+        if r and p:
+             p_id = person_id(p)
+             # p should already be in nodes from step 1, but we check to be safe or if unconnected otherwise
+             if p_id in seen:
+                 yield "edges", {"source": p_id, "target": h_data["id"], "label": "BELONGS_TO"}
+
+def collect_elements(*generators):
+    elements = {"nodes": [], "edges": []}
+    for generator in generators:
+        for group, data in generator:
+            elements[group].append({"data": data})
+    return {"elements": elements}
+
+def person_graph(records, housemates_records):
+    seen = set()
+    return collect_elements(housemate_elements(housemates_records, seen), direct_elements(records, seen))
+
+def houses_graph(person_records, house_records):
+    seen = set()
+    return collect_elements(house_person_elements(person_records, seen), house_hub_elements(house_records, seen))
+
+def ndjson_lines(generator, positions=None, collected=None):
+    # One Cytoscape element per line, ready for cy.add(). Nodes carry their
+    # cached `positions`; `collected` (a LayoutCollector) keeps the node ids
+    # and edge ends to lay out once the stream is over.
+    for group, data in generator:
+        element = {"group": group, "data": data}
+        if positions is not None and group == "nodes" and data["id"] in positions:
+            element["position"] = positions[data["id"]]
+        if collected is not None:
+            collected.add(group, data)
+        yield json.dumps(element) + "\n"
+
+def first_person(records, found):
+    # Passes records through, noting the main person's name
+    for record in records:
+        if not found:
+            found.append(record['p']['name'])
+        yield record
+
+def stream_person_graph(name, key=None):
+    # Same elements as get_graph, direct connections first (the housemates
+    # query needs the matched name). Records are read in fetch_size batches
+    # inside one read transaction and written out as they arrive.
+    positions, collected = stream_layout(key)
+    with driver.session(default_access_mode=READ_ACCESS) as session:
+        with session.begin_transaction() as raw_tx:
+            tx = metrics.TimedTransaction(raw_tx, "graph_stream")
+            seen = set()
+            found = []
+            yield from ndjson_lines(direct_elements(
+                first_person(tx.run(GRAPH_QUERY, {"name": name, "limit": GRAPH_LIMIT}), found), seen),
+                positions, collected)
+            if not found:
+                matches = search_index.search(name, 1)
+                if matches:
+                    yield from ndjson_lines(direct_elements(first_person(
+                        tx.run(GRAPH_QUERY, {"name": matches[0], "limit": GRAPH_FALLBACK_LIMIT}), found), seen),
+                        positions, collected)
+            target_name = found[0] if found else name
+            yield from ndjson_lines(housemate_elements(
+                tx.run(HOUSEMATES_QUERY, {"target_name": target_name}), seen), positions, collected)
+            tx.finish()
+    finish_layout(key, collected)
+
+def stream_houses_graph(houses, key=None):
+    positions, collected = stream_layout(key)
+    with driver.session(default_access_mode=READ_ACCESS) as session:
+        with session.begin_transaction() as raw_tx:
+            tx = metrics.TimedTransaction(raw_tx, "houses_stream")
+            seen = set()
+            yield from ndjson_lines(house_person_elements(tx.run(HOUSES_PERSONS_QUERY, {"houses": houses}), seen),
+                                    positions, collected)
+            yield from ndjson_lines(house_hub_elements(tx.run(HOUSES_QUERY, {"houses": houses}), seen),
+                                    positions, collected)
+            tx.finish()
+    finish_layout(key, collected)
+
+NDJSON = 'application/x-ndjson'
+
+# Server-side layout (layout.py): node positions per view and graph version,
+# so the page renders with Cytoscape's `preset` layout instead of running
+# `cose` in the browser. ?layout=0 leaves the layout to the client.
+# Layouts are computed off the request path: a view whose positions are not
+# cached yet is served without them (the page runs cose) and queued for the
+# layout thread, so the next request for it gets them. Views above
+# LAYOUT_MAX_NODES are never laid out on the server.
+SERVER_LAYOUT = os.getenv("SERVER_LAYOUT", "1") == "1"
+LAYOUT_MAX_NODES = int(os.getenv("LAYOUT_MAX_NODES", "5000"))
+LAYOUT_QUEUE = 8
+layout_cache = metrics.CACHE_REQUESTS.add("layout", cache.LRUCache(
+    maxsize=int(os.getenv("LAYOUT_CACHE_SIZE", "128"))))
+# One thread per process, started on the first submit (after fork)
+layout_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="layout")
+layout_pending = set()
+layout_lock = threading.Lock()
+
+def layout_key(args, *view):
+    # None when no layout was asked for
+    if not SERVER_LAYOUT or args.get('layout') == '0':
+        return None
+    return view + (version.current(),)
+
+def compute_layout(key, ids, edges):
+    try:
+        layout_cache.set(key, layout.compute_graph(ids, edges))
+    except Exception as e:
+        print(f"⚠️ Layout failed: {e}")
+    finally:
+        with layout_lock:
+            layout_pending.discard(key)
+
+def schedule_layout(key, ids, edges):
+    # Queues the layout of a view unless it is too big, already queued, or
+    # the queue is full (a later request queues it again)
+    if len(ids) > LAYOUT_MAX_NODES:
+        return
+    with layout_lock:
+        if key in layout_pending or len(layout_pending) >= LAYOUT_QUEUE:
+            return
+        layout_pending.add(key)
+    layout_pool.submit(compute_layout, key, ids, edges)
+
+def with_layout(key, graph):
+    if key is None:
+        return graph
+    positions = layout_cache.get(key)
+    if positions is None:
+        schedule_layout(key, *layout.graph_edges(graph["elements"]))
+        return graph
+    # A copy: `graph` may be shared through summary_cache
+    return {**graph, "elements": layout.positioned(graph["elements"], positions), "layout": {"name": "preset"}}
+
+class LayoutCollector:
+    # Node ids and edge ends of a streamed view, dropped past LAYOUT_MAX_NODES
+    def __init__(self):
+        self.ids = []
+        self.edges = []
+
+    def add(self, group, data):
+        if self.ids is None:
+            return
+        if group == "nodes":
+            self.ids.append(data["id"])
+            if len(self.ids) > LAYOUT_MAX_NODES:
+                self.ids = self.edges = None
+        else:
+            self.edges.append((data["source"], data["target"], data.get("weight", 1)))
+
+def stream_layout(key):
+    # (cached positions, None), or (None, a LayoutCollector) when the view is
+    # laid out after the stream
+    if key is None:
+        return None, None
+    positions = layout_cache.get(key)
+    if positions is not None:
+        return positions, None
+    return None, LayoutCollector()
+
+def finish_layout(key, collected):
+    # End of a stream: queues the layout of what was collected
+    if collected is not None and collected.ids is not None:
+        schedule_layout(key, collected.ids, collected.edges)
+
+# Level-of-detail view (graph_summary.py), cached per graph version
+summary_cache = metrics.CACHE_REQUESTS.add("summary", cache.LRUCache(
+    maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", "64"))))
+
+def summary_key(houses, top, expand):
+    # Cache key of a summary; key[1] is `top` clamped to MAX_PERSONS
+    top = max(0, min(top, graph_summary.MAX_PERSONS))
+    return (tuple(houses), top, tuple(sorted(expand.items())), version.current())
+
+def houses_summary(houses, top, expand):
+    key = summary_key(houses, top, expand)
+    summary = summary_cache.get(key)
+    if summary is None:
+        with driver.session() as session:
+            summary = session.execute_read(graph_summary.summarise, houses, key[1], expand)
+        summary_cache.set(key, summary)
+    return summary
+
+# k-hop view (ego_graph.py), cached per graph version
+ego_cache = metrics.CACHE_REQUESTS.add("ego", cache.LRUCache(
+    maxsize=int(os.getenv("EGO_CACHE_SIZE", "128"))))
+
+def ego_key(name, depth, fanout, types):
+    return (name, depth, fanout, types, version.current())
+
+def ego(name, depth, fanout, types):
+    key = ego_key(name, depth, fanout, types)
+    graph = ego_cache.get(key)
+    if graph is None:
+        with driver.session() as session:
+            graph = session.execute_read(ego_graph.expand, name, depth, fanout, types)
+            if graph is None:
+                # Partial match through the in-memory name index
+                matches = search_index.search(name, 1)
+                if matches:
+                    graph = session.execute_read(ego_graph.expand, matches[0], depth, fanout, types)
+        graph = graph or ego_graph.empty(depth, fanout)
+        ego_cache.set(key, graph)
+    return graph
 
-        return jsonify({"elements": {"nodes": nodes, "edges": edges}})
+@app.route('/api/graph/<name>')
+def get_graph(name):
+    if 'depth' in request.args:
+        # Bounded k-hop exploration instead of direct connections + housemates
+        depth = max(1, min(request.args.get('depth', 1, type=int), ego_graph.MAX_DEPTH))
+        fanout = max(1, min(request.args.get('fanout', ego_graph.DEFAULT_FANOUT, type=int), ego_graph.MAX_FANOUT))
+        types = ego_graph.parse_types(request.args.get('types'))
+        key = layout_key(request.args, "ego", name, depth, fanout, types)
+        return jsonify(with_layout(key, ego(name, depth, fanout, types)))
+
+    key = layout_key(request.args, "person", name)
+    if request.args.get('stream') == '1':
+        return Response(stream_person_graph(name, key), mimetype=NDJSON)
+
+    with driver.session() as session:
+        # 1. Fetch direct connections (Person -[r]- Other)
+        records = session.execute_read(read_records, GRAPH_QUERY, {"name": name, "limit": GRAPH_LIMIT})
+        
+        # If input not found directly, try partial match for the MAIN person
+        # through the in-memory name index (no label scan)
+        if not records:
+            matches = search_index.search(name, 1)
+            if matches:
+                records = session.execute_read(
+                    read_records, GRAPH_QUERY, {"name": matches[0], "limit": GRAPH_FALLBACK_LIMIT}
+                )
+
+        # 2. Fetch Housemates (Person -> House <- Mate) using the NAME found in records (or input name if exact)
+        target_name = name
+        if records:
+             target_name = records[0]['p']['name']
+
+        housemates_records = session.execute_read(read_records, HOUSEMATES_QUERY, {"target_name": target_name})
+
+    return jsonify(with_layout(key, person_graph(records, housemates_records)))
 
 @app.route('/api/graph/houses')
 def get_graph_by_houses():
@@ -369,81 +742,104 @@ def get_graph_by_houses():
         return jsonify({"elements": {"nodes": [], "edges": []}})
         
     houses = houses_param.split(',')
+
+    if request.args.get('stream') == '1':
+        return Response(stream_houses_graph(houses, layout_key(request.args, "houses", tuple(houses))),
+                        mimetype=NDJSON)
+
+    if request.args.get('detail') == 'summary':
+        top = request.args.get('top', graph_summary.DEFAULT_TOP, type=int)
+        expand = graph_summary.parse_expand(request.args.get('expand'))
+        key = layout_key(request.args, "summary", tuple(houses), top, tuple(sorted(expand.items())))
+        return jsonify(with_layout(key, houses_summary(houses, top, expand)))
     
     with driver.session() as session:
         # 1. Fetch Persons and Internal Relationships
-        result_persons = session.run("""
-            MATCH (p:Person)
-            WHERE p.house IN $houses
-            OPTIONAL MATCH (p)-[r]-(m:Person)
-            WHERE m.house IN $houses
-            RETURN p, r, m
-            LIMIT 5000
-        """, {"houses": houses})
-        
-        nodes = []
-        edges = []
-        added_nodes = set()
-        
-        for record in result_persons:
-            p = record['p']
-            r = record['r']
-            m = record['m']
-            
-            p_data = {"id": p["id"], "label": p.get("name", "Unknown"), "group": "person", "house": p.get("house")}
-            
-            if p_data["id"] not in added_nodes:
-                nodes.append({"data": p_data})
-                added_nodes.add(p_data["id"])
-                
-            if r and m:
-                m_label = m.get("name", m.get("id"))
-                m_data = {"id": m.get("id", m_label), "label": m_label, "group": "person", "house": m.get("house")}
-                
-                if m_data["id"] not in added_nodes:
-                    nodes.append({"data": m_data})
-                    added_nodes.add(m_data["id"])
-                
-                edges.append({"data": {"source": p_data["id"], "target": m_data["id"], "label": r.type}})
-
+        person_records = session.execute_read(read_records, HOUSES_PERSONS_QUERY, {"houses": houses})
         # 2. Fetch House Nodes and BELONGS_TO Relationships
-        # This ensures the "House Connection" filter works and we see the House Node hub.
-        result_houses = session.run("""
-            MATCH (h:House)
-            WHERE h.name IN $houses
-            OPTIONAL MATCH (p:Person)-[r:BELONGS_TO]->(h)
-            RETURN h, r, p
-        """, {"houses": houses})
-        
-        for record in result_houses:
-            h = record['h']
-            r = record['r']
-            p = record['p']
-            
-            h_data = {"id": h.get("id", h["name"]), "label": h["name"], "group": "house"}
-            if h_data["id"] not in added_nodes:
-                nodes.append({"data": h_data})
-                added_nodes.add(h_data["id"])
-                
-            if r and p:
-                 p_id = p["id"]
-                 # p should already be in nodes from step 1, but we check to be safe or if unconnected otherwise
-                 if p_id in added_nodes:
-                     edges.append({"data": {"source": p_id, "target": h_data["id"], "label": "BELONGS_TO"}})
-
-        return jsonify({"elements": {"nodes": nodes, "edges": edges}})
+        house_records = session.execute_read(read_records, HOUSES_QUERY, {"houses": houses})
+
+    return jsonify(with_layout(layout_key(request.args, "houses", tuple(houses)),
+                               houses_graph(person_records, house_records)))
 
 @app.route('/api/search')
 def search_person():
     q = request.args.get('q', '')
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (p:Person)
-            WHERE toLower(p.name) CONTAINS toLower($q)
-            RETURN p.name as name
-            LIMIT 10
-        """, {"q": q})
-        return jsonify([record["name"] for record in result])
+    limit = max(1, min(request.args.get('limit', SEARCH_LIMIT, type=int), SEARCH_MAX_LIMIT))
+    return jsonify(search_index.search(q, limit))
+
+@app.route('/api/models')
+def model_stats():
+    # Loaded file, load time and inference time per model
+    return jsonify(models.stats())
+
+@app.route('/api/cache')
+def cache_stats():
+    # Size and hit rate per in-process cache
+    return jsonify({name: lru.stats() for name, lru in sorted(metrics.CACHE_REQUESTS.caches.items())})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+def configure_profiler(data):
+    threshold = data.get('threshold_ms')
+    interval = data.get('interval_ms')
+    return request_profiler.configure(
+        enabled=data.get('enabled'),
+        threshold=threshold / 1000 if threshold is not None else None,
+        interval=interval / 1000 if interval is not None else None
+    )
+
+@app.route('/api/profiler', methods=['GET', 'POST'])
+def profiler_settings():
+    # POST {"enabled": true, "threshold_ms": 500, "interval_ms": 5}
+    if request.method == 'GET':
+        return jsonify(request_profiler.settings())
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(configure_profiler(request.json or {}))
+
+# Whole-graph rescoring (scoring.py), e.g. after a model update
+scoring_job = scoring.ScoringJob()
+
+def start_scoring(data):
+    started = scoring_job.start(
+        resume=bool(data.get('resume')),
+        page_size=int(data.get('page_size', scoring.PAGE_SIZE)),
+        workers=int(data.get('workers', scoring.WORKERS))
+    )
+    if not started:
+        return {'error': 'Scoring already running', **scoring_job.status()}, 409
+    return {'started': True}, 202
+
+@app.route('/api/admin/scoring', methods=['GET', 'POST'])
+def bulk_scoring():
+    # POST {"resume": true, "page_size": 5000, "workers": 4}
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.method == 'GET':
+        return jsonify(scoring_job.status())
+    body, status = start_scoring(request.json or {})
+    return jsonify(body), status
+
+# PageRank / degree / community scores (analytics.py), on demand
+analytics_job = analytics.AnalyticsJob(driver)
+
+def start_analytics(data):
+    if not analytics_job.start(batch_size=int(data.get('batch_size', analytics.BATCH_SIZE))):
+        return {'error': 'Analytics already running', **analytics_job.status()}, 409
+    return {'started': True}, 202
+
+@app.route('/api/admin/analytics', methods=['GET', 'POST'])
+def graph_analytics():
+    # POST {"batch_size": 5000}
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.method == 'GET':
+        return jsonify(analytics_job.status())
+    body, status = start_analytics(request.json or {})
+    return jsonify(body), status
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,354 @@
+from quart import Quart, Response, g, render_template, request, jsonify
+from neo4j import AsyncGraphDatabase, READ_ACCESS
+import asyncio
+import gzip
+import os
+import time
+
+import app as flask_app
+import ego_graph
+import graph_summary
+import link_prediction
+import metrics
+
+# --- ASYNC (ASGI) APP ---
+# uvicorn asgi_app:app --workers 4
+# Same routes and JSON as app.py. Bolt I/O of the graph views goes through
+# the neo4j async driver, and independent queries run concurrently (direct
+# connections and housemates of /api/graph/<name>, persons and houses of
+# /api/graph/houses). The multi-query views (?depth=, ?detail=summary) run
+# the query steps of ego_graph.py / graph_summary.py on an async transaction
+# and share app.py's caches.
+# The in-memory parts (search index, house index, models, link prediction)
+# are the ones of app.py: they are served inline, and the calls that may
+# block on a first build, on a synchronous registration write or on the
+# sync driver run in a worker thread. That covers the admin routes too:
+# /api/admin/* run app.py's jobs (the analytics status is one small read on
+# the sync pool) with the same X-Admin-Token check.
+# Gaps: /api/profiler switches the shared settings (PROFILE_SETTINGS, so the
+# Flask workers of the same deployment follow), but the sampler reads the
+# stacks of request threads and does not profile this app's event loop.
+
+app = Quart(__name__)
+
+NEO4J_URI = flask_app.NEO4J_URI
+NEO4J_AUTH = (flask_app.NEO4J_USER, flask_app.NEO4J_PASSWORD)
+FETCH_SIZE = int(os.getenv("NEO4J_FETCH_SIZE", "1000"))
+
+# Created in each worker once its event loop runs
+driver = None
+
+@app.before_serving
+async def open_driver():
+    global driver
+    # Shared /metrics across `--workers` when METRICS_DIR is set (an empty
+    # directory per server, see metrics.py)
+    metrics.start_process()
+    driver = AsyncGraphDatabase.driver(
+        NEO4J_URI, auth=NEO4J_AUTH,
+        max_connection_pool_size=int(os.getenv("NEO4J_POOL_SIZE", "50")),
+        connection_acquisition_timeout=float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30"))
+    )
+
+@app.after_serving
+async def close_driver():
+    await driver.close()
+
+@app.before_request
+async def start_timer():
+    g.metrics_start = time.perf_counter()
+
+@app.after_request
+async def record_request(response):
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_start, rule, request.method,
+                                    str(response.status_code))
+    return response
+
+async def read_records(tx, query, params=None):
+    start = time.perf_counter()
+    result = await tx.run(query, params or {})
+    records = [record async for record in result]
+    summary = await result.consume()
+    name = metrics.QUERY_NAMES.get(query, "read_records")
+    metrics.QUERY_SECONDS.observe(time.perf_counter() - start, name)
+    server = (summary.result_available_after or 0) + (summary.result_consumed_after or 0)
+    metrics.QUERY_SERVER_SECONDS.observe(server / 1000, name)
+    metrics.QUERY_ROWS.inc(len(records), name)
+    return records
+
+async def read(query, params=None):
+    # One session per query, so concurrent reads do not share a session
+    async with driver.session(fetch_size=FETCH_SIZE) as session:
+        return await session.execute_read(read_records, query, params)
+
+async def run_steps(tx, steps, *args):
+    # db.run_steps on an async transaction, timed like read_records
+    generator = steps(*args)
+    try:
+        query, params = next(generator)
+        while True:
+            query, params = generator.send(await read_records(tx, query, params))
+    except StopIteration as done:
+        return done.value
+
+async def ego(name, depth, fanout, types):
+    # app.ego() on the async driver
+    key = await asyncio.to_thread(flask_app.ego_key, name, depth, fanout, types)
+    graph = flask_app.ego_cache.get(key)
+    if graph is None:
+        async with driver.session(fetch_size=FETCH_SIZE) as session:
+            graph = await session.execute_read(run_steps, ego_graph.expand_steps, name, depth, fanout, types)
+            if graph is None:
+                matches = await asyncio.to_thread(flask_app.search_index.search, name, 1)
+                if matches:
+                    graph = await session.execute_read(run_steps, ego_graph.expand_steps,
+                                                       matches[0], depth, fanout, types)
+        graph = graph or ego_graph.empty(depth, fanout)
+        flask_app.ego_cache.set(key, graph)
+    return graph
+
+async def houses_summary(houses, top, expand):
+    # app.houses_summary() on the async driver
+    key = await asyncio.to_thread(flask_app.summary_key, houses, top, expand)
+    summary = flask_app.summary_cache.get(key)
+    if summary is None:
+        async with driver.session(fetch_size=FETCH_SIZE) as session:
+            summary = await session.execute_read(run_steps, graph_summary.summary_steps, houses, key[1], expand)
+        flask_app.summary_cache.set(key, summary)
+    return summary
+
+async def stream_elements(tx, query, params, elements, seen, found=None, positions=None, collected=None):
+    # NDJSON lines of app.py's element generators, one record at a time
+    result = await tx.run(query, params)
+    async for record in result:
+        if found is not None and not found:
+            found.append(record['p']['name'])
+        for line in flask_app.ndjson_lines(elements([record], seen), positions, collected):
+            yield line
+
+async def stream_person_graph(name, key=None):
+    positions, collected = flask_app.stream_layout(key)
+    async with driver.session(fetch_size=FETCH_SIZE, default_access_mode=READ_ACCESS) as session:
+        tx = await session.begin_transaction()
+        try:
+            seen = set()
+            found = []
+            async for line in stream_elements(tx, flask_app.GRAPH_QUERY, {"name": name, "limit": flask_app.GRAPH_LIMIT},
+                                              flask_app.direct_elements, seen, found, positions, collected):
+                yield line
+            if not found:
+                matches = await asyncio.to_thread(flask_app.search_index.search, name, 1)
+                if matches:
+                    params = {"name": matches[0], "limit": flask_app.GRAPH_FALLBACK_LIMIT}
+                    async for line in stream_elements(tx, flask_app.GRAPH_QUERY, params, flask_app.direct_elements,
+                                                      seen, found, positions, collected):
+                        yield line
+            target_name = found[0] if found else name
+            async for line in stream_elements(tx, flask_app.HOUSEMATES_QUERY, {"target_name": target_name},
+                                              flask_app.housemate_elements, seen, None, positions, collected):
+                yield line
+        finally:
+            await tx.close()
+    flask_app.finish_layout(key, collected)
+
+async def stream_houses_graph(houses, key=None):
+    positions, collected = flask_app.stream_layout(key)
+    async with driver.session(fetch_size=FETCH_SIZE, default_access_mode=READ_ACCESS) as session:
+        tx = await session.begin_transaction()
+        try:
+            seen = set()
+            async for line in stream_elements(tx, flask_app.HOUSES_PERSONS_QUERY, {"houses": houses},
+                                              flask_app.house_person_elements, seen, None, positions, collected):
+                yield line
+            async for line in stream_elements(tx, flask_app.HOUSES_QUERY, {"houses": houses},
+                                              flask_app.house_hub_elements, seen, None, positions, collected):
+                yield line
+        finally:
+            await tx.close()
+    flask_app.finish_layout(key, collected)
+
+@app.route('/')
+async def index():
+    return await render_template('index.html')
+
+@app.route('/characters')
+async def characters_page():
+    return await render_template('characters.html')
+
+@app.route('/graph')
+async def graph_page():
+    return await render_template('graph.html')
+
+@app.route('/predict', methods=['POST'])
+async def predict():
+    body, status = await asyncio.to_thread(flask_app.predict_house, await request.get_json())
+    return jsonify(body), status
+
+@app.route('/predict_batch', methods=['POST'])
+async def predict_batch():
+    body, status = await asyncio.to_thread(flask_app.predict_houses, await request.get_json())
+    return jsonify(body), status
+
+@app.route('/predict_survival', methods=['POST'])
+async def predict_survival():
+    body, status = await asyncio.to_thread(flask_app.predict_alive, await request.get_json())
+    return jsonify(body), status
+
+@app.route('/api/characters')
+async def get_all_characters():
+    fields = flask_app.character_fields(request.args.get('fields'))
+    after = request.args.get('after')
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, flask_app.CHARACTERS_MAX_LIMIT))
+
+    key = (tuple(fields), after, limit, await asyncio.to_thread(flask_app.version.current))
+    body = flask_app.characters_cache.get(key)
+    if body is None:
+        projection = ", ".join(f".{f}" for f in fields)
+        where = "WHERE p.name > $after" if after is not None else "WHERE p.name IS NOT NULL"
+        records = await read(f"""
+            MATCH (p:Person)
+            {where}
+            RETURN p {{{projection}}} AS p, p.name AS name
+            ORDER BY name
+            {"LIMIT $limit" if limit is not None else ""}
+        """, {"after": after, "limit": limit})
+        body = flask_app.serialise_characters(records, fields, limit)
+        flask_app.characters_cache.set(key, body)
+
+    if not flask_app.CHARACTERS_GZIP:
+        return Response(body, mimetype='application/json')
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = Response(body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(body), mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/winder', methods=['POST'])
+async def winder_match():
+    data = await request.get_json()
+    friends = data.get('friends', [])
+    metric = data.get('metric', request.args.get('metric', 'common_neighbours'))
+    metric = link_prediction.METRIC_ALIASES.get(metric, metric)
+    if metric not in link_prediction.METRICS:
+        return jsonify({'error': f'Unknown metric, use one of {", ".join(link_prediction.METRICS)}'}), 400
+
+    graph = await asyncio.to_thread(flask_app.link_predictor.current)
+    if not friends:
+        matches = await asyncio.to_thread(flask_app.link_predictor.recommend_for, graph,
+                                          data.get('name'), metric, flask_app.WINDER_MATCHES)
+        if matches is not None:
+            return jsonify(matches)
+        return jsonify({'error': 'No friends provided to base matches on!'}), 400
+
+    return jsonify(graph.recommend(friends, metric, flask_app.WINDER_MATCHES))
+
+@app.route('/api/graph/<name>')
+async def get_graph(name):
+    if 'depth' in request.args:
+        depth = max(1, min(request.args.get('depth', 1, type=int), ego_graph.MAX_DEPTH))
+        fanout = max(1, min(request.args.get('fanout', ego_graph.DEFAULT_FANOUT, type=int), ego_graph.MAX_FANOUT))
+        types = ego_graph.parse_types(request.args.get('types'))
+        key = await asyncio.to_thread(flask_app.layout_key, request.args, "ego", name, depth, fanout, types)
+        graph = await ego(name, depth, fanout, types)
+        return jsonify(await asyncio.to_thread(flask_app.with_layout, key, graph))
+    key = await asyncio.to_thread(flask_app.layout_key, request.args, "person", name)
+    if request.args.get('stream') == '1':
+        return Response(stream_person_graph(name, key), mimetype=flask_app.NDJSON)
+    # Direct connections and housemates of the exact name in parallel; the
+    # housemates are only fetched again when the fuzzy fallback picks another name
+    records, housemates_records = await asyncio.gather(
+        read(flask_app.GRAPH_QUERY, {"name": name, "limit": flask_app.GRAPH_LIMIT}),
+        read(flask_app.HOUSEMATES_QUERY, {"target_name": name})
+    )
+    if not records:
+        matches = await asyncio.to_thread(flask_app.search_index.search, name, 1)
+        if matches and matches[0] != name:
+            records, housemates_records = await asyncio.gather(
+                read(flask_app.GRAPH_QUERY, {"name": matches[0], "limit": flask_app.GRAPH_FALLBACK_LIMIT}),
+                read(flask_app.HOUSEMATES_QUERY, {"target_name": matches[0]})
+            )
+            if not records:
+                # Same as app.py: housemates of the input name when nothing matched
+                housemates_records = await read(flask_app.HOUSEMATES_QUERY, {"target_name": name})
+    graph = flask_app.person_graph(records, housemates_records)
+    return jsonify(await asyncio.to_thread(flask_app.with_layout, key, graph))
+
+@app.route('/api/graph/houses')
+async def get_graph_by_houses():
+    houses_param = request.args.get('houses', '')
+    if not houses_param:
+        return jsonify({"elements": {"nodes": [], "edges": []}})
+
+    houses = houses_param.split(',')
+    if request.args.get('stream') == '1':
+        key = await asyncio.to_thread(flask_app.layout_key, request.args, "houses", tuple(houses))
+        return Response(stream_houses_graph(houses, key), mimetype=flask_app.NDJSON)
+    if request.args.get('detail') == 'summary':
+        top = request.args.get('top', graph_summary.DEFAULT_TOP, type=int)
+        expand = graph_summary.parse_expand(request.args.get('expand'))
+        key = await asyncio.to_thread(flask_app.layout_key, request.args, "summary", tuple(houses), top,
+                                      tuple(sorted(expand.items())))
+        summary = await houses_summary(houses, top, expand)
+        return jsonify(await asyncio.to_thread(flask_app.with_layout, key, summary))
+    person_records, house_records = await asyncio.gather(
+        read(flask_app.HOUSES_PERSONS_QUERY, {"houses": houses}),
+        read(flask_app.HOUSES_QUERY, {"houses": houses})
+    )
+    key = await asyncio.to_thread(flask_app.layout_key, request.args, "houses", tuple(houses))
+    graph = flask_app.houses_graph(person_records, house_records)
+    return jsonify(await asyncio.to_thread(flask_app.with_layout, key, graph))
+
+@app.route('/api/search')
+async def search_person():
+    q = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', flask_app.SEARCH_LIMIT, type=int), flask_app.SEARCH_MAX_LIMIT))
+    return jsonify(await asyncio.to_thread(flask_app.search_index.search, q, limit))
+
+@app.route('/api/models')
+async def model_stats():
+    return jsonify(flask_app.models.stats())
+
+@app.route('/api/cache')
+async def cache_stats():
+    return jsonify({name: lru.stats() for name, lru in sorted(metrics.CACHE_REQUESTS.caches.items())})
+
+@app.route('/metrics')
+async def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+def admin_allowed():
+    return flask_app.token_allowed(request.headers.get('X-Admin-Token'))
+
+@app.route('/api/profiler', methods=['GET', 'POST'])
+async def profiler_settings():
+    if request.method == 'GET':
+        return jsonify(flask_app.request_profiler.settings())
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(flask_app.configure_profiler(await request.get_json(silent=True) or {}))
+
+@app.route('/api/admin/scoring', methods=['GET', 'POST'])
+async def bulk_scoring():
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.method == 'GET':
+        return jsonify(await asyncio.to_thread(flask_app.scoring_job.status))
+    body, status = await asyncio.to_thread(flask_app.start_scoring, await request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+@app.route('/api/admin/analytics', methods=['GET', 'POST'])
+async def graph_analytics():
+    if not admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    if request.method == 'GET':
+        return jsonify(await asyncio.to_thread(flask_app.analytics_job.status))
+    body, status = await asyncio.to_thread(flask_app.start_analytics, await request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0', port=5000)
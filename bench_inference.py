@@ -0,0 +1,65 @@
+import argparse
+import os
+import pickle
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import compiled_model
+
+# Benchmark of sklearn vs compiled (NumPy array) inference for a pickled
+# tree classifier: checks that both give identical predictions on random
+# inputs, then compares load time, on-disk size and single-row/batch latency.
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def random_inputs(n, n_features, high, seed=0):
+    return np.random.default_rng(seed).integers(0, high, size=(n, n_features))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="sklearn vs compiled tree ensemble inference")
+    parser.add_argument("--model", default="house_classifier.pkl")
+    parser.add_argument("--rows", type=int, default=10000, help="rows for the equality check and batch timing")
+    parser.add_argument("--high", type=int, default=15, help="feature values are drawn from [0, high)")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    start = time.perf_counter()
+    with open(args.model, 'rb') as f:
+        clf = pickle.load(f)
+    sk_load = time.perf_counter() - start
+
+    path = compiled_model.compiled_path(args.model)
+    if not os.path.exists(path):
+        compiled_model.compile_file(args.model)
+    start = time.perf_counter()
+    fast = compiled_model.load(path)
+    fast_load = time.perf_counter() - start
+
+    columns = list(getattr(clf, "feature_names_in_", range(clf.n_features_in_)))
+    X = random_inputs(args.rows, len(columns), args.high)
+    df = pd.DataFrame(X, columns=columns)
+
+    same_labels = np.array_equal(clf.predict(df), fast.predict(X))
+    same_proba = np.array_equal(clf.predict_proba(df), fast.predict_proba(X))
+    print(f"Identical predictions on {args.rows} rows: labels={same_labels} probabilities={same_proba}")
+
+    row = X[:1]
+    row_df = df.iloc[:1]
+    results = [
+        ("load", sk_load, fast_load),
+        ("predict 1 row", timed(lambda: clf.predict(row_df), args.repeat), timed(lambda: fast.predict(row), args.repeat)),
+        (f"predict {args.rows} rows", timed(lambda: clf.predict(df), 5), timed(lambda: fast.predict(X), 5)),
+    ]
+    print(f"{'':<22} {'sklearn':>12} {'compiled':>12} {'speedup':>9}")
+    for label, sk, fa in results:
+        print(f"{label:<22} {sk * 1000:>10.3f}ms {fa * 1000:>10.3f}ms {sk / fa:>8.1f}x")
+    print(f"{'size on disk':<22} {os.path.getsize(args.model) / 1024:>10.1f}kB {os.path.getsize(path) / 1024:>10.1f}kB")
@@ -0,0 +1,105 @@
+from neo4j import GraphDatabase
+import argparse
+import os
+import random
+import time
+
+import rules
+
+# Benchmark of the rule engine against the person count.
+# Generates a synthetic population (HP-API-like houses and surnames) and
+# times grouping + pair generation for every rule, next to the number of
+# candidate pairs the former cartesian MATCH had to examine.
+# Runs offline by default: nothing is written to Neo4j. --write also loads
+# the population into a scratch database and times rules.write_edges, the
+# batched MERGE transactions of a real load, then deletes it again (persons
+# flagged p.bench). Do not point --write at a database in use.
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "testpassword")
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+
+HOUSES = ['Gryffindor', 'Slytherin', 'Ravenclaw', 'Hufflepuff', 'Unknown']
+
+def synthetic_persons(n, surnames, seed=42):
+    rnd = random.Random(seed)
+    return [
+        {"name": f"Wizard{i} Family{rnd.randrange(surnames)}", "house": rnd.choice(HOUSES)}
+        for i in range(n)
+    ]
+
+def run(n, surnames):
+    persons = synthetic_persons(n, surnames)
+    row = {"persons": n, "cartesian": len(rules.RULES) * n * (n - 1) // 2}
+    start = time.perf_counter()
+    for rule in rules.RULES:
+        count = 0
+        for _ in rules.rule_edges(rule, persons):
+            count += 1
+        row[rule["type"]] = count
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+def write_persons(tx, persons):
+    tx.run("""
+        UNWIND $rows AS row
+        MERGE (p:Person {name: row.name})
+        SET p.house = row.house, p.bench = true
+    """, {"rows": persons})
+
+def clear_persons(session):
+    session.run("""
+        MATCH (p:Person) WHERE p.bench = true
+        CALL { WITH p DETACH DELETE p } IN TRANSACTIONS OF 100 ROWS
+    """).consume()
+
+def run_write(driver, n, surnames, batch_size):
+    # Seconds per rule for writing its edges, in batch_size transactions
+    persons = synthetic_persons(n, surnames)
+    row = {"persons": n}
+    with driver.session() as session:
+        clear_persons(session)
+        for chunk in rules.batched(persons, batch_size):
+            session.execute_write(write_persons, chunk)
+        try:
+            for rule in rules.RULES:
+                start = time.perf_counter()
+                rules.write_edges(session, rule["type"], rules.rule_edges(rule, persons), batch_size)
+                row[rule["type"]] = time.perf_counter() - start
+        finally:
+            clear_persons(session)
+    return row
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rule engine runtime vs person count")
+    parser.add_argument("--sizes", default="500,1000,2000,4000,8000",
+                        help="comma separated person counts")
+    parser.add_argument("--family-size", type=int, default=4,
+                        help="average number of persons sharing a surname")
+    parser.add_argument("--write", action="store_true",
+                        help="also time the batched edge writes against NEO4J_URI (a scratch database)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="edges per write transaction (--write)")
+    args = parser.parse_args()
+
+    print(f"{'persons':>8} {'cartesian':>12} {'SAME_FAMILY':>12} {'FRIEND_OF':>12} "
+          f"{'ENEMY_OF':>12} {'seconds':>9} {'edges/s':>12}")
+    for n in [int(s) for s in args.sizes.split(',')]:
+        row = run(n, max(1, n // args.family_size))
+        edges = row["SAME_FAMILY"] + row["FRIEND_OF"] + row["ENEMY_OF"]
+        rate = edges / row["seconds"] if row["seconds"] > 0 else 0
+        print(f"{row['persons']:>8} {row['cartesian']:>12} {row['SAME_FAMILY']:>12} "
+              f"{row['FRIEND_OF']:>12} {row['ENEMY_OF']:>12} {row['seconds']:>9.3f} {rate:>12.0f}")
+
+    if args.write:
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        print(f"\nWrites, {args.batch_size} edges per transaction (seconds)")
+        print(f"{'persons':>8} {'SAME_FAMILY':>12} {'FRIEND_OF':>12} {'ENEMY_OF':>12}")
+        try:
+            for n in [int(s) for s in args.sizes.split(',')]:
+                row = run_write(driver, n, max(1, n // args.family_size), args.batch_size)
+                print(f"{row['persons']:>8} {row['SAME_FAMILY']:>12.3f} {row['FRIEND_OF']:>12.3f} "
+                      f"{row['ENEMY_OF']:>12.3f}")
+        finally:
+            driver.close()
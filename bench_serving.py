@@ -0,0 +1,61 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+# Load test of running servers: the threaded Flask app (gunicorn, app.py) and
+# the async one (uvicorn, asgi_app.py) are hit with the same GET requests at
+# the same concurrency, and throughput and latency percentiles are compared.
+#   gunicorn -c gunicorn.conf.py -b :5000 app:app
+#   uvicorn asgi_app:app --workers 4 --port 5001
+#   python bench_serving.py --target flask=http://localhost:5000 --target asgi=http://localhost:5001
+
+DEFAULT_PATHS = [
+    "/api/graph/Harry Potter",
+    "/api/graph/houses?houses=Gryffindor,Slytherin",
+    "/api/characters?limit=100",
+    "/api/search?q=her"
+]
+
+_local = threading.local()
+
+def get(url):
+    # One keep-alive session per client thread
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    start = time.perf_counter()
+    response = session.get(url, timeout=60)
+    return time.perf_counter() - start, response.status_code
+
+def load(base, path, concurrency, total):
+    url = base.rstrip('/') + path
+    get(url)  # warm
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: get(url), range(total)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array([r[0] for r in results]) * 1000
+    errors = sum(1 for r in results if r[1] >= 400)
+    return total / elapsed, np.percentile(latencies, [50, 95, 99]), errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Threaded vs async API load test")
+    parser.add_argument("--target", action="append", required=True,
+                        help="label=base URL of a running server (repeatable)")
+    parser.add_argument("--path", action="append", help="request path (repeatable)")
+    parser.add_argument("--concurrency", default="1,8,32,64", help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=500, help="requests per path and concurrency")
+    args = parser.parse_args()
+
+    targets = [t.split('=', 1) for t in args.target]
+    levels = [int(c) for c in args.concurrency.split(',')]
+    print(f"{'path':48} {'server':8} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for path in args.path or DEFAULT_PATHS:
+        for concurrency in levels:
+            for label, base in targets:
+                rps, (p50, p95, p99), errors = load(base, path, concurrency, args.requests)
+                print(f"{path[:48]:48} {label:8} {concurrency:7d} {rps:9.1f} {p50:8.1f} {p95:8.1f} {p99:8.1f} {errors:6d}")
@@ -0,0 +1,241 @@
+import argparse
+import csv
+import numpy as np
+import os
+import random
+import time
+
+import feature_store
+import get_insert
+import rules
+import schema
+
+# --- BULK IMPORT ---
+# Offline cold load: instead of transactional Cypher, the characters are
+# turned into header CSV files for `neo4j-admin database import full`, which
+# writes the store files directly. The import covers everything a full
+# get_insert.py load produces:
+#   persons.csv / houses.csv / meta.csv       - nodes (Meta holds the graph version)
+#   BELONGS_TO.csv, <rule type>.csv, ROMANTIC_WITH.csv - relationships
+# Rule edges are generated with rules.py (only rules.stored_rules(), so
+# IMPLICIT_FRIENDS applies) and streamed to the files in chunks; only the
+# name -> house map is held in memory, never the edges. While the edges are
+# written they are also counted per person and partner house, which gives
+# p.house_features (the vector feature_store.REFRESH_QUERY would compute),
+# so the imported graph needs no materialisation pass.
+# neo4j-admin does not create constraints or indexes: run --finish (the
+# schema.py migrations) once the database is started.
+
+IMPORT_DIR = os.getenv("BULK_IMPORT_DIR", "import")
+CHUNK_SIZE = 100000
+# Between the elements of an array field (neo4j-admin --array-delimiter):
+# the ASCII unit separator, which no name contains (array_field rejects it)
+ARRAY_DELIMITER = '\x1f'
+
+PERSON_HEADER = ['name:ID(Person)', 'house', 'species', 'gender', 'alive:boolean', 'image', 'id',
+                 'alternate_names:string[]', 'house_features:int[]']
+EDGE_HEADER = [':START_ID(Person)', ':END_ID(Person)']
+# Feature column of the first house, per relationship type
+FEATURE_OFFSET = {rel_type: i * len(feature_store.HOUSES) for i, (_, rel_type) in enumerate(feature_store.RELATIONS)}
+
+def open_csv(directory, filename, header):
+    f = open(os.path.join(directory, filename), 'w', newline='', encoding='utf-8')
+    writer = csv.writer(f)
+    writer.writerow(header)
+    return f, writer
+
+def csv_field(value):
+    # Quoted only when needed, as csv.writer does
+    if any(c in value for c in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def array_field(values):
+    values = [str(v) for v in values]
+    for v in values:
+        if ARRAY_DELIMITER in v:
+            raise ValueError(f"Array value {v!r} contains the array delimiter {ARRAY_DELIMITER!r}")
+    return ARRAY_DELIMITER.join(values)
+
+class Population:
+    # name -> (row index, house) of the last record per name, as the
+    # MERGE + SET of a transactional load would keep
+    def __init__(self, rows):
+        self.last = {}
+        for i, row in enumerate(rows):
+            self.last[row["name"]] = (i, row["house"])
+        self.names = sorted(self.last)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        # Escaped once, edge lines are then joined without csv.writer
+        self.field = {name: csv_field(name) for name in self.names}
+        codes = {h: i for i, h in enumerate(feature_store.HOUSES)}
+        self.house_code = np.array([codes.get(self.last[n][1], -1) for n in self.names], dtype=np.int64)
+        self.features = np.zeros((len(self.names), len(feature_store.FEATURE_COLUMNS)), dtype=np.int32)
+
+    def persons(self):
+        return [{"name": name, "house": self.last[name][1]} for name in self.names]
+
+    def houses(self):
+        return sorted({house for _, house in self.last.values()})
+
+    def count_edges(self, rel_type, pairs):
+        # The undirected pattern of REFRESH_QUERY sees every relationship from
+        # both ends: one count for each end, in the column of the other's house
+        offset = FEATURE_OFFSET.get(rel_type)
+        if offset is None or not pairs:
+            return
+        a = np.array([self.index[x] for x, _ in pairs], dtype=np.int64)
+        b = np.array([self.index[y] for _, y in pairs], dtype=np.int64)
+        for i, j in ((a, b), (b, a)):
+            known = self.house_code[j] >= 0
+            np.add.at(self.features, (i[known], offset + self.house_code[j[known]]), 1)
+
+    def count_housemates(self):
+        # IMPLICIT_FRIENDS: the friends the House hub implies (rules.py)
+        offset = FEATURE_OFFSET['FRIEND_OF']
+        members = np.array([rules.house_key({"house": self.last[n][1]}) is not None for n in self.names])
+        members &= self.house_code >= 0
+        sizes = np.bincount(self.house_code[members], minlength=len(feature_store.HOUSES))
+        rows = np.flatnonzero(members)
+        self.features[rows, offset + self.house_code[rows]] += sizes[self.house_code[rows]] - 1
+
+def write_edges(directory, rel_type, pairs, population):
+    start = time.perf_counter()
+    written = 0
+    field = population.field
+    f, _ = open_csv(directory, f"{rel_type}.csv", EDGE_HEADER)
+    with f:
+        for chunk in rules.batched(pairs, CHUNK_SIZE):
+            f.write("".join(f"{field[a]},{field[b]}\n" for a, b in chunk))
+            population.count_edges(rel_type, chunk)
+            written += len(chunk)
+    elapsed = time.perf_counter() - start
+    rate = written / elapsed if elapsed > 0 else 0
+    print(f"    {rel_type}: {written} edges in {elapsed:.2f}s ({rate:.0f} edges/s)")
+    return written
+
+def romance_edges(names):
+    # Same matching as get_insert.create_romances (exact name or substring),
+    # both directions, each directed pair once as MERGE would
+    edges = set()
+    for p1, p2 in get_insert.ROMANCES:
+        p1, p2 = get_insert.NAME_MAP.get(p1, p1), get_insert.NAME_MAP.get(p2, p2)
+        left = [n for n in names if p1 in n]
+        right = [n for n in names if p2 in n]
+        for a in left:
+            for b in right:
+                edges.add((a, b))
+                edges.add((b, a))
+    return sorted(edges)
+
+def write_import(directory, source):
+    # `source()` returns an iterable of get_insert.to_rows() rows; it is read
+    # twice (names and houses first, then the person records)
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    population = Population(source())
+    print(f"  {len(population.names)} persons in {len(population.houses())} houses")
+
+    f, writer = open_csv(directory, "houses.csv", ['name:ID(House)'])
+    with f:
+        writer.writerows([h] for h in population.houses())
+    f, writer = open_csv(directory, "meta.csv", ['name:ID(Meta)', 'version:long'])
+    with f:
+        writer.writerow(['graph', 1])
+    f, writer = open_csv(directory, "BELONGS_TO.csv", [':START_ID(Person)', ':END_ID(House)'])
+    with f:
+        writer.writerows((name, population.last[name][1]) for name in population.names)
+
+    relationships = ['BELONGS_TO']
+    persons = population.persons()
+    for rule in rules.stored_rules():
+        write_edges(directory, rule["type"], rules.rule_edges(rule, persons), population)
+        relationships.append(rule["type"])
+    if rules.IMPLICIT_FRIENDS:
+        population.count_housemates()
+    write_edges(directory, 'ROMANTIC_WITH', romance_edges(population.names), population)
+    relationships.append('ROMANTIC_WITH')
+
+    f, writer = open_csv(directory, "persons.csv", PERSON_HEADER)
+    with f:
+        for i, row in enumerate(source()):
+            if population.last[row["name"]][0] != i:
+                continue  # a later record of the same name wins
+            writer.writerow([
+                row["name"], row["house"], row["species"], row["gender"],
+                None if row["alive"] is None else str(bool(row["alive"])).lower(),
+                row["image"], row["id"], array_field(row["alternate_names"]) or None,
+                array_field(population.features[population.index[row["name"]]])
+            ])
+    print(f"  Wrote import files to {directory} in {time.perf_counter() - start:.2f}s")
+    return relationships
+
+def admin_command(directory, relationships, database="neo4j"):
+    args = ["neo4j-admin database import full --overwrite-destination",
+            f"--array-delimiter=U+{ord(ARRAY_DELIMITER):04X}"]
+    for label, filename in (('Person', 'persons.csv'), ('House', 'houses.csv'), ('Meta', 'meta.csv')):
+        args.append(f"--nodes={label}={os.path.join(directory, filename)}")
+    for rel_type in relationships:
+        args.append(f"--relationships={rel_type}={os.path.join(directory, rel_type + '.csv')}")
+    return " \\\n    ".join(args + [database])
+
+# --- SYNTHETIC DATA ---
+
+def synthetic_rows(n, surnames, seed=42, house_size=None):
+    # HP-API-like population (same distribution as bench_rules.py), generated
+    # lazily so millions of rows are never held as dicts. There are only 4
+    # houses, so the house rules give ~n²/6 edges (FRIEND_OF cliques, ENEMY_OF
+    # between Gryffindor and Slytherin); house_size caps every house and puts
+    # the persons over it in 'Unknown', which bounds them to ~4·house_size².
+    rnd = random.Random(seed)
+    houses = feature_store.HOUSES + ['Unknown']
+    members = {}
+    for i in range(n):
+        name = f"Wizard{i} Family{rnd.randrange(surnames)}"
+        house = rnd.choice(houses)
+        if house_size is not None and house != 'Unknown':
+            members[house] = members.get(house, 0) + 1
+            if members[house] > house_size:
+                house = 'Unknown'
+        yield {
+            "name": name, "house": house, "species": "human", "gender": None,
+            "alive": True, "image": "", "id": name, "alternate_names": []
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write neo4j-admin import files for a cold load")
+    parser.add_argument("directory", nargs='?', default=IMPORT_DIR, help="output directory")
+    parser.add_argument("--offline", action="store_true",
+                        help=f"read characters from the local snapshot ({get_insert.SNAPSHOT_FILE})")
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="generate N synthetic persons instead. Without --house-size the house rules "
+                             "write ~N²/6 edges (N=10000: ~17M, N=100000: ~1.7G), "
+                             "~N²/12 with IMPLICIT_FRIENDS=1")
+    parser.add_argument("--house-size", type=int, metavar="M",
+                        help="at most M persons per house, the others in 'Unknown' (--synthetic): "
+                             "~4·M² house rule edges whatever N")
+    parser.add_argument("--family-size", type=int, default=4,
+                        help="average number of persons sharing a surname (--synthetic)")
+    parser.add_argument("--finish", action="store_true",
+                        help="after the import: apply the schema migrations on the running database and exit")
+    args = parser.parse_args()
+
+    if args.finish:
+        with get_insert.driver.session() as session:
+            print(f"✅ Schema at v{schema.migrate(session)}")
+        get_insert.driver.close()
+        raise SystemExit(0)
+
+    if args.synthetic:
+        relationships = write_import(args.directory, lambda: synthetic_rows(
+            args.synthetic, max(1, args.synthetic // args.family_size), house_size=args.house_size))
+    else:
+        data = get_insert.load_characters(offline=args.offline)
+        print(f"Loaded {len(data)} characters.")
+        rows = get_insert.to_rows(data)
+        relationships = write_import(args.directory, lambda: rows)
+        # Lets a later `get_insert.py --sync` diff against this load
+        get_insert.save_state(list({r["name"]: r for r in rows}.values()))
+    print("Import with the database stopped:")
+    print(admin_command(args.directory, relationships))
+    print("then start it and run: python bulk_import.py --finish")
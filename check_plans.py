@@ -0,0 +1,261 @@
+from neo4j import GraphDatabase
+import argparse
+import ast
+import glob
+import itertools
+import os
+import re
+
+import schema
+
+# Query plan regression check.
+# Finds every Cypher string of the project (the queries passed to run() or
+# name_query(), and the *_QUERY / query variables), runs EXPLAIN on each
+# against a database at the latest schema.py version, and fails when a hot
+# query plans one of the FORBIDDEN operators: a scan of every node, a
+# cartesian product or an Eager barrier (the whole input materialised first).
+# Hot queries are the ones of the request paths (HOT_FILES); the offline
+# jobs only report them, unless --strict.
+# Queries are read from the source, never imported (no driver, no models, no
+# env-dependent import side effects). Module-level strings, including ones
+# built by concatenation (feature_store.FRIENDS_CLAUSE into scoring.py), are
+# folded from the AST; a string assigned in both branches of an `if` gives one
+# variant of the query per branch, and each variant is explained. f-string
+# placeholders and values computed at import (graph_summary.SCANNED_TYPES)
+# are explained with their SAMPLES text. Run it before deploying, against a
+# copy of production:
+#   python schema.py && python check_plans.py
+# Not yet run against a database: only the extraction was checked (52 query
+# texts, every placeholder and parameter has a value). Read the plans of its
+# first run, and fix or ALLOW what it reports, before relying on it as a gate.
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "testpassword")
+
+FORBIDDEN = {'AllNodesScan', 'CartesianProduct', 'Eager'}
+HOT_FILES = {'app.py', 'asgi_app.py', 'ego_graph.py', 'graph_summary.py', 'graph_version.py',
+             'registration.py', 'feature_store.py', 'search.py', 'link_prediction.py'}
+# Not scanned: this script, benchmarks, and the schema statements themselves
+SKIP_FILES = {'check_plans.py', 'schema.py'}
+# Accepted operators per query label ("file:function", "file:NAME" of a
+# module-level query, or the name_query() name) or "file:line", each with the
+# reason. Add an entry only after reading the plan.
+ALLOWED = {
+    # Wipes every node but the Meta markers before a full load: scanning them
+    # all is the point (offline)
+    'get_insert.py:clear_db': {'AllNodesScan'},
+    # Deletes the FRIEND_OF edges it matches, LIMIT $limit per transaction:
+    # the barrier is bounded by the batch (offline, rules.prune_implied)
+    'rules.py:prune_batch': {'Eager'},
+}
+# Most variants explained per query (strings defined per `if` branch)
+MAX_VARIANTS = 8
+
+CYPHER = re.compile(r'^\s*(MATCH|OPTIONAL MATCH|UNWIND|MERGE|CREATE|WITH|CALL|RETURN)\b', re.I)
+# Source of an f-string placeholder, or of a value only known at import
+# -> text used for EXPLAIN
+SAMPLES = {
+    'rel_type': 'FRIEND_OF',
+    'where': 'WHERE p.name > $after',
+    'projection': '.name, .house',
+    "'LIMIT $limit' if limit is not None else ''": 'LIMIT $limit',
+    'SCANNED_TYPES': 'SAME_FAMILY|ROMANTIC_WITH',
+    'ALL_TYPES': 'FRIEND_OF|ENEMY_OF|SAME_FAMILY|ROMANTIC_WITH',
+    'BLOCK_TYPES or SCANNED_TYPES': 'FRIEND_OF|ENEMY_OF',
+}
+# Parameter values by name; the plan only depends on their types
+PARAMS = {
+    'name': 'Harry Potter', 'target_name': 'Harry Potter', 'after': '', 'limit': 10, 'fanout': 25,
+    'names': ['Harry Potter'], 'houses': ['Gryffindor'], 'excluded': ['Unknown'], 'types': ['FRIEND_OF'],
+    'frontier': ['0'], 'pairs': [['Harry Potter', 'Ginny Weasley']], 'p1': 'Harry Potter', 'p2': 'Ginny Weasley',
+    'rows': [{'name': 'Harry Potter', 'house': 'Gryffindor'}], 'users': [], 'version': 1, 'run': 'check',
+    'top': 10, 'timeout': 1, 'implicit': False, 'rank_houses': ['Gryffindor'], 'ids': ['0'],
+    'block_degree': {'Gryffindor': 1}, 'implied': {'Gryffindor': 1}, 'now': 0.0, 'stale': 3600,
+    'last': None, 'error': None, 'prefix': 'user:',
+}
+
+def is_query_target(target):
+    return isinstance(target, ast.Name) and (target.id == 'query' or target.id.endswith('_QUERY'))
+
+def render(node):
+    # Text of a string literal or f-string, None if a placeholder has no sample
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif ast.unparse(value.value) in SAMPLES:
+                parts.append(SAMPLES[ast.unparse(value.value)])
+            else:
+                return None
+        return "".join(parts)
+    return None
+
+def leading_text(node):
+    # The first literal text of an expression, to tell Cypher from other strings
+    while isinstance(node, ast.BinOp):
+        node = node.left
+    if isinstance(node, ast.JoinedStr) and node.values and isinstance(node.values[0], ast.Constant):
+        return node.values[0].value
+    return render(node) or ""
+
+class Constants:
+    # Module-level strings of the project's modules, folded from their
+    # source: {module: {name: [text per variant]}}
+    def __init__(self, directory):
+        self.directory = directory
+        self._modules = {}
+
+    def module(self, name):
+        if name not in self._modules:
+            self._modules[name] = {}  # a module importing itself back sees nothing
+            path = os.path.join(self.directory, name + ".py")
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    tree = ast.parse(f.read(), path)
+                self._modules[name] = self.assign(tree.body, {})
+        return self._modules[name]
+
+    def assign(self, body, values):
+        for stmt in body:
+            if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
+                texts = self.fold(stmt.value, values)
+                if texts:
+                    values[stmt.targets[0].id] = texts
+                else:
+                    values.pop(stmt.targets[0].id, None)
+            elif isinstance(stmt, ast.If):
+                # Either branch may run: the texts of both
+                branches = [self.assign(stmt.body, dict(values)), self.assign(stmt.orelse, dict(values))]
+                for name in set(branches[0]) | set(branches[1]):
+                    texts = branches[0].get(name, []) + branches[1].get(name, [])
+                    values[name] = list(dict.fromkeys(texts))[:MAX_VARIANTS]
+        return values
+
+    def fold(self, node, values):
+        # Possible texts of a string expression, [] if unknown
+        text = render(node)
+        if text is not None:
+            return [text]
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+            left, right = self.fold(node.left, values), self.fold(node.right, values)
+            return [a + b for a, b in itertools.islice(itertools.product(left, right), MAX_VARIANTS)]
+        if isinstance(node, ast.Name) and node.id in values:
+            return values[node.id]
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+            texts = self.module(node.value.id).get(node.attr)
+            if texts:
+                return texts
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and node.func.attr == 'name_query' and len(node.args) > 1:
+            return self.fold(node.args[1], values)
+        sample = SAMPLES.get(ast.unparse(node))
+        return [sample] if sample is not None else []
+
+def enclosing_functions(tree):
+    # node -> name of the innermost function defining it
+    functions = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for child in ast.walk(node):
+                functions[child] = node.name
+    return functions
+
+def find_queries(path, constants):
+    # [(location, label, [text per variant])] for every query expression of
+    # a file; texts is empty when a part has no SAMPLES value
+    filename = os.path.basename(path)
+    module = os.path.splitext(filename)[0]
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    values = constants.module(module)
+    functions = enclosing_functions(tree)
+    found = []
+    for node in ast.walk(tree):
+        candidates = []
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Attribute) and func.attr == 'run' and node.args:
+                candidates.append((node.args[0], None))
+            if isinstance(func, ast.Attribute) and func.attr == 'name_query' and len(node.args) > 1:
+                candidates.append((node.args[1], render(node.args[0])))
+        elif isinstance(node, ast.Assign) and any(is_query_target(t) for t in node.targets):
+            if not isinstance(node.value, ast.Call):
+                name = next(t.id for t in node.targets if is_query_target(t))
+                candidates.append((node.value, f"{filename}:{name}" if node in tree.body else None))
+        for candidate, label in candidates:
+            if isinstance(candidate, (ast.Constant, ast.JoinedStr, ast.BinOp)) and CYPHER.match(leading_text(candidate)):
+                location = f"{filename}:{candidate.lineno}"
+                if label is None:
+                    label = f"{filename}:{functions[node]}" if node in functions else location
+                found.append((location, label, constants.fold(candidate, values)))
+    return found
+
+def operators(plan):
+    # Every operator type of a plan tree ("AllNodesScan@neo4j" -> "AllNodesScan")
+    yield plan['operatorType'].split('@')[0]
+    for child in plan.get('children', []):
+        yield from operators(child)
+
+def explain(session, query):
+    names = set(re.findall(r'\$(\w+)', query))
+    summary = session.run("EXPLAIN " + query, {n: PARAMS.get(n) for n in names}).consume()
+    return set(operators(summary.plan))
+
+def check(session, paths, strict=False):
+    # Number of failing queries
+    failures = 0
+    seen = set()
+    constants = Constants(os.path.dirname(os.path.abspath(paths[0])) if paths else ".")
+    for path in paths:
+        hot = os.path.basename(path) in HOT_FILES
+        for location, label, texts in find_queries(path, constants):
+            if not texts:
+                print(f"  ?  {location}: placeholder without a SAMPLES value, skipped")
+                continue
+            allowed = ALLOWED.get(location, set()) | ALLOWED.get(label, set())
+            for i, query in enumerate(texts):
+                if query in seen:
+                    continue
+                seen.add(query)
+                name = f"{label} #{i + 1}" if len(texts) > 1 else label
+                try:
+                    found = (explain(session, query) & FORBIDDEN) - allowed
+                except Exception as e:
+                    print(f"  ✗  {location} ({name}): EXPLAIN failed: {e}")
+                    failures += 1
+                    continue
+                if not found:
+                    print(f"  ✓  {location} ({name})")
+                elif hot or strict:
+                    print(f"  ✗  {location} ({name}): {', '.join(sorted(found))}")
+                    failures += 1
+                else:
+                    print(f"  !  {location} ({name}): {', '.join(sorted(found))} (offline)")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN every Cypher query and fail on plan regressions")
+    parser.add_argument("files", nargs='*', help="files to check (default: every module of the project)")
+    parser.add_argument("--strict", action="store_true", help="fail on offline queries too")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    paths = args.files or [p for p in sorted(glob.glob(os.path.join(here, "*.py")))
+                           if os.path.basename(p) not in SKIP_FILES and not os.path.basename(p).startswith("bench_")]
+
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    with driver.session() as session:
+        state = schema.status(session)
+        if state["pending"] or state["missing"]:
+            print(f"⚠️ Schema v{state['version']} is not at v{state['latest']} "
+                  f"(missing: {', '.join(state['missing']) or 'none'}), run python schema.py first")
+            driver.close()
+            raise SystemExit(2)
+        failures = check(session, paths, args.strict)
+    driver.close()
+    print(f"{'✅ No plan regressions' if not failures else f'❌ {failures} queries failed'}")
+    raise SystemExit(1 if failures else 0)
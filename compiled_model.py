@@ -0,0 +1,157 @@
+import numpy as np
+import argparse
+import os
+import pickle
+
+# --- COMPILED TREE ENSEMBLES ---
+# Exports a fitted scikit-learn tree classifier (RandomForest / ExtraTrees /
+# DecisionTree) to flat NumPy arrays saved as .npz, and evaluates it without
+# sklearn: every tree is walked level by level for all rows at once, so a
+# single row costs a handful of array ops and no input validation.
+# Results match sklearn exactly: inputs are cast to float32 like sklearn
+# does, and per-tree probabilities are accumulated in the same order.
+
+COMPILED_SUFFIX = ".npz"
+
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, value, roots, classes,
+                 feature_names=None, encoder_classes=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value          # (n_nodes, n_classes) leaf probabilities
+        self.roots = roots          # index of each tree's root node
+        self.classes_ = classes
+        self.feature_names = feature_names
+        # Optional LabelEncoder classes shipped with the model (survival house codes)
+        self.encoder_classes = encoder_classes
+        self._prepare()
+
+    @property
+    def n_features(self):
+        return 0 if self.feature_names is None else len(self.feature_names)
+
+    def _prepare(self):
+        # Leaves point to themselves, so every row can take exactly `depth`
+        # steps without masking finished rows. Children are interleaved as
+        # (right, left) so the next node is children[2 * node + go_left].
+        nodes = np.arange(len(self.left), dtype=np.intp)
+        leaf = self.left < 0
+        next_left = np.where(leaf, nodes, self.left)
+        next_right = np.where(leaf, nodes, self.right)
+        self._children = np.stack([next_right, next_left], axis=1).ravel().astype(np.intp)
+        self._feature = self.feature.astype(np.intp)
+        self._threshold = np.where(leaf, np.inf, self.threshold)
+        depth, node = 0, self.roots.astype(np.intp)
+        while (self.left[node] >= 0).any():
+            node = np.unique(np.concatenate([next_left[node], next_right[node]]))
+            depth += 1
+        self.depth = depth
+
+    def leaves(self, X):
+        # (n_rows, n_trees) leaf node index for every row and tree
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        node = np.tile(self.roots.astype(np.intp), n_rows)
+        offset = np.repeat(np.arange(n_rows, dtype=np.intp) * n_features, n_trees)
+        flat = X.ravel()
+        for _ in range(self.depth):
+            go_left = flat[offset + self._feature[node]] <= self._threshold[node]
+            node = self._children[2 * node + go_left]
+        return node.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        leaves = self.leaves(X)
+        proba = np.zeros((X.shape[0], len(self.classes_)))
+        for t in range(leaves.shape[1]):
+            proba += self.value[leaves[:, t]]
+        return proba / leaves.shape[1]
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def encode(self, label):
+        # Same as LabelEncoder.transform([label])[0]
+        return int(np.searchsorted(self.encoder_classes, label))
+
+    def save(self, path):
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left,
+                 right=self.right, value=self.value, roots=self.roots, classes=self.classes_,
+                 feature_names=np.array([] if self.feature_names is None else self.feature_names),
+                 encoder_classes=np.array([] if self.encoder_classes is None else self.encoder_classes))
+
+def load(path):
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {k: data[k] for k in data.files}
+    return CompiledForest(
+        arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"],
+        arrays["value"], arrays["roots"], arrays["classes"],
+        feature_names=arrays["feature_names"] if arrays["feature_names"].size else None,
+        encoder_classes=arrays["encoder_classes"] if arrays["encoder_classes"].size else None
+    )
+
+def compile_model(clf, encoder=None):
+    trees = list(clf.estimators_) if hasattr(clf, "estimators_") else [clf]
+    if not all(hasattr(est, "tree_") and hasattr(est, "classes_") for est in trees):
+        raise TypeError(f"Cannot compile {type(clf).__name__}: only tree classifiers are supported")
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for est in trees:
+        tree = est.tree_
+        roots.append(offset)
+        features.append(np.maximum(tree.feature, 0).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        # Children are renumbered into the flat arrays; -1 marks a leaf
+        lefts.append(np.where(tree.children_left >= 0, tree.children_left + offset, -1).astype(np.int32))
+        rights.append(np.where(tree.children_right >= 0, tree.children_right + offset, -1).astype(np.int32))
+        value = tree.value[:, 0, :].astype(np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        values.append(np.divide(value, totals, out=np.zeros_like(value), where=totals > 0))
+        offset += tree.node_count
+    feature_names = getattr(clf, "feature_names_in_", None)
+    return CompiledForest(
+        np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+        np.concatenate(rights), np.vstack(values), np.array(roots, dtype=np.int32),
+        plain_array(clf.classes_),
+        feature_names=None if feature_names is None else np.asarray(feature_names, dtype=str),
+        encoder_classes=None if encoder is None else plain_array(encoder.classes_)
+    )
+
+def plain_array(values):
+    # Object arrays (string labels) would need pickle to load back
+    values = np.asarray(values)
+    return values.astype(str) if values.dtype == object else values
+
+def compiled_path(model_file):
+    return os.path.splitext(model_file)[0] + COMPILED_SUFFIX
+
+def compile_file(model_file, encoder_file=None):
+    with open(model_file, 'rb') as f:
+        clf = pickle.load(f)
+    encoder = None
+    if encoder_file and os.path.exists(encoder_file):
+        with open(encoder_file, 'rb') as f:
+            encoder = pickle.load(f)
+    compiled = compile_model(clf, encoder)
+    path = compiled_path(model_file)
+    compiled.save(path)
+    print(f"✅ Compiled {model_file} -> {path} ({len(compiled.roots)} trees, {len(compiled.feature)} nodes)")
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile pickled tree classifiers to .npz arrays")
+    parser.add_argument("--model", action="append",
+                        help="model pickle, optionally 'model.pkl:encoder.pkl' (repeatable)")
+    args = parser.parse_args()
+
+    targets = args.model or ["house_classifier.pkl", "survival_model.pkl:survival_encoder.pkl"]
+    for target in targets:
+        model_file, _, encoder_file = target.partition(':')
+        if not os.path.exists(model_file):
+            print(f"⚠️ {model_file} not found, skipped")
+            continue
+        compile_file(model_file, encoder_file or None)
@@ -0,0 +1,90 @@
+from neo4j import GraphDatabase
+import os
+import threading
+import time
+
+# --- NEO4J DRIVER ---
+# The app holds one ForkSafeDriver for its whole life. The real driver (and
+# its Bolt connection pool) is created on first use in each process, so a
+# pre-fork server that imports the app in the master never shares sockets
+# with its workers: every worker opens its own pool after fork.
+
+def ping(tx):
+    tx.run("RETURN 1").consume()
+
+class ForkSafeDriver:
+    def __init__(self, uri, auth, fetch_size=1000, session_wrapper=None, **config):
+        self.uri = uri
+        self.auth = auth
+        self.fetch_size = fetch_size
+        self.session_wrapper = session_wrapper  # e.g. metrics.InstrumentedSession
+        self.config = config    # max_connection_pool_size, connection_acquisition_timeout, ...
+        self._driver = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def driver(self):
+        if self._driver is not None and self._pid == os.getpid():
+            return self._driver
+        if self._pid != os.getpid():
+            # A lock inherited from the parent may have been held at fork time
+            self._lock = threading.Lock()
+        with self._lock:
+            if self._driver is None or self._pid != os.getpid():
+                self._driver = GraphDatabase.driver(self.uri, auth=self.auth, **self.config)
+                self._pid = os.getpid()
+        return self._driver
+
+    def session(self, **kwargs):
+        kwargs.setdefault("fetch_size", self.fetch_size)
+        session = self.driver.session(**kwargs)
+        return self.session_wrapper(session) if self.session_wrapper else session
+
+    def warm(self, connections=1):
+        # Opens `connections` pooled connections concurrently so the first
+        # requests of a fresh worker do not pay for the Bolt handshakes
+        start = time.perf_counter()
+        errors = []
+        def run():
+            try:
+                with self.session() as session:
+                    session.execute_read(ping)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=run, daemon=True) for _ in range(max(1, connections))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            print(f"⚠️ Connection pool warm-up failed (pid {os.getpid()}): {errors[0]}")
+        else:
+            print(f"🔌 Warmed {len(threads)} Bolt connections in {time.perf_counter() - start:.2f}s (pid {os.getpid()})")
+        return not errors
+
+    def close(self):
+        if self._driver is not None and self._pid == os.getpid():
+            self._driver.close()
+        self._driver = None
+
+    def __getattr__(self, name):
+        # verify_connectivity, execute_query, ... on this process' driver
+        return getattr(self.driver, name)
+
+# --- QUERY STEPS ---
+# A read made of dependent queries is written once as a generator function
+# that yields (query, params), gets back the list of records and returns the
+# result (ego_graph.expand_steps, graph_summary.summary_steps). run_steps
+# drives it on a sync transaction, asgi_app.run_steps on an async one. The
+# generator is created inside the transaction function, so a retried
+# transaction starts it over.
+
+def run_steps(tx, steps, *args):
+    generator = steps(*args)
+    try:
+        query, params = next(generator)
+        while True:
+            query, params = generator.send(list(tx.run(query, params)))
+    except StopIteration as done:
+        return done.value
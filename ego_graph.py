@@ -0,0 +1,99 @@
+import db
+import metrics
+
+# --- EGO GRAPH ---
+# k-hop neighbourhood of one person for /api/graph/<name>?depth=k, expanded
+# one hop per query from the frontier of the previous hop:
+# - every frontier node follows at most `fanout` relationships, to its
+#   highest degree neighbours first (ties by name), so the sample is
+#   deterministic and one hub cannot fill the payload on its own
+# - `types` restricts the relationship types followed (None = all)
+# - the whole graph stops at MAX_NODES; the hop crossing it is cut in
+#   frontier order and the result is flagged as truncated
+# Each hop is one round trip and at most MAX_NODES nodes come back, whatever
+# the depth. Frontier nodes are looked up by element id (NodeByElementIdSeek);
+# the labels keep the planner off a scan of every node should it not seek.
+
+MAX_DEPTH = 3
+DEFAULT_FANOUT = 25
+MAX_FANOUT = 100
+MAX_NODES = 1000
+
+ROOT_QUERY = metrics.name_query("ego_root", """
+    MATCH (p:Person {name: $name})
+    RETURN elementId(p) AS eid, p AS node
+""")
+
+HOP_QUERY = metrics.name_query("ego_hop", """
+    UNWIND $frontier AS source
+    MATCH (n:Person|House) WHERE elementId(n) = source
+    CALL {
+        WITH n
+        MATCH (n)-[r]-(m)
+        WHERE $types IS NULL OR type(r) IN $types
+        WITH r, m, COUNT { (m)--() } AS degree
+        ORDER BY degree DESC, coalesce(m.name, m.id)
+        LIMIT $fanout
+        RETURN r, m, degree
+    }
+    RETURN source, elementId(m) AS eid, m AS node, elementId(r) AS rid, type(r) AS type,
+           startNode(r) = n AS outgoing, degree
+""")
+
+def node_data(node, depth):
+    name = node.get("name")
+    if "House" in node.labels:
+        return {"id": node.get("id", name), "label": name, "group": "house", "depth": depth}
+    return {"id": node.get("id", name), "label": name or "Unknown", "group": "person",
+            "house": node.get("house"), "depth": depth}
+
+def empty(depth, fanout):
+    return {"elements": {"nodes": [], "edges": []}, "root": None, "depth": depth,
+            "fanout": fanout, "truncated": False}
+
+def expand_steps(name, depth=1, fanout=DEFAULT_FANOUT, types=None):
+    # Query steps (db.run_steps) of expand()
+    roots = yield ROOT_QUERY, {"name": name}
+    if not roots:
+        return None
+    root = roots[0]
+    nodes = {root["eid"]: node_data(root["node"], 0)}
+    edges = {}
+    frontier = [root["eid"]]
+    truncated = False
+    for hop in range(1, depth + 1):
+        if not frontier:
+            break
+        next_frontier = []
+        params = {"frontier": frontier, "fanout": fanout, "types": list(types) if types else None}
+        for record in (yield HOP_QUERY, params):
+            if record["eid"] not in nodes:
+                if len(nodes) >= MAX_NODES:
+                    truncated = True
+                    continue
+                nodes[record["eid"]] = node_data(record["node"], hop)
+                next_frontier.append(record["eid"])
+            if record["rid"] not in edges:
+                ends = (record["source"], record["eid"]) if record["outgoing"] else (record["eid"], record["source"])
+                edges[record["rid"]] = (ends, record["type"])
+        frontier = next_frontier
+    return {
+        "elements": {
+            "nodes": [{"data": data} for data in nodes.values()],
+            "edges": [{"data": {"source": nodes[s]["id"], "target": nodes[t]["id"], "label": rel_type}}
+                      for (s, t), rel_type in edges.values()]
+        },
+        "root": nodes[root["eid"]]["id"],
+        "depth": depth,
+        "fanout": fanout,
+        "truncated": truncated
+    }
+
+def expand(tx, name, depth=1, fanout=DEFAULT_FANOUT, types=None):
+    # None when `name` is not a person
+    return db.run_steps(tx, expand_steps, name, depth, fanout, types)
+
+def parse_types(param):
+    # "FRIEND_OF,ENEMY_OF" -> ("ENEMY_OF", "FRIEND_OF"), sorted for cache keys
+    types = {t.strip() for t in (param or "").split(',') if t.strip()}
+    return tuple(sorted(types)) or None
@@ -0,0 +1,195 @@
+from neo4j import GraphDatabase
+import numpy as np
+import argparse
+import os
+import threading
+import time
+
+import rules
+
+# --- FEATURE STORE ---
+# Each person's relation-by-house count vector (16 ints, FEATURE_COLUMNS order)
+# is materialised on the node as p.house_features and can be exported to a
+# local columnar file (FEATURES_FILE, .npz) for training.
+# Vectors are refreshed for the touched persons and their neighbours whenever
+# relationships change (ingestion, /predict registrations), so training reads
+# one matrix in one scan instead of re-aggregating every relationship.
+#
+# A profile's vector at serving time is the sum of the one-hot house vectors
+# of its neighbours per relation, read from an in-memory HouseIndex.
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "testpassword")
+FEATURES_FILE = os.getenv("FEATURES_FILE", "features.npz")
+BATCH_SIZE = int(os.getenv("FEATURE_BATCH_SIZE", "500"))
+
+HOUSES = ['Gryffindor', 'Slytherin', 'Ravenclaw', 'Hufflepuff']
+# Profile keys (as sent to /predict) and the relationship they stand for
+RELATIONS = [
+    ('friends', 'FRIEND_OF'),
+    ('enemies', 'ENEMY_OF'),
+    ('family', 'SAME_FAMILY'),
+    ('partners', 'ROMANTIC_WITH')
+]
+# Feature Vector (order must match training)
+FEATURE_COLUMNS = [
+    'friend_g', 'friend_s', 'friend_r', 'friend_h',
+    'enemy_g', 'enemy_s', 'enemy_r', 'enemy_h',
+    'fam_g', 'fam_s', 'fam_r', 'fam_h',
+    'love_g', 'love_s', 'love_r', 'love_h'
+]
+
+# Friends of `p` as `friends` (one house per stored FRIEND_OF), plus
+# `housemates` implied friends in the house `home` (rules.IMPLICIT_FRIENDS):
+# the other members of p's House hub, with stored edges inside the hub
+# skipped so nobody is counted twice. Takes $excluded (rules.EXCLUDED_HOUSES).
+if rules.IMPLICIT_FRIENDS:
+    FRIENDS_CLAUSE = """
+    OPTIONAL MATCH (p)-[:BELONGS_TO]->(hub:House)
+    WHERE NOT hub.name IN $excluded
+    WITH p, hub, CASE WHEN hub IS NULL THEN 0 ELSE COUNT { (hub)<-[:BELONGS_TO]-(:Person) } - 1 END AS housemates
+    WITH p, hub.name AS home, housemates,
+         [(p)-[:FRIEND_OF]-(x:Person) WHERE hub IS NULL OR NOT (x)-[:BELONGS_TO]->(hub) | x.house] AS friends
+"""
+else:
+    FRIENDS_CLAUSE = """
+    WITH p, null AS home, 0 AS housemates, [(p)-[:FRIEND_OF]-(x:Person) | x.house] AS friends
+"""
+
+# FEATURE_COLUMNS vector of `p`, after FRIENDS_CLAUSE. Pattern comprehensions
+# visit each relationship once per person, giving the same counts as the
+# chained OPTIONAL MATCH/aggregate stages used before.
+FEATURES_EXPRESSION = """
+        [h IN $houses | size([x IN friends WHERE x = h]) + CASE WHEN h = home THEN housemates ELSE 0 END] +
+        [h IN $houses | size([(p)-[:ENEMY_OF]-(x:Person) WHERE x.house = h | x])] +
+        [h IN $houses | size([(p)-[:SAME_FAMILY]-(x:Person) WHERE x.house = h | x])] +
+        [h IN $houses | size([(p)-[:ROMANTIC_WITH]-(x:Person) WHERE x.house = h | x])]
+"""
+
+REFRESH_QUERY = """
+    UNWIND $names AS name
+    MATCH (p:Person {name: name})
+""" + FRIENDS_CLAUSE + """
+    SET p.house_features =
+""" + FEATURES_EXPRESSION
+
+def query_params(**params):
+    # Parameters every query built on FRIENDS_CLAUSE needs
+    return dict(params, houses=HOUSES, excluded=sorted(rules.EXCLUDED_HOUSES))
+
+def refresh(tx, names):
+    tx.run(REFRESH_QUERY, query_params(names=list(names)))
+
+def neighbourhood(tx, names):
+    result = tx.run("""
+        UNWIND $names AS name
+        MATCH (p:Person {name: name})
+        OPTIONAL MATCH (p)-[]-(n:Person)
+        RETURN collect(DISTINCT p.name) + collect(DISTINCT n.name) AS names
+    """, {"names": list(names)})
+    record = result.single()
+    return sorted(set(record["names"])) if record else []
+
+def refresh_neighbourhood(tx, names):
+    # A person's house or links also change the vectors of everyone linked to it
+    affected = neighbourhood(tx, names)
+    for i in range(0, len(affected), BATCH_SIZE):
+        refresh(tx, affected[i:i + BATCH_SIZE])
+    return len(affected)
+
+def all_names(tx):
+    return [r["name"] for r in tx.run("MATCH (p:Person) RETURN p.name AS name")]
+
+def materialise_all(session, batch_size=BATCH_SIZE):
+    names = session.execute_read(all_names)
+    start = time.perf_counter()
+    for i in range(0, len(names), batch_size):
+        session.execute_write(refresh, names[i:i + batch_size])
+    print(f"  Materialised features for {len(names)} persons in {time.perf_counter() - start:.2f}s")
+    return len(names)
+
+def read_matrix(tx, houses=HOUSES):
+    result = tx.run("""
+        MATCH (p:Person)
+        WHERE p.house IN $houses AND p.house_features IS NOT NULL
+        RETURN p.name AS name, p.house AS house, p.house_features AS features
+    """, {"houses": houses})
+    names, labels, rows = [], [], []
+    for r in result:
+        names.append(r["name"])
+        labels.append(r["house"])
+        rows.append(r["features"])
+    X = np.array(rows, dtype=np.int32).reshape(len(rows), len(FEATURE_COLUMNS))
+    return np.array(names, dtype=object), np.array(labels, dtype=object), X
+
+def save_file(names, labels, X, path=None):
+    np.savez_compressed(path or FEATURES_FILE, names=names.astype(str), houses=labels.astype(str), features=X)
+
+def load_file(path=None):
+    data = np.load(path or FEATURES_FILE)
+    return data["names"], data["houses"], data["features"]
+
+# --- SERVING ---
+
+def profile_features(profile, houses):
+    # Sum of the one-hot house vectors of the profile's neighbours per relation
+    # (each person counted once per relation)
+    features = np.zeros((len(RELATIONS), len(HOUSES)), dtype=np.int64)
+    for i, (key, _) in enumerate(RELATIONS):
+        for n in set(profile.get(key) or []):
+            h = houses.get(n)
+            if h is not None:
+                features[i, h] += 1
+    return features.ravel().tolist()
+
+def fetch_houses(tx):
+    codes = {h: i for i, h in enumerate(HOUSES)}
+    result = tx.run("MATCH (p:Person) RETURN p.name AS name, p.house AS house")
+    return {r["name"]: codes[r["house"]] for r in result if r["house"] in codes}
+
+class HouseIndex:
+    # name -> house code for every Person, reloaded when the graph version moves
+    def __init__(self, driver, version):
+        self.driver = driver
+        self.version = version
+        self._houses = None
+        self._built_version = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            current = self.version.current()
+            if self._houses is None or current != self._built_version:
+                with self.driver.session() as session:
+                    self._houses = session.execute_read(fetch_houses)
+                self._built_version = current
+        return self._houses
+
+    def houses(self):
+        houses = self._houses
+        if houses is None:
+            return self.refresh()
+        if self.version.current() != self._built_version and not self._lock.locked():
+            # Keep serving the previous map while the new one loads
+            threading.Thread(target=self.refresh, daemon=True).start()
+        return houses
+
+    def set(self, name, house):
+        # Local registrations are visible before the next reload
+        if self._houses is not None and house in HOUSES:
+            self._houses[name] = HOUSES.index(house)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialise per-person house feature vectors")
+    parser.add_argument("--export", action="store_true", help=f"also write {FEATURES_FILE}")
+    args = parser.parse_args()
+
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    with driver.session() as session:
+        materialise_all(session)
+        if args.export:
+            names, labels, X = session.execute_read(read_matrix)
+            save_file(names, labels, X)
+            print(f"  Exported {X.shape[0]} x {X.shape[1]} feature matrix to {FEATURES_FILE}")
+    driver.close()
@@ -1,11 +1,24 @@
 import requests
 from neo4j import GraphDatabase
+import argparse
+import hashlib
+import json
 import os
+import time
+
+import feature_store
+import graph_version
+import registration
+import rules
+import schema
 
 # --- CONFIG ---
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "testpassword")
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+SNAPSHOT_FILE = os.getenv("HP_SNAPSHOT_FILE", "hp_characters.json")
+SYNC_STATE_FILE = os.getenv("SYNC_STATE_FILE", "sync_state.json")
 
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
 
@@ -56,6 +69,11 @@ NAME_MAP = {
     "Andromeda Black": "Andromeda Tonks"
 }
 
+# Reverse of NAME_MAP, stored as extra aliases for search
+ALIASES = {}
+for alias, canonical in NAME_MAP.items():
+    ALIASES.setdefault(canonical, []).append(alias)
+
 def fetch_hp_api():
     print("Fetching HP-API...")
     try:
@@ -64,85 +82,240 @@ def fetch_hp_api():
         print(f"Error fetching HP-API: {e}")
         return []
 
-def clear_db(tx):
-    tx.run("MATCH (n) DETACH DELETE n")
+def load_characters(offline=False):
+    # The last successful fetch is kept as a snapshot so refreshes also work offline
+    if not offline:
+        data = fetch_hp_api()
+        if data:
+            with open(SNAPSHOT_FILE, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            return data
+        print("⚠️ HP-API unavailable, falling back to snapshot")
+    if not os.path.exists(SNAPSHOT_FILE):
+        print(f"⚠️ No snapshot found at {SNAPSHOT_FILE}")
+        return []
+    with open(SNAPSHOT_FILE, encoding='utf-8') as f:
+        return json.load(f)
 
-def create_constraints(tx):
-    tx.run("CREATE CONSTRAINT person_name IF NOT EXISTS FOR (p:Person) REQUIRE p.name IS UNIQUE;")
-    tx.run("CREATE CONSTRAINT house_name IF NOT EXISTS FOR (h:House) REQUIRE h.name IS UNIQUE;")
+def clear_db(tx):
+    # The graph version marker survives so caches keyed on it stay valid, and
+    # registered users survive too (their links are re-attached after the
+    # reload, see registration.read_registrations)
+    tx.run("MATCH (n) WHERE NOT n:Meta AND coalesce(n.isUser, false) = false DETACH DELETE n")
 
-def insert_data(tx, characters):
-    print("  Inserting Characters & Houses...")
+def to_rows(characters):
+    # Flatten HP-API records into the parameter rows used by the UNWIND writers
+    rows = []
     for c in characters:
         name = c.get('name')
         if not name: continue
-        
-        house = c.get('house') or "Unknown"
-        
-        # Insert House
-        if house:
-            tx.run("MERGE (h:House {name: $name})", {"name": house})
-            
-        # Insert Person
-        tx.run("""
-            MERGE (p:Person {name: $name})
-            SET p.house = $house,
-                p.species = $species,
-                p.gender = $gender,
-                p.alive = $alive,
-                p.image = $image,
-                p.id = $id
-        """, {
+        rows.append({
             "name": name,
-            "house": house,
+            "house": c.get('house') or "Unknown",
             "species": c.get("species"),
             "gender": c.get("gender"),
             "alive": c.get("alive", True),
             "image": c.get("image", ""),
-            "id": c.get("id", name) 
+            "id": c.get("id", name),
+            "alternate_names": (c.get("alternate_names") or []) + ALIASES.get(name, [])
         })
-        
-        # Link Person -> House
-        if house:
-            tx.run("""
-                MATCH (p:Person {name: $name})
-                MATCH (h:House {name: $house})
-                MERGE (p)-[:BELONGS_TO]->(h)
-            """, {"name": name, "house": house})
-
-def create_rules_relationships(tx):
-    print("  Creating Rule-Based Relationships...")
-    
-    # 1. SAME FAMILY (Same Last Name)
-    # We'll do this in Cypher by splitting name. 
-    # Assumption: Last word is last name.
-    # We avoid matching common names or single names loosely if possible, 
-    # but for HP-API 'First Last' is standard.
-    # excluding 'Unknown' houses or empty names
+    return rows
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def write_houses(tx, houses):
     tx.run("""
-        MATCH (a:Person), (b:Person)
-        WHERE a.name CONTAINS ' ' AND b.name CONTAINS ' ' 
-        AND split(a.name, ' ')[-1] = split(b.name, ' ')[-1]
-        AND id(a) < id(b)
-        MERGE (a)-[:SAME_FAMILY]->(b)
-    """)
-    
-    # 2. FRIEND (AMI) = Same House
-    # User specified "Gryffondor", implied all houses.
+        UNWIND $houses AS house
+        MERGE (h:House {name: house})
+    """, {"houses": houses})
+
+def write_persons(tx, rows):
+    tx.run("""
+        UNWIND $rows AS row
+        MERGE (p:Person {name: row.name})
+        SET p.house = row.house,
+            p.species = row.species,
+            p.gender = row.gender,
+            p.alive = row.alive,
+            p.image = row.image,
+            p.id = row.id,
+            p.alternate_names = row.alternate_names
+    """, {"rows": rows})
+
+def link_houses(tx, rows):
+    tx.run("""
+        UNWIND $rows AS row
+        MATCH (p:Person {name: row.name})
+        MATCH (h:House {name: row.house})
+        MERGE (p)-[:BELONGS_TO]->(h)
+    """, {"rows": rows})
+
+def insert_chunk(tx, rows):
+    # One statement per entity type: Houses, Persons, then Person -> House links
+    write_houses(tx, sorted({r["house"] for r in rows}))
+    write_persons(tx, rows)
+    link_houses(tx, rows)
+
+def insert_data(tx, characters):
+    print("  Inserting Characters & Houses...")
+    insert_chunk(tx, to_rows(characters))
+
+def insert_data_batched(session, characters, batch_size=BATCH_SIZE):
+    # Each chunk is its own managed transaction, so transient failures
+    # (deadlocks, leader switches) are retried by the driver per chunk
+    # instead of replaying the whole load.
+    rows = to_rows(characters)
+    total = len(rows)
+    print(f"  Inserting {total} Characters & Houses in batches of {batch_size}...")
+
+    start = time.perf_counter()
+    done = 0
+    for chunk in chunked(rows, batch_size):
+        session.execute_write(insert_chunk, chunk)
+        done += len(chunk)
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed > 0 else 0
+        print(f"    [{done}/{total}] {rate:.0f} rows/s")
+
+    elapsed = time.perf_counter() - start
+    print(f"  Inserted {done} rows in {elapsed:.2f}s")
+    return done
+
+def create_rules_relationships(session, batch_size=BATCH_SIZE):
+    print("  Creating Rule-Based Relationships...")
+    # Persons are read once and grouped in Python (see rules.py) instead of
+    # MATCH (a:Person), (b:Person) cartesian products in Cypher.
+    persons = session.execute_read(rules.fetch_persons)
+    rules.apply_rules(session, persons, batch_size)
+
+# --- INCREMENTAL SYNC ---
+# The state file keeps a content hash (plus the house, needed to find the
+# rule groups a person used to be in) for every character of the last load.
+# A sync only writes rows whose hash changed and recomputes rule edges for
+# the affected surname/house groups, so an unchanged feed costs no writes.
+# User nodes registered by /predict are never touched.
+
+def row_hash(row):
+    return hashlib.sha1(json.dumps(row, sort_keys=True).encode('utf-8')).hexdigest()
+
+def load_state():
+    if not os.path.exists(SYNC_STATE_FILE):
+        return {}
+    with open(SYNC_STATE_FILE, encoding='utf-8') as f:
+        return json.load(f).get("persons", {})
+
+def save_state(rows):
+    persons = {r["name"]: {"hash": row_hash(r), "house": r["house"]} for r in rows}
+    with open(SYNC_STATE_FILE, 'w', encoding='utf-8') as f:
+        json.dump({"persons": persons}, f)
+
+def unlink_stale_houses(tx, rows):
     tx.run("""
-        MATCH (a:Person), (b:Person)
-        WHERE a.house <> '' AND a.house <> 'Unknown' 
-        AND a.house = b.house
-        AND id(a) < id(b)
-        MERGE (a)-[:FRIEND_OF]->(b)
-    """)
-
-    # 3. ENEMY (ENNEMI) = Gryffindor vs Slytherin
+        UNWIND $rows AS row
+        MATCH (p:Person {name: row.name})-[r:BELONGS_TO]->(h:House)
+        WHERE h.name <> row.house
+        DELETE r
+    """, {"rows": rows})
+
+def upsert_chunk(tx, rows):
+    insert_chunk(tx, rows)
+    unlink_stale_houses(tx, rows)
+
+def delete_persons(tx, names):
     tx.run("""
-        MATCH (a:Person {house: 'Gryffindor'}), (b:Person {house: 'Slytherin'})
-        MERGE (a)-[:ENEMY_OF]->(b)
-        MERGE (b)-[:ENEMY_OF]->(a)
-    """)
+        UNWIND $names AS name
+        MATCH (p:Person {name: name})
+        WHERE coalesce(p.isUser, false) = false
+        DETACH DELETE p
+    """, {"names": names})
+
+def diff_rows(rows, state):
+    changed = [r for r in rows if state.get(r["name"], {}).get("hash") != row_hash(r)]
+    names = {r["name"] for r in rows}
+    deleted = [name for name in state if name not in names]
+    return changed, deleted
+
+def group_edge_diff(rule, old_persons, new_persons, keys):
+    # Same-group rules are cliques: only the edges of members who joined or
+    # left a group change, so the diff is per member instead of per pair.
+    old_groups = rules.group_by(old_persons, rule["key"])
+    new_groups = rules.group_by(new_persons, rule["key"])
+    added, removed = set(), set()
+    for key in keys:
+        old_members = old_groups.get(key, [])
+        new_members = new_groups.get(key, [])
+        joined = set(new_members) - set(old_members)
+        left = set(old_members) - set(new_members)
+        added.update(rules.member_edges(new_members, joined))
+        removed.update(rules.member_edges(old_members, left))
+    return added, removed
+
+def pair_edge_diff(rule, old_persons, new_persons, keys):
+    old_edges = set(rules.rule_edges(rule, old_persons, keys))
+    new_edges = set(rules.rule_edges(rule, new_persons, keys))
+    return new_edges - old_edges, old_edges - new_edges
+
+def sync_rules(session, old_persons, new_persons, touched, deleted, batch_size):
+    # Only groups containing a touched person (before or after the change)
+    # are diffed, so unchanged pairs are not rewritten.
+    # Edges of deleted persons are already gone with DETACH DELETE.
+    # Returns the endpoints of every added/removed edge.
+    deleted = set(deleted)
+    endpoints = set()
+    for rule in rules.stored_rules():
+        keys = set()
+        for p in touched:
+            k = rule["key"](p)
+            if k is not None:
+                keys.add(k)
+        if not keys:
+            continue
+        diff = group_edge_diff if rule["pairs"] is rules.same_group else pair_edge_diff
+        added, removed = diff(rule, old_persons, new_persons, keys)
+        for a, b in added | removed:
+            endpoints.add(a)
+            endpoints.add(b)
+        if added:
+            rules.write_edges(session, rule["type"], sorted(added), batch_size)
+        removed = [(a, b) for a, b in sorted(removed)
+                   if a not in deleted and b not in deleted]
+        if removed:
+            rules.write_edges(session, rule["type"], removed, batch_size, writer=rules.delete_edges)
+    return endpoints
+
+def sync_data(session, characters, batch_size=BATCH_SIZE):
+    # Deduplicate by name, the last record wins as it would with MERGE + SET
+    rows = list({r["name"]: r for r in to_rows(characters)}.values())
+    state = load_state()
+    changed, deleted = diff_rows(rows, state)
+    inserted = sum(1 for r in changed if r["name"] not in state)
+    affected = set()
+    print(f"  Sync: {inserted} new, {len(changed) - inserted} updated, {len(deleted)} deleted, "
+          f"{len(rows) - len(changed)} unchanged")
+
+    if changed or deleted:
+        for chunk in chunked(changed, batch_size):
+            session.execute_write(upsert_chunk, chunk)
+        for chunk in chunked(deleted, batch_size):
+            session.execute_write(delete_persons, chunk)
+
+        old_persons = [{"name": name, "house": s["house"]} for name, s in state.items()]
+        new_persons = [{"name": r["name"], "house": r["house"]} for r in rows]
+        touched = [{"name": r["name"], "house": r["house"]} for r in changed]
+        touched += [{"name": name, "house": state[name]["house"]}
+                    for name in {r["name"] for r in changed}.union(deleted) if name in state]
+        affected = sync_rules(session, old_persons, new_persons, touched, deleted, batch_size)
+        affected.update(r["name"] for r in changed)
+        if rules.IMPLICIT_FRIENDS:
+            # Implied friendships changed for everyone in the houses a touched
+            # person left or joined
+            houses = {rules.house_key(p) for p in touched} - {None}
+            affected.update(p["name"] for p in old_persons + new_persons if p["house"] in houses)
+
+    save_state(rows)
+    return changed, deleted, affected
 
 def create_romances(tx):
     print("  Creating Romances...")
@@ -163,14 +336,52 @@ def create_romances(tx):
         """, {"p1": p1, "p2": p2})
 
 if __name__ == "__main__":
-    data = fetch_hp_api()
-    print(f"Fetched {len(data)} characters from HP-API.")
+    parser = argparse.ArgumentParser(description="Load HP-API characters into Neo4j")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="rows (or edges) per ingestion transaction")
+    parser.add_argument("--sync", action="store_true",
+                        help="incremental refresh: only write characters that changed since the last run")
+    parser.add_argument("--offline", action="store_true",
+                        help=f"read characters from the local snapshot ({SNAPSHOT_FILE})")
+    parser.add_argument("--prune-implied-friends", action="store_true",
+                        help="delete stored same-house FRIEND_OF edges (for IMPLICIT_FRIENDS=1) and exit")
+    args = parser.parse_args()
+
+    if args.prune_implied_friends:
+        if not rules.IMPLICIT_FRIENDS:
+            parser.error("--prune-implied-friends needs IMPLICIT_FRIENDS=1 (the app would lose those friendships)")
+        with driver.session() as session:
+            if rules.prune_implied(session, args.batch_size):
+                session.execute_write(graph_version.bump)
+        driver.close()
+        raise SystemExit(0)
+
+    data = load_characters(offline=args.offline)
+    print(f"Loaded {len(data)} characters.")
     
     with driver.session() as session:
-        session.execute_write(clear_db)
-        session.execute_write(create_constraints)
-        session.execute_write(insert_data, data)
-        session.execute_write(create_rules_relationships)
-        session.execute_write(create_romances)
+        schema.migrate(session)
+        if args.sync:
+            changed, deleted, affected = sync_data(session, data, args.batch_size)
+            if changed:
+                session.execute_write(create_romances)
+            if affected:
+                refreshed = session.execute_write(feature_store.refresh_neighbourhood, sorted(affected))
+                print(f"  Refreshed features for {refreshed} persons")
+            if changed or deleted:
+                session.execute_write(graph_version.bump)
+        else:
+            users = session.execute_read(registration.read_registrations)
+            session.execute_write(clear_db)
+            insert_data_batched(session, data, args.batch_size)
+            create_rules_relationships(session, args.batch_size)
+            session.execute_write(create_romances)
+            if users:
+                print(f"  Re-linking {len(users)} registered users...")
+                for chunk in chunked(users, args.batch_size):
+                    session.execute_write(registration.register_users, chunk)
+            feature_store.materialise_all(session, args.batch_size)
+            save_state(list({r["name"]: r for r in to_rows(data)}.values()))
+            session.execute_write(graph_version.bump)
         
     print("Done! Database updated with HP-API and new rules.")
@@ -0,0 +1,274 @@
+from neo4j import GraphDatabase
+import argparse
+import os
+
+import db
+import metrics
+import registration
+import rules
+
+# --- GRAPH SUMMARY (LEVEL OF DETAIL) ---
+# A bounded view of the houses graph for /api/graph/houses?detail=summary:
+# - every selected house is one hub node carrying its member count and its
+#   internal relationship counts
+# - relationships between houses become one weighted edge per
+#   (source house, target house, type)
+# - dense relationship blocks, i.e. a (house, house, type) holding at least
+#   DENSE_RATIO of all possible pairs, are only drawn at hub level. The rules
+#   in rules.py make FRIEND_OF a clique per house and ENEMY_OF complete
+#   between Gryffindor and Slytherin, so those never reach person level.
+# - only the top persons by degree (inside the selection) are shown, each
+#   linked to its hub. Their links to other shown persons are kept as is, and
+#   links to hidden persons are aggregated into one weighted edge per
+#   (person, type, house of the hidden persons).
+# - expand={house: count} shows the first `count` members of a house by
+#   degree in addition to the global top, for expand-on-demand
+# Nodes are bounded by houses + MAX_PERSONS and edges by a small multiple of
+# that, whatever the size of the graph. Ranking (ORDER BY degree LIMIT) and
+# aggregation run in Cypher, so only the shown persons and aggregated rows
+# cross the wire.
+# Rule blocks (rules.py `blocks`: the same-house FRIEND_OF clique, ENEMY_OF
+# between Gryffindor and Slytherin) are complete by construction, so their
+# edge counts and the degree they add come from the house sizes; the queries
+# never expand those types, which would be O(house²). Only edges of those
+# types written by registrations (from isUser persons) are read. Registered
+# users take no part in the rules (get_insert.py), so the block sizes count
+# the other persons only, users rank by the edges they have, and the edges
+# they wrote count in their own degree only. With rules.IMPLICIT_FRIENDS the
+# same-house FRIEND_OF block comes from the hub member counts instead, so the
+# summary is the same. `python graph_summary.py HOUSE...` compares the block
+# counts with the stored edges (check_blocks).
+
+DEFAULT_TOP = 50
+MAX_PERSONS = 300
+DENSE_RATIO = 0.5
+
+# Relationship types between persons: counted from house sizes (BLOCK_RULES)
+# or read (SCANNED_TYPES)
+PERSON_TYPES = sorted({rule["type"] for rule in rules.RULES} | set(registration.LINK_TYPES.values()))
+BLOCK_RULES = [rule for rule in rules.stored_rules() if rule["key"] is rules.house_key and rule.get("blocks")]
+BLOCK_TYPES = "|".join(sorted({rule["type"] for rule in BLOCK_RULES}))
+SCANNED_TYPES = "|".join(t for t in PERSON_TYPES if t not in {rule["type"] for rule in BLOCK_RULES})
+ALL_TYPES = "|".join(PERSON_TYPES)
+
+HUBS_QUERY = metrics.name_query("summary_hubs", """
+    UNWIND $houses AS house
+    OPTIONAL MATCH (h:House {name: house})
+    RETURN house AS name, coalesce(h.id, house) AS id,
+           CASE WHEN h IS NULL THEN 0 ELSE COUNT { (h)<-[:BELONGS_TO]-(:Person) } END AS members,
+           COUNT { MATCH (p:Person) WHERE p.house = house } AS persons,
+           COUNT { MATCH (p:Person) WHERE p.house = house AND coalesce(p.isUser, false) = false } AS ruled
+""")
+
+# Top persons of $rank_houses by degree inside the selection: read edges plus
+# the block degree of their house and the implied friends of their hub, or
+# every edge of a registered user (a few)
+PERSONS_QUERY = metrics.name_query("summary_persons", """
+    MATCH (p:Person)
+    WHERE p.house IN $rank_houses
+    WITH p, [(p)-[:BELONGS_TO]->(h:House) WHERE h.name IN $houses | h.name][0] AS hub
+    WITH p, hub,
+         CASE WHEN coalesce(p.isUser, false)
+              THEN COUNT { (p)-[:""" + ALL_TYPES + """]-(m:Person) WHERE m.house IN $houses }
+              ELSE COUNT { (p)-[:""" + SCANNED_TYPES + """]-(m:Person) WHERE m.house IN $houses }
+                   + coalesce($block_degree[p.house], 0)
+         END + coalesce($implied[hub], 0) AS degree
+    RETURN coalesce(p.id, p.name) AS id, p.name AS name, p.house AS house, hub, degree
+    ORDER BY degree DESC, name
+    LIMIT $limit
+""")
+
+HOUSE_EDGES_QUERY = metrics.name_query("summary_house_edges", """
+    MATCH (a:Person)-[r:""" + SCANNED_TYPES + """]->(b:Person)
+    WHERE a.house IN $houses AND b.house IN $houses
+    RETURN a.house AS source, b.house AS target, type(r) AS type, count(*) AS weight
+""")
+
+# Block types written by registrations (the user is the start node)
+USER_EDGES_QUERY = metrics.name_query("summary_user_edges", """
+    MATCH (a:Person)-[r:""" + (BLOCK_TYPES or SCANNED_TYPES) + """]->(b:Person)
+    WHERE a.house IN $houses AND a.isUser AND b.house IN $houses
+    RETURN a.house AS source, b.house AS target, type(r) AS type, count(*) AS weight
+""")
+
+# Every stored edge of the block types, for check_blocks (O(house²), offline)
+BLOCK_EDGES_QUERY = metrics.name_query("summary_block_edges", """
+    MATCH (a:Person)-[r:""" + (BLOCK_TYPES or SCANNED_TYPES) + """]->(b:Person)
+    WHERE a.house IN $houses AND b.house IN $houses
+    RETURN a.house AS source, b.house AS target, type(r) AS type, count(*) AS weight
+""")
+
+# Links of the shown persons: individually to other shown persons (target
+# set), aggregated per house otherwise
+PERSON_EDGES_QUERY = metrics.name_query("summary_person_edges", """
+    UNWIND $names AS name
+    MATCH (p:Person {name: name})-[r]-(m:Person)
+    WHERE m.house IN $houses
+    WITH p, r, m, coalesce(m.id, m.name) AS mid
+    RETURN coalesce(p.id, p.name) AS source, p.house AS source_house, type(r) AS type,
+           startNode(r) = p AS outgoing,
+           CASE WHEN mid IN $ids THEN mid END AS target, m.house AS target_house,
+           count(*) AS weight
+""")
+
+def rank(persons):
+    # Highest degree first, ties by name
+    return sorted(persons, key=lambda p: (-p["degree"], p["name"] or ""))
+
+def shown_persons(persons):
+    # The global top and the expanded members, once each, best ranked first
+    unique = {p["id"]: p for p in persons}
+    return rank(unique.values())[:MAX_PERSONS]
+
+def rule_blocks(ruled):
+    # {(source house, target house, type): edge count} of the BLOCK_RULES,
+    # from the number of persons the rules apply to per house
+    sizes = {h: n for h, n in ruled.items() if rules.house_key({"house": h})}
+    blocks = {}
+    for rule in BLOCK_RULES:
+        for (a, b), weight in rule["blocks"](sizes).items():
+            blocks[(a, b, rule["type"])] = weight
+    return blocks
+
+def block_degree(blocks, ruled):
+    # Degree every ruled member of a house gets from the blocks (complete, so
+    # each member of the source house has weight / n_source of them)
+    degree = {}
+    for (a, b, _), weight in blocks.items():
+        degree[a] = degree.get(a, 0) + weight / ruled[a]
+        degree[b] = degree.get(b, 0) + weight / ruled[b]
+    return {h: int(round(d)) for h, d in degree.items()}
+
+def implied_friends(hub_members):
+    # IMPLICIT_FRIENDS: hub -> members, for the hubs implying friendships
+    return {h: n for h, n in hub_members.items() if h not in rules.EXCLUDED_HOUSES and n > 1}
+
+def summary_steps(houses, top=DEFAULT_TOP, expand=None):
+    # Query steps (db.run_steps) of summarise()
+    params = {"houses": houses}
+    hub_rows = yield HUBS_QUERY, params
+    hubs = {r["name"]: r["id"] for r in hub_rows}
+    members = {r["name"]: r["persons"] for r in hub_rows}
+    ruled = {r["name"]: r["ruled"] for r in hub_rows}
+    blocks = rule_blocks(ruled)
+    implied = implied_friends({r["name"]: r["members"] for r in hub_rows}) if rules.IMPLICIT_FRIENDS else {}
+
+    ranking = dict(params, block_degree=block_degree(blocks, ruled), implied={h: n - 1 for h, n in implied.items()})
+    persons = []
+    if top > 0:
+        persons += yield PERSONS_QUERY, dict(ranking, rank_houses=houses, limit=min(top, MAX_PERSONS))
+    for house, count in (expand or {}).items():
+        if house in members and count > 0:
+            persons += yield PERSONS_QUERY, dict(ranking, rank_houses=[house], limit=count)
+    shown = shown_persons(persons)
+
+    house_edges = {(r["source"], r["target"], r["type"]): r["weight"] for r in (yield HOUSE_EDGES_QUERY, params)}
+    if BLOCK_TYPES:
+        for r in (yield USER_EDGES_QUERY, params):
+            key = (r["source"], r["target"], r["type"])
+            house_edges[key] = house_edges.get(key, 0) + r["weight"]
+    for key, weight in blocks.items():
+        house_edges[key] = house_edges.get(key, 0) + weight
+    for house, n in implied.items():
+        key = (house, house, "FRIEND_OF")
+        house_edges[key] = house_edges.get(key, 0) + n * (n - 1) // 2
+
+    ids = [p["id"] for p in shown]
+    names = [p["name"] for p in shown]
+    person_edges = (yield PERSON_EDGES_QUERY, {"houses": houses, "ids": ids, "names": names}) if ids else []
+    return build_elements(houses, hubs, members, shown, house_edges, person_edges)
+
+def summarise(tx, houses, top=DEFAULT_TOP, expand=None):
+    return db.run_steps(tx, summary_steps, houses, top, expand)
+
+def check_blocks(tx, houses):
+    # {(source house, target house, type): (summary count, stored edges)} of
+    # the block types where the two differ
+    if not BLOCK_TYPES:
+        return {}
+    params = {"houses": houses}
+    counted = rule_blocks({r["name"]: r["ruled"] for r in tx.run(HUBS_QUERY, params)})
+    for r in tx.run(USER_EDGES_QUERY, params):
+        key = (r["source"], r["target"], r["type"])
+        counted[key] = counted.get(key, 0) + r["weight"]
+    stored = {(r["source"], r["target"], r["type"]): r["weight"] for r in tx.run(BLOCK_EDGES_QUERY, params)}
+    return {key: (counted.get(key, 0), stored.get(key, 0)) for key in sorted(set(counted) | set(stored))
+            if counted.get(key, 0) != stored.get(key, 0)}
+
+def build_elements(houses, hubs, members, shown, house_edges, person_edges):
+    # house_edges: {(source house, target house, type): weight}
+    shown_count = {h: 0 for h in houses}
+    for p in shown:
+        shown_count[p["house"]] += 1
+
+    internal = {h: {} for h in houses}
+    dense = set()
+    edges = []
+    for (source, target, rel_type), weight in house_edges.items():
+        pairs = members.get(source, 0) * (members.get(target, 0) - (source == target))
+        if pairs and weight >= DENSE_RATIO * pairs:
+            dense.add((source, target, rel_type))
+        if source == target:
+            internal[source][rel_type] = weight
+        else:
+            edges.append({"data": {"source": hubs[source], "target": hubs[target],
+                                   "label": rel_type, "weight": weight,
+                                   "dense": (source, target, rel_type) in dense}})
+
+    nodes = []
+    for house in houses:
+        nodes.append({"data": {
+            "id": hubs[house], "label": house, "group": "house",
+            "members": members.get(house, 0),
+            "hidden_members": members.get(house, 0) - shown_count[house],
+            "internal": internal[house]
+        }})
+    for p in shown:
+        nodes.append({"data": {"id": p["id"], "label": p["name"] or "Unknown", "group": "person",
+                               "house": p["house"], "degree": p["degree"]}})
+        edges.append({"data": {"source": p["id"], "target": hubs[p["house"]], "label": "BELONGS_TO", "weight": 1}})
+
+    aggregated = {}
+    for e in person_edges:
+        block = ((e["source_house"], e["target_house"]) if e["outgoing"]
+                 else (e["target_house"], e["source_house"])) + (e["type"],)
+        if block in dense:
+            continue
+        if e["target"] is not None:
+            # Between two shown persons: seen from both ends, keep the outgoing side
+            if e["outgoing"]:
+                edges.append({"data": {"source": e["source"], "target": e["target"],
+                                       "label": e["type"], "weight": e["weight"]}})
+            continue
+        key = (e["source"], e["type"], e["target_house"], e["outgoing"])
+        aggregated[key] = aggregated.get(key, 0) + e["weight"]
+    for (source, rel_type, house, outgoing), weight in aggregated.items():
+        ends = (source, hubs[house]) if outgoing else (hubs[house], source)
+        edges.append({"data": {"source": ends[0], "target": ends[1], "label": rel_type,
+                               "weight": weight, "aggregated": True}})
+
+    return {"elements": {"nodes": nodes, "edges": edges}}
+
+def parse_expand(param):
+    # "Gryffindor:100,Slytherin:50" -> {"Gryffindor": 100, "Slytherin": 50}
+    expand = {}
+    for part in (param or "").split(','):
+        house, _, count = part.rpartition(':')
+        if house and count.isdigit():
+            expand[house] = min(int(count), MAX_PERSONS)
+    return expand
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the summary's rule block edge counts with the stored edges")
+    parser.add_argument("houses", nargs='+', help="houses of the summary")
+    args = parser.parse_args()
+
+    driver = GraphDatabase.driver(os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+                                  auth=(os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASSWORD", "testpassword")))
+    with driver.session() as session:
+        mismatches = session.execute_read(check_blocks, args.houses)
+    driver.close()
+    for (source, target, rel_type), (counted, stored) in mismatches.items():
+        print(f"  ✗  {source} -> {target} {rel_type}: counted {counted}, stored {stored}")
+    print("✅ Block counts match the stored edges" if not mismatches else f"❌ {len(mismatches)} blocks differ")
+    raise SystemExit(1 if mismatches else 0)
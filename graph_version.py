@@ -0,0 +1,75 @@
+import threading
+import time
+
+# --- GRAPH VERSION ---
+# Every write path (ingestion, /predict registrations) bumps a counter stored
+# on a single (:Meta {name: 'graph'}) node in the same transaction as its
+# writes. In-process caches compare the version they were built against with
+# GraphVersion.current(), which re-reads the counter at most every `ttl`
+# seconds (or right away after touch() when this process wrote itself).
+# Registrations bump their own counter (m.users) instead: a steady stream of
+# named /predict calls would otherwise invalidate every view and index on
+# every call. Readers combine both with Versions, re-reading the users
+# counter on a longer ttl, so registered users show up in the views within
+# that period and the views rebuild at most once per period for them.
+
+def bump(tx):
+    tx.run("""
+        MERGE (m:Meta {name: 'graph'})
+        SET m.version = coalesce(m.version, 0) + 1
+    """)
+
+def bump_users(tx):
+    tx.run("""
+        MERGE (m:Meta {name: 'graph'})
+        SET m.users = coalesce(m.users, 0) + 1
+    """)
+
+def read(tx):
+    record = tx.run("MATCH (m:Meta {name: 'graph'}) RETURN m.version AS version").single()
+    return record["version"] if record and record["version"] is not None else 0
+
+def read_users(tx):
+    record = tx.run("MATCH (m:Meta {name: 'graph'}) RETURN m.users AS users").single()
+    return record["users"] if record and record["users"] is not None else 0
+
+class GraphVersion:
+    def __init__(self, driver, ttl=5.0, reader=read):
+        self.driver = driver
+        self.ttl = ttl
+        self.reader = reader
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        if time.monotonic() - self._checked < self.ttl and self._version is not None:
+            return self._version
+        with self._lock:
+            if time.monotonic() - self._checked >= self.ttl or self._version is None:
+                try:
+                    with self.driver.session() as session:
+                        self._version = session.execute_read(self.reader)
+                except Exception as e:
+                    print(f"⚠️ Could not read graph version: {e}")
+                    if self._version is None:
+                        self._version = 0
+                self._checked = time.monotonic()
+        return self._version
+
+    def touch(self):
+        # Called after a local write so the next current() re-reads right away
+        self._checked = 0.0
+
+class Versions:
+    # Several counters read as one version (a tuple), e.g. the graph and
+    # users counters
+    def __init__(self, *versions):
+        self.versions = versions
+
+    def current(self):
+        return tuple(v.current() for v in self.versions)
+
+    def touch(self):
+        for v in self.versions:
+            v.touch()
@@ -0,0 +1,38 @@
+import multiprocessing
+import os
+import tempfile
+
+# --- PRODUCTION SERVER ---
+# gunicorn -c gunicorn.conf.py app:app
+# Pre-fork workers with a few threads each. The app is imported once in the
+# master (preload) with its in-memory indexes and models built inline, so the
+# workers share them copy-on-write; each worker then opens its own Bolt pool
+# (see db.py) and warms it before taking requests.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "4"))
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+keepalive = 5
+preload_app = os.getenv("WEB_PRELOAD", "1") == "1"
+accesslog = "-"
+
+if preload_app:
+    # Build indexes and models in the master, not in threads lost at fork
+    os.environ.setdefault("WARM_IN_BACKGROUND", "0")
+
+# Workers share their metrics through snapshot files, so any worker answers
+# /metrics for all of them (metrics.py). Point the scraper at this server as
+# a single target.
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"hp-metrics-{bind.rsplit(':', 1)[-1]}"))
+
+def on_starting(server):
+    import metrics
+    metrics.clear_dir()
+
+def post_fork(server, worker):
+    import app
+    import metrics
+    metrics.start_process()
+    app.warm_worker()
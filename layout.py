@@ -0,0 +1,125 @@
+import numpy as np
+
+# --- SERVER-SIDE GRAPH LAYOUT ---
+# Fruchterman-Reingold force-directed layout, vectorised with NumPy, so the
+# graph page can render with Cytoscape's `preset` layout instead of running
+# `cose` in the browser. Positions are cached by the app per view and graph
+# version, so the work is done once.
+#
+# Repulsion is exact (all pairs, in row blocks) up to EXACT_MAX nodes. Above
+# that it is approximated Barnes-Hut style on a grid: every node is pushed
+# by the centre of mass of each cell, its own cell excluding itself, which is
+# O(n * cells) with about 4 * sqrt(n) cells.
+
+EXACT_MAX = 1000
+ITERATIONS = 80
+SIZE = 1000.0
+BLOCK = 512
+GRAVITY = 1.0
+
+def repulsion_exact(pos, k2):
+    x, y = pos[:, 0], pos[:, 1]
+    disp = np.empty_like(pos)
+    for lo in range(0, len(pos), BLOCK):
+        dx = x[lo:lo + BLOCK, None] - x
+        dy = y[lo:lo + BLOCK, None] - y
+        force = k2 / np.maximum(dx * dx + dy * dy, 1e-4)
+        disp[lo:lo + BLOCK, 0] = (dx * force).sum(axis=1)
+        disp[lo:lo + BLOCK, 1] = (dy * force).sum(axis=1)
+    return disp
+
+def repulsion_grid(pos, k2):
+    n = len(pos)
+    side = max(2, int(np.ceil(2 * n ** 0.25)))
+    lo, hi = pos.min(axis=0), pos.max(axis=0)
+    cell_xy = np.minimum(((pos - lo) / np.maximum(hi - lo, 1e-9) * side).astype(np.intp), side - 1)
+    cell = cell_xy[:, 0] * side + cell_xy[:, 1]
+    n_cells = side * side
+    mass = np.bincount(cell, minlength=n_cells).astype(np.float64)
+    sums = np.stack([np.bincount(cell, weights=pos[:, d], minlength=n_cells) for d in range(2)], axis=1)
+    occupied = np.flatnonzero(mass)
+    centres = sums[occupied] / mass[occupied, None]
+    cx, cy, cm = centres[:, 0], centres[:, 1], mass[occupied]
+    disp = np.empty_like(pos)
+    for start in range(0, n, BLOCK):
+        block = slice(start, start + BLOCK)
+        dx = pos[block, 0, None] - cx
+        dy = pos[block, 1, None] - cy
+        force = cm * k2 / np.maximum(dx * dx + dy * dy, 1e-4)
+        # Own cell: replaced by the centre of its other members below
+        own = np.searchsorted(occupied, cell[block])
+        force[np.arange(len(own)), own] = 0.0
+        disp[block, 0] = (dx * force).sum(axis=1)
+        disp[block, 1] = (dy * force).sum(axis=1)
+        others = mass[cell[block]] - 1
+        own_centre = (sums[cell[block]] - pos[block]) / np.maximum(others, 1)[:, None]
+        own_delta = pos[block] - own_centre
+        own_force = others * k2 / np.maximum((own_delta ** 2).sum(axis=1), 1e-4)
+        disp[block] += own_delta * own_force[:, None]
+    return disp
+
+def force_layout(n, sources, targets, weights=None, iterations=ITERATIONS, seed=0, size=SIZE):
+    # (n, 2) positions in [0, size] for nodes 0..n-1 and edges sources[i] -> targets[i]
+    if n == 0:
+        return np.zeros((0, 2))
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0, size, (n, 2))
+    if n == 1:
+        return np.full((1, 2), size / 2)
+    sources = np.asarray(sources, dtype=np.intp)
+    targets = np.asarray(targets, dtype=np.intp)
+    # Heavier (aggregated) edges pull harder, but only logarithmically
+    strength = np.ones(len(sources)) if weights is None else 1.0 + np.log(np.maximum(np.asarray(weights, dtype=np.float64), 1.0))
+    k = size / np.sqrt(n)
+    k2 = k * k
+    repulsion = repulsion_exact if n <= EXACT_MAX else repulsion_grid
+    temperature = size / 10
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        disp = repulsion(pos, k2)
+        if len(sources):
+            delta = pos[sources] - pos[targets]
+            dist = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-2)
+            pull = delta * (dist * strength / k)[:, None]
+            for d in range(2):
+                disp[:, d] -= np.bincount(sources, weights=pull[:, d], minlength=n)
+                disp[:, d] += np.bincount(targets, weights=pull[:, d], minlength=n)
+        # Pulls towards the centre; at GRAVITY = 1 it balances the repulsion of
+        # the whole graph at radius size / 2, so isolated nodes and small
+        # components stay in the frame instead of flying off
+        disp -= GRAVITY * 4 * (pos - size / 2)
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-9)
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+    pos -= pos.min(axis=0)
+    span = pos.max(axis=0).max()
+    return pos * (size / span) if span > 0 else pos
+
+def graph_edges(elements):
+    # (node ids, [(source id, target id, weight)]) of Cytoscape elements
+    ids = [node["data"]["id"] for node in elements["nodes"]]
+    edges = [(e["data"]["source"], e["data"]["target"], e["data"].get("weight", 1)) for e in elements["edges"]]
+    return ids, edges
+
+def compute_graph(ids, edges, seed=0):
+    # {node id: {"x", "y"}}; edges to unknown ids and loops are ignored
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    sources, targets, weights = [], [], []
+    for source, target, weight in edges:
+        s, t = index.get(source), index.get(target)
+        if s is not None and t is not None and s != t:
+            sources.append(s)
+            targets.append(t)
+            weights.append(weight)
+    pos = force_layout(len(ids), sources, targets, weights, seed=seed)
+    return {node_id: {"x": round(float(x), 1), "y": round(float(y), 1)} for node_id, (x, y) in zip(ids, pos)}
+
+def compute(elements, seed=0):
+    # {node id: {"x", "y"}} for Cytoscape elements ({"nodes": [...], "edges": [...]})
+    return compute_graph(*graph_edges(elements), seed=seed)
+
+def positioned(elements, positions):
+    # Copy of the elements with a "position" on every laid out node
+    nodes = [{**node, "position": positions[node["data"]["id"]]} if node["data"]["id"] in positions else node
+             for node in elements["nodes"]]
+    return {**elements, "nodes": nodes}
@@ -0,0 +1,272 @@
+import numpy as np
+import scipy.sparse as sp
+import threading
+import time
+
+import rules
+
+# --- LINK PREDICTION ---
+# The FRIEND_OF graph is loaded once per graph version into a symmetric CSR
+# adjacency matrix A. A request is scored as a virtual node u whose
+# neighbours are the submitted friends F (indicator vector x):
+#   common_neighbours(u, c) = (A @ x)[c]                      = |F ∩ N(c)|
+#   jaccard(u, c)           = cn / (|F| + deg(c) - cn)
+#   adamic_adar(u, c)       = (A @ (x / log(deg)))[c]
+# As A is symmetric, A @ x is the sum of the friends' rows, so the cost only
+# depends on the friends' degrees, not on the size of the graph. Optional per-person top-k lists are
+# precomputed the same way from A @ A, one block of rows at a time.
+#
+# With rules.IMPLICIT_FRIENDS, A = E + M @ M.T - I_h: E holds the stored
+# friendships and M (persons x houses) the House hub memberships, I_h the
+# diagonal of the persons in a hub. Same-house cliques are never built: a
+# request adds, per house, the friends it has there to every other member.
+
+METRICS = ('common_neighbours', 'jaccard', 'adamic_adar')
+METRIC_ALIASES = {'cn': 'common_neighbours', 'aa': 'adamic_adar'}
+
+def fetch_friend_graph(tx):
+    persons = tx.run("""
+        MATCH (p:Person)
+        RETURN p.name AS name, p.house AS house, p.image AS image, p.pagerank AS pagerank,
+               [(p)-[:BELONGS_TO]->(h:House) | h.name][0] AS hub
+        ORDER BY p.name
+    """).data()
+    edges = tx.run("""
+        MATCH (a:Person)-[:FRIEND_OF]->(b:Person)
+        RETURN a.name AS a, b.name AS b
+    """).values()
+    return persons, edges
+
+class FriendGraph:
+    def __init__(self, persons, edges, implicit=False, excluded=()):
+        self.names = [p["name"] for p in persons]
+        self.persons = persons
+        self.index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+        # Score ties go to the most central person (analytics.py), then by name
+        pagerank = [p.get("pagerank") or 0.0 for p in persons]
+        self.tie_rank = np.empty(n, dtype=np.int64)
+        self.tie_rank[sorted(range(n), key=lambda i: (-pagerank[i], self.names[i]))] = np.arange(n)
+        # House hub of every person (-1: none), only used when implicit
+        hubs = sorted({p.get("hub") for p in persons if p.get("hub") and p["hub"] not in excluded}) if implicit else []
+        hub_index = {h: k for k, h in enumerate(hubs)}
+        self.hub = np.array([hub_index.get(p.get("hub"), -1) for p in persons], dtype=np.int64).reshape(n)
+        rows, cols = [], []
+        for a, b in edges:
+            i, j = self.index.get(a), self.index.get(b)
+            if i is None or j is None or i == j:
+                continue
+            if self.hub[i] >= 0 and self.hub[i] == self.hub[j]:
+                continue  # implied by the hub
+            rows += [i, j]
+            cols += [j, i]
+        A = sp.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=(n, n))
+        A.sum_duplicates()
+        A.data[:] = 1.0  # parallel edges (a->b and b->a) count once
+        self.A = A
+        members = np.flatnonzero(self.hub >= 0)
+        self.M = sp.csr_matrix((np.ones(len(members)), (members, self.hub[members])), shape=(n, len(hubs)))
+        self.MT = self.M.T.tocsr()
+        self.in_hub = (self.hub >= 0).astype(np.float64)
+        self.house_size = np.bincount(self.hub[members], minlength=len(hubs))
+        self.degree = np.asarray(A.sum(axis=1)).ravel() + np.where(
+            self.hub >= 0, self.house_size[np.maximum(self.hub, 0)] - 1 if len(hubs) else 0, 0)
+        # 1 / log(deg), guarded for degree 0/1 nodes
+        self.aa_weight = 1.0 / np.log(np.maximum(self.degree, 2.0))
+        self.top = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def friendships(self):
+        return self.A.nnz // 2 + int((self.house_size * (self.house_size - 1) // 2).sum())
+
+    def neighbours(self, i):
+        stored = self.A.indices[self.A.indptr[i]:self.A.indptr[i + 1]]
+        if self.hub[i] < 0:
+            return stored
+        h = self.hub[i]
+        housemates = self.MT.indices[self.MT.indptr[h]:self.MT.indptr[h + 1]]
+        return np.union1d(stored, housemates[housemates != i])
+
+    def score(self, friend_idx, metric):
+        # Only the friends' rows (and houses) are touched: (candidates,
+        # scores) for every node at least one friend is linked to
+        weight = self.aa_weight[friend_idx] if metric == 'adamic_adar' else np.ones(len(friend_idx))
+        rows = self.A[friend_idx]
+        stored = rows.indices
+        # Friends per house, added to every other member of the house
+        friend_hub = self.hub[friend_idx]
+        in_hub = friend_hub >= 0
+        house_weight = np.bincount(friend_hub[in_hub], weights=weight[in_hub], minlength=self.M.shape[1])
+        houses = np.flatnonzero(house_weight)
+        housemates = self.MT[houses].indices
+        candidates = np.union1d(stored, housemates)
+        scores = np.bincount(np.searchsorted(candidates, stored), weights=np.repeat(weight, np.diff(rows.indptr)),
+                             minlength=len(candidates)).astype(np.float64)
+        candidate_hub = self.hub[candidates]
+        member = candidate_hub >= 0
+        scores[member] += house_weight[candidate_hub[member]]
+        # A friend is not its own housemate
+        own = member & np.isin(candidates, friend_idx)
+        if own.any():
+            scores[own] -= weight[np.searchsorted(friend_idx, candidates[own])]
+        keep = scores > 0
+        candidates, scores = candidates[keep], scores[keep]
+        if metric == 'jaccard':
+            return candidates, scores / (len(friend_idx) + self.degree[candidates] - scores)
+        return candidates, scores
+
+    def adjacency_times(self, B):
+        # B @ A for a sparse block of rows B, without building the cliques
+        product = B @ self.A
+        if self.M.shape[1]:
+            product = product + (B @ self.M) @ self.MT - B @ sp.diags(self.in_hub)
+        return product.tocsr()
+
+    def adjacency_dot(self, x):
+        # A @ x for a dense vector
+        product = self.A @ x
+        if self.M.shape[1]:
+            product = product + self.M @ (self.MT @ x) - self.in_hub * x
+        return product
+
+    def adjacency_rows(self, lo, hi):
+        identity = sp.identity(len(self.names), format='csr')[lo:hi]
+        return self.adjacency_times(identity)
+
+    def recommend(self, friends, metric='common_neighbours', k=3):
+        friend_idx = np.array(sorted({self.index[f] for f in friends if f in self.index}), dtype=np.int64)
+        if not len(friend_idx):
+            return []
+        candidates, scores = self.score(friend_idx, metric)
+        keep = ~np.isin(candidates, friend_idx)
+        return self._matches(candidates[keep], scores[keep], friend_idx, k)
+
+    def _matches(self, candidates, scores, friend_idx, k):
+        if len(candidates) > k:
+            best = np.lexsort((self.tie_rank[candidates], -scores.round(9)))[:k]
+            candidates, scores = candidates[best], scores[best]
+        # Highest score first, then tie_rank
+        order = sorted(range(len(candidates)), key=lambda j: (-round(scores[j], 9), self.tie_rank[candidates[j]]))
+        matches = []
+        for j in order:
+            c = candidates[j]
+            neighbours = self.neighbours(c)
+            shared = sorted(self.names[f] for f in friend_idx[np.isin(friend_idx, neighbours)])
+            score = float(scores[j])
+            matches.append({
+                "name": self.names[c],
+                "house": self.persons[c]["house"],
+                "image": self.persons[c]["image"],
+                "score": int(score) if score.is_integer() else round(score, 4),
+                "reason": shared
+            })
+        return matches
+
+    def precompute(self, metric='common_neighbours', k=10, block=1024):
+        # Top-k non-friends per person from A @ A, built block by block so the
+        # 2-hop matrix is never materialised whole
+        start = time.perf_counter()
+        top = {}
+        n = len(self.names)
+        for lo in range(0, n, block):
+            hi = min(lo + block, n)
+            rows = self.adjacency_rows(lo, hi)
+            if metric == 'adamic_adar':
+                paths = self.adjacency_times((rows @ sp.diags(self.aa_weight)).tocsr())
+            else:
+                paths = self.adjacency_times(rows)
+            paths.eliminate_zeros()
+            for r in range(hi - lo):
+                i = lo + r
+                cols = paths.indices[paths.indptr[r]:paths.indptr[r + 1]]
+                vals = paths.data[paths.indptr[r]:paths.indptr[r + 1]].copy()
+                neighbours = self.neighbours(i)
+                keep = (cols != i) & ~np.isin(cols, neighbours)
+                cols, vals = cols[keep], vals[keep]
+                if metric == 'jaccard':
+                    vals = vals / (self.degree[i] + self.degree[cols] - vals)
+                if len(cols) > k:
+                    best = np.lexsort((self.tie_rank[cols], -vals.round(9)))[:k]
+                    cols, vals = cols[best], vals[best]
+                order = sorted(range(len(cols)), key=lambda j: (-round(vals[j], 9), self.tie_rank[cols[j]]))
+                top[self.names[i]] = [(int(cols[j]), float(vals[j])) for j in order]
+        self.top[metric] = top
+        print(f"🔗 Precomputed top-{k} {metric} candidates for {n} persons in {time.perf_counter() - start:.2f}s")
+
+    def recommend_for(self, name, metric='common_neighbours', k=3):
+        top = self.top.get(metric, {}).get(name)
+        if top is None:
+            return None
+        i = self.index[name]
+        friend_idx = self.neighbours(i)
+        candidates = np.array([c for c, _ in top[:k]], dtype=np.int64)
+        scores = np.array([v for _, v in top[:k]])
+        return self._matches(candidates, scores, friend_idx, k)
+
+class LinkPredictor:
+    # Holds the FriendGraph of the current graph version, rebuilt in the
+    # background when the version moves (requests keep using the old one).
+    # Rebuilds are at least min_interval seconds apart, so a burst of version
+    # bumps costs one rebuild. Top-k lists are only precomputed for the
+    # metrics requests actually use: on first use, then again on each rebuild.
+    def __init__(self, driver, version, precompute_k=0, min_interval=30.0):
+        self.driver = driver
+        self.version = version
+        self.precompute_k = precompute_k
+        self.min_interval = min_interval
+        self.graph = None
+        self.built_version = None
+        self.built_at = 0.0
+        self._lock = threading.Lock()
+        self._precompute_lock = threading.Lock()
+
+    def _rebuild(self):
+        # Caller holds self._lock
+        current = self.version.current()
+        if self.graph is not None and current == self.built_version:
+            return self.graph
+        with self.driver.session() as session:
+            persons, edges = session.execute_read(fetch_friend_graph)
+        graph = FriendGraph(persons, edges, rules.IMPLICIT_FRIENDS, rules.EXCLUDED_HOUSES)
+        if self.precompute_k and self.graph is not None:
+            for metric in list(self.graph.top):
+                graph.precompute(metric, self.precompute_k)
+        self.graph = graph
+        self.built_version = current
+        self.built_at = time.monotonic()
+        print(f"🔗 Friend graph loaded: {len(graph)} persons, {graph.friendships()} friendships (graph v{current})")
+        return graph
+
+    def _rebuild_in_background(self):
+        try:
+            self._rebuild()
+        except Exception as e:
+            print(f"⚠️ Friend graph rebuild failed: {e}")
+        finally:
+            self._lock.release()
+
+    def refresh(self):
+        with self._lock:
+            return self._rebuild()
+
+    def current(self):
+        graph = self.graph
+        if graph is None:
+            return self.refresh()
+        if (time.monotonic() - self.built_at >= self.min_interval
+                and self.version.current() != self.built_version
+                and self._lock.acquire(blocking=False)):
+            threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+        return graph
+
+    def recommend_for(self, graph, name, metric='common_neighbours', k=3):
+        # Precomputed matches of an existing person, None without precompute_k
+        if not self.precompute_k:
+            return None
+        if metric not in graph.top:
+            with self._precompute_lock:
+                if metric not in graph.top:
+                    graph.precompute(metric, self.precompute_k)
+        return graph.recommend_for(name, metric, k)
@@ -0,0 +1,390 @@
+from bisect import bisect_left
+import glob
+import json
+import os
+import threading
+import time
+
+# --- METRICS ---
+# In-process histograms and counters rendered in the Prometheus text format
+# on /metrics. Recording is a bisect and a few additions under a lock.
+#
+# - http_request_duration_seconds: per route rule (not per URL), method, status
+# - neo4j_query_duration_seconds / neo4j_query_rows_total: per named query.
+#   A query is named by name_query() or after its transaction function. The
+#   duration is the client time from run() to the last record, and the server
+#   timings come from the result summary (result_available_after /
+#   result_consumed_after).
+# - neo4j_pool_wait_seconds: time between execute_read/execute_write and the
+#   transaction function starting (connection acquisition and BEGIN)
+# - model_inference_seconds: per model of the registry
+# - cache_requests_total: hits and misses per in-process cache (CacheCounters.add)
+#
+# Every process records in memory. With METRICS_DIR set (gunicorn.conf.py
+# does), each process started with start_process() also writes a snapshot of
+# its values to METRICS_DIR/<pid>.json every FLUSH_SECONDS, and /metrics
+# answers with the sum of every snapshot. So whichever worker is scraped, the
+# output covers all of them, at most FLUSH_SECONDS old. Snapshots of exited
+# workers are kept, so counters never go backwards when a worker restarts;
+# the directory is emptied when the server starts.
+
+METRICS_DIR = os.getenv("METRICS_DIR")
+FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "1"))
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def label_text(names, values, extra=None):
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def merge(total, values):
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def samples(self, values):
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{label_text(self.labels, labels)} {value}"
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {k: list(v) for k, v in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def merge(total, series):
+        for labels, values in series.items():
+            if labels in total:
+                total[labels] = [a + b for a, b in zip(total[labels], values)]
+            else:
+                total[labels] = list(values)
+
+    def samples(self, series):
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{label_text(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{label_text(self.labels, labels)} {values[-1]}"
+            yield f"{self.name}_count{label_text(self.labels, labels)} {cumulative}"
+
+class CacheCounters:
+    # Hit/miss counters of cache.LRUCache instances, read when rendering
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.labels = ("cache", "result")
+        self.caches = {}
+
+    def add(self, name, lru):
+        self.caches[name] = lru
+        return lru
+
+    def snapshot(self):
+        values = {}
+        for name, lru in self.caches.items():
+            values[(name, 'hit')] = lru.hits
+            values[(name, 'miss')] = lru.misses
+        return values
+
+    def reset(self):
+        for lru in self.caches.values():
+            lru.hits = lru.misses = 0
+
+    merge = staticmethod(Counter.merge)
+    samples = Counter.samples
+
+REGISTRY = []
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+REQUEST_SECONDS = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("endpoint", "method", "status")))
+QUERY_SECONDS = register(Histogram(
+    "neo4j_query_duration_seconds", "Cypher query latency seen by the client", ("query",)))
+QUERY_SERVER_SECONDS = register(Histogram(
+    "neo4j_query_server_seconds", "Cypher query server time (available + consumed after)", ("query",)))
+QUERY_ROWS = register(Counter(
+    "neo4j_query_rows_total", "Records returned per Cypher query", ("query",)))
+POOL_WAIT_SECONDS = register(Histogram(
+    "neo4j_pool_wait_seconds", "Time to acquire a Bolt connection and begin a transaction", ("access",)))
+MODEL_SECONDS = register(Histogram(
+    "model_inference_seconds", "Model inference latency", ("model",)))
+CACHE_REQUESTS = register(CacheCounters(
+    "cache_requests_total", "In-process cache lookups"))
+
+def snapshot():
+    # {metric name: [[labels, value], ...]}, JSON-ready
+    return {metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+            for metric in REGISTRY}
+
+def snapshot_path(pid=None):
+    return os.path.join(METRICS_DIR, f"{pid or os.getpid()}.json")
+
+def write_snapshot():
+    # Written whole and renamed, so a scrape never reads half a file
+    path = snapshot_path()
+    with open(path + ".tmp", 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(path + ".tmp", path)
+
+def read_snapshots():
+    # {metric name: merged values} over the snapshots of every process
+    totals = {metric.name: {} for metric in REGISTRY}
+    merges = {metric.name: metric.merge for metric in REGISTRY}
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, values in data.items():
+            if name in merges:
+                merges[name](totals[name], {tuple(labels): value for labels, value in values})
+    return totals
+
+def start_process():
+    # Called once per server process (gunicorn post_fork, ASGI startup):
+    # drops values inherited from a preloading master, then flushes this
+    # process's snapshot every FLUSH_SECONDS. Does nothing without METRICS_DIR.
+    if not METRICS_DIR:
+        return
+    for metric in REGISTRY:
+        metric.reset()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    write_snapshot()
+
+    def flush():
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            try:
+                write_snapshot()
+            except OSError as e:
+                print(f"⚠️ Could not write metrics snapshot: {e}")
+
+    threading.Thread(target=flush, name="metrics-flush", daemon=True).start()
+
+def clear_dir():
+    # Snapshots of a previous server run (called by the gunicorn master)
+    if METRICS_DIR:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        for path in glob.glob(os.path.join(METRICS_DIR, "*.json*")):
+            os.remove(path)
+
+def render():
+    if METRICS_DIR and os.path.exists(snapshot_path()):
+        write_snapshot()
+        values = read_snapshots()
+    else:
+        values = {metric.name: metric.snapshot() for metric in REGISTRY}
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples(values[metric.name]))
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- HTTP ---
+
+def instrument(app):
+    # Flask: one histogram sample per request, labelled by the route rule
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('metrics_start')
+        if start is not None:
+            rule = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, rule, request.method, str(response.status_code))
+        return response
+
+    return app
+
+# --- NEO4J ---
+
+QUERY_NAMES = {}
+
+def name_query(name, query):
+    # Registers the name under which a query text is recorded
+    QUERY_NAMES[query] = name
+    return query
+
+# Called as hook(name, query, parameters, client_seconds, server_seconds, rows)
+# for every finished query (see profiler.py)
+QUERY_HOOKS = []
+
+class TimedResult:
+    # Counts records and records the timings once the result is exhausted
+    def __init__(self, result, name, start, query=None, parameters=None):
+        self._result = result
+        self.name = name
+        self.start = start
+        self.query = query
+        self.parameters = parameters
+        self.rows = 0
+        self.done = False
+
+    def __iter__(self):
+        for record in self._result:
+            self.rows += 1
+            yield record
+        self.finish()
+
+    def single(self, *args, **kwargs):
+        record = self._result.single(*args, **kwargs)
+        self.rows += record is not None
+        self.finish()
+        return record
+
+    def data(self, *keys):
+        data = self._result.data(*keys)
+        self.rows += len(data)
+        self.finish()
+        return data
+
+    def values(self, *keys):
+        values = self._result.values(*keys)
+        self.rows += len(values)
+        self.finish()
+        return values
+
+    def consume(self):
+        return self.finish()
+
+    def finish(self):
+        summary = self._result.consume()
+        if not self.done:
+            self.done = True
+            elapsed = time.perf_counter() - self.start
+            QUERY_SECONDS.observe(elapsed, self.name)
+            server = ((summary.result_available_after or 0) + (summary.result_consumed_after or 0)) / 1000
+            QUERY_SERVER_SECONDS.observe(server, self.name)
+            QUERY_ROWS.inc(self.rows, self.name)
+            for hook in QUERY_HOOKS:
+                hook(self.name, self.query, self.parameters, elapsed, server, self.rows)
+        return summary
+
+    def __getattr__(self, name):
+        return getattr(self._result, name)
+
+class TimedTransaction:
+    def __init__(self, tx, name):
+        self._tx = tx
+        self.name = name
+        self.results = []
+
+    def run(self, query, parameters=None, **kwargs):
+        start = time.perf_counter()
+        result = TimedResult(self._tx.run(query, parameters, **kwargs),
+                             QUERY_NAMES.get(query, self.name), start, query, parameters)
+        self.results.append(result)
+        return result
+
+    def finish(self):
+        # Results the function did not read (writes) are consumed here, as
+        # the commit would do anyway
+        for result in self.results:
+            if not result.done:
+                result.finish()
+
+    def __getattr__(self, name):
+        return getattr(self._tx, name)
+
+def timed_work(access, transaction_function, called):
+    name = getattr(transaction_function, "__name__", "query")
+    first = [True]
+
+    def work(tx, *args, **kwargs):
+        if first[0]:
+            # Retries are not counted as pool waits
+            first[0] = False
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - called, access)
+        timed = TimedTransaction(tx, name)
+        value = transaction_function(timed, *args, **kwargs)
+        timed.finish()
+        return value
+
+    return work
+
+class InstrumentedSession:
+    def __init__(self, session):
+        self._session = session
+
+    def execute_read(self, transaction_function, *args, **kwargs):
+        work = timed_work("read", transaction_function, time.perf_counter())
+        return self._session.execute_read(work, *args, **kwargs)
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        work = timed_work("write", transaction_function, time.perf_counter())
+        return self._session.execute_write(work, *args, **kwargs)
+
+    def __enter__(self):
+        self._session.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._session.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
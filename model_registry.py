@@ -0,0 +1,211 @@
+import os
+import pickle
+import threading
+import time
+
+import pandas as pd
+
+import compiled_model
+import metrics
+
+# --- MODEL REGISTRY ---
+# Models are loaded on first use (or by warm() in the background) instead of
+# at import. Every `check_interval` seconds a request compares the model file's
+# (mtime, size) with the loaded one. If the file changed, a background thread
+# loads the new version and swaps it in with one assignment. Requests keep the
+# old model until then, and a file that fails to load (e.g. half written)
+# leaves the old model in place.
+#
+# A compiled .npz (see compiled_model.py) next to the .pkl is preferred while
+# it is at least as recent: a retrained .pkl is served (and reloaded) until it
+# is compiled again, never shadowed by the old export. With a
+# preloading server, warm(background=False) in the master loads every model
+# once and forked workers share the pages copy-on-write: the compiled arrays
+# are never written to, so they stay shared.
+# The NumPy evaluator wins up to a few thousand rows; sklearn's C tree walk is
+# faster on larger batches (bulk scoring pages), so a compiled model loads its
+# .pkl on the first batch of SKLEARN_BATCH_ROWS rows or more and predicts
+# those with it. Predictions are the same either way.
+
+# Rows from which a compiled model predicts with the pickled sklearn model
+SKLEARN_BATCH_ROWS = int(os.getenv("MODEL_SKLEARN_BATCH_ROWS", "2000"))
+
+class LoadedModel:
+    def __init__(self, name, model, encoder, path, signature, load_seconds, pickle_file=None):
+        self.name = name
+        self.model = model
+        self.encoder = encoder          # LabelEncoder of a pickled model, if any
+        self.path = path
+        self.pickle_file = pickle_file  # sklearn model of a compiled one, for large batches
+        self._sklearn = None
+        self.signature = signature
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.predictions = 0
+        self.predict_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def compiled(self):
+        return isinstance(self.model, compiled_model.CompiledForest)
+
+    @property
+    def encoder_classes(self):
+        if self.encoder is not None:
+            return self.encoder.classes_
+        return getattr(self.model, "encoder_classes", None)
+
+    def encode(self, label):
+        if self.encoder is not None:
+            return self.encoder.transform([label])[0]
+        return self.model.encode(label)
+
+    def sklearn_model(self):
+        # The pickled model behind a compiled one, loaded once; None if unreadable
+        if self._sklearn is None and self.pickle_file:
+            with self._lock:
+                if self._sklearn is None:
+                    try:
+                        with open(self.pickle_file, 'rb') as f:
+                            self._sklearn = pickle.load(f)
+                    except Exception as e:
+                        print(f"⚠️ Could not load {self.pickle_file} for large batches: {e}")
+                        self.pickle_file = None
+        return self._sklearn
+
+    def predict(self, rows, columns):
+        start = time.perf_counter()
+        model = self.model
+        if self.compiled and len(rows) >= SKLEARN_BATCH_ROWS:
+            model = self.sklearn_model() or model
+        if isinstance(model, compiled_model.CompiledForest):
+            result = model.predict(rows)
+        else:
+            result = model.predict(pd.DataFrame(rows, columns=columns))
+        elapsed = time.perf_counter() - start
+        metrics.MODEL_SECONDS.observe(elapsed, self.name)
+        with self._lock:
+            self.predictions += len(rows)
+            self.predict_seconds += elapsed
+        return result
+
+    def stats(self):
+        calls = self.predictions
+        return {
+            "loaded": True,
+            "path": self.path,
+            "compiled": self.compiled,
+            "sklearn_batches": self._sklearn is not None,
+            "loaded_at": self.loaded_at,
+            "load_ms": round(self.load_seconds * 1000, 3),
+            "predictions": calls,
+            "predict_ms_total": round(self.predict_seconds * 1000, 3),
+            "predict_ms_mean": round(self.predict_seconds * 1000 / calls, 4) if calls else 0.0
+        }
+
+class ModelRegistry:
+    def __init__(self, check_interval=5.0, use_compiled=True):
+        self.check_interval = check_interval
+        self.use_compiled = use_compiled
+        self._specs = {}     # name -> (model_file, encoder_file)
+        self._models = {}    # name -> LoadedModel
+        self._checked = {}   # name -> monotonic time of the last file check
+        self._missing = {}   # name -> monotonic time the file was last found missing
+        self._locks = {}
+        self.reloads = {}
+
+    def register(self, name, model_file, encoder_file=None):
+        self._specs[name] = (model_file, encoder_file)
+        self._locks[name] = threading.Lock()
+        self.reloads[name] = 0
+
+    def _source(self, name):
+        # (path to load, encoder file or None): the compiled .npz unless the
+        # .pkl was written after it (retrained, not compiled again yet)
+        model_file, encoder_file = self._specs[name]
+        path = compiled_model.compiled_path(model_file)
+        if self.use_compiled and os.path.exists(path):
+            try:
+                if os.stat(path).st_mtime_ns >= os.stat(model_file).st_mtime_ns:
+                    return path, None
+            except FileNotFoundError:
+                return path, None
+        return model_file, encoder_file
+
+    def _signature(self, name):
+        signature = []
+        for path in self._source(name):
+            if path is None:
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                return None
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def load(self, name):
+        with self._locks[name]:
+            current = self._models.get(name)
+            self._checked[name] = time.monotonic()
+            signature = self._signature(name)
+            if signature is None:
+                self._missing[name] = time.monotonic()
+                if current is None:
+                    print(f"⚠️ Model '{name}' not found ({self._specs[name][0]})")
+                return current
+            if current is not None and current.signature == signature:
+                return current
+            path, encoder_file = self._source(name)
+            start = time.perf_counter()
+            try:
+                if path.endswith(compiled_model.COMPILED_SUFFIX):
+                    model, encoder = compiled_model.load(path), None
+                else:
+                    with open(path, 'rb') as f:
+                        model = pickle.load(f)
+                    encoder = None
+                    if encoder_file:
+                        with open(encoder_file, 'rb') as f:
+                            encoder = pickle.load(f)
+            except Exception as e:
+                print(f"⚠️ Could not load model '{name}' from {path}: {e}")
+                return current
+            pickle_file = self._specs[name][0] if path != self._specs[name][0] else None
+            loaded = LoadedModel(name, model, encoder, path, signature, time.perf_counter() - start, pickle_file)
+            self._models[name] = loaded
+            if current is not None:
+                self.reloads[name] += 1
+            print(f"✅ Model '{name}' loaded from {path} in {loaded.load_seconds * 1000:.1f}ms")
+            return loaded
+
+    def get(self, name):
+        loaded = self._models.get(name)
+        if loaded is None:
+            # Missing files are looked for again at most every check_interval;
+            # a load in progress (warm-up) is waited for
+            if time.monotonic() - self._missing.get(name, -self.check_interval) < self.check_interval:
+                return None
+            return self.load(name)
+        if time.monotonic() - self._checked.get(name, 0.0) >= self.check_interval:
+            self._checked[name] = time.monotonic()
+            if self._signature(name) not in (None, loaded.signature) and not self._locks[name].locked():
+                threading.Thread(target=self.load, args=(name,), daemon=True).start()
+        return loaded
+
+    def warm(self, background=True):
+        def load_all():
+            for name in self._specs:
+                self.load(name)
+        if background:
+            threading.Thread(target=load_all, name="model-warmup", daemon=True).start()
+        else:
+            load_all()
+
+    def stats(self):
+        stats = {}
+        for name, (model_file, _) in self._specs.items():
+            loaded = self._models.get(name)
+            stats[name] = dict(loaded.stats() if loaded else {"path": model_file, "loaded": False},
+                               reloads=self.reloads[name])
+        return stats
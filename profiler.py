@@ -0,0 +1,235 @@
+from collections import Counter
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import metrics
+
+# --- REQUEST PROFILER ---
+# Opt-in and switchable at runtime (/api/profiler). While enabled, one
+# sampler thread reads the stacks of the threads currently serving a request
+# every `interval` seconds. It sleeps when no request is in flight. When a
+# request took at least `threshold` seconds:
+#   - its samples are written as collapsed stacks ("a;b;c count", the input
+#     of flamegraph.pl / speedscope) to PROFILE_DIR/<time>-<endpoint>-<ms>ms.folded
+#   - one JSON line is appended to SLOW_LOG with the request and the Cypher
+#     text, parameters and client/server timings of every query it ran
+# Faster requests are dropped, so the cost is the sampling itself: a few
+# stack walks per interval, only while requests run.
+# Settings changed at runtime are saved to PROFILE_SETTINGS, which every
+# worker process re-reads at most once a second, so one POST switches all.
+# Samples are taken per thread, so only the threaded (Flask) app is covered.
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+SLOW_LOG = os.getenv("SLOW_LOG", "slow_requests.log")
+PROFILE_SETTINGS = os.getenv("PROFILE_SETTINGS", "profiler_settings.json")
+SETTINGS_CHECK_INTERVAL = 1.0
+MAX_PARAM_CHARS = 500
+
+class RequestProfile:
+    def __init__(self, method, path, endpoint):
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.samples = Counter()
+        self.queries = []
+        self.thread = threading.get_ident()
+        self.streaming = False
+
+def collapse(frame):
+    # Root-first "file:function" frames joined with ';'
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+def short(value):
+    text = json.dumps(value, default=str)
+    return text if len(text) <= MAX_PARAM_CHARS else text[:MAX_PARAM_CHARS] + "..."
+
+class Profiler:
+    def __init__(self, enabled=False, threshold=1.0, interval=0.01):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.interval = interval
+        self.slow_requests = 0
+        self._active = {}       # thread id -> RequestProfile
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._settings_checked = 0.0
+        self._settings_mtime = None
+        metrics.QUERY_HOOKS.append(self.record_query)
+
+    def configure(self, enabled=None, threshold=None, interval=None, save=True):
+        if threshold is not None:
+            self.threshold = float(threshold)
+        if interval is not None:
+            self.interval = max(0.001, float(interval))
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if save:
+            try:
+                with open(PROFILE_SETTINGS, 'w') as f:
+                    json.dump({"enabled": self.enabled, "threshold": self.threshold,
+                               "interval": self.interval}, f)
+                self._settings_mtime = os.stat(PROFILE_SETTINGS).st_mtime_ns
+            except OSError as e:
+                print(f"⚠️ Could not save profiler settings: {e}")
+        return self.settings()
+
+    def _sync_settings(self):
+        # Pick up settings saved by another worker
+        now = time.monotonic()
+        if now - self._settings_checked < SETTINGS_CHECK_INTERVAL:
+            return
+        self._settings_checked = now
+        try:
+            mtime = os.stat(PROFILE_SETTINGS).st_mtime_ns
+            if mtime != self._settings_mtime:
+                with open(PROFILE_SETTINGS) as f:
+                    settings = json.load(f)
+                self._settings_mtime = mtime
+                self.configure(save=False, **settings)
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def settings(self):
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold * 1000,
+            "interval_ms": self.interval * 1000,
+            "slow_requests": self.slow_requests,
+            "profile_dir": PROFILE_DIR,
+            "slow_log": SLOW_LOG
+        }
+
+    def _ensure_sampler(self):
+        # Started on first use in each process (fork-safe)
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="request-sampler", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            frames = sys._current_frames()
+            for ident, profile in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.samples[collapse(frame)] += 1
+            time.sleep(self.interval)
+
+    def start(self, method, path, endpoint):
+        self._sync_settings()
+        if not self.enabled:
+            return None
+        self._ensure_sampler()
+        profile = RequestProfile(method, path, endpoint)
+        self._active[threading.get_ident()] = profile
+        self._wake.set()
+        return profile
+
+    def record_query(self, name, query, parameters, client_seconds, server_seconds, rows):
+        profile = self._active.get(threading.get_ident())
+        if profile is not None:
+            profile.queries.append({
+                "name": name,
+                "query": " ".join(query.split()) if query else None,
+                "parameters": short(parameters or {}),
+                "client_ms": round(client_seconds * 1000, 3),
+                "server_ms": round(server_seconds * 1000, 3),
+                "rows": rows
+            })
+
+    def defer(self):
+        # A streamed response keeps its profile while the server iterates the
+        # body; finish() then only ends it when given the profile (on close)
+        profile = self._active.get(threading.get_ident())
+        if profile is not None:
+            profile.streaming = True
+        return profile
+
+    def finish(self, status, profile=None):
+        if profile is None:
+            profile = self._active.get(threading.get_ident())
+            if profile is None or profile.streaming:
+                return
+        if self._active.get(profile.thread) is not profile:
+            return
+        del self._active[profile.thread]
+        elapsed = time.perf_counter() - profile.start
+        if elapsed < self.threshold:
+            return
+        self.slow_requests += 1
+        try:
+            self.write(profile, elapsed, status)
+        except OSError as e:
+            print(f"⚠️ Could not write slow request profile: {e}")
+
+    def write(self, profile, elapsed, status):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        endpoint = re.sub(r'[^A-Za-z0-9]+', '_', profile.endpoint).strip('_') or "root"
+        path = os.path.join(PROFILE_DIR, f"{stamp}-{os.getpid()}-{endpoint}-{elapsed * 1000:.0f}ms.folded")
+        with open(path, 'w') as f:
+            for stack, count in profile.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "method": profile.method,
+            "path": profile.path,
+            "endpoint": profile.endpoint,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 3),
+            "samples": sum(profile.samples.values()),
+            "profile": path,
+            "queries": profile.queries
+        }
+        with open(SLOW_LOG, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+        print(f"🐢 Slow request {profile.method} {profile.path} ({elapsed * 1000:.0f}ms) -> {path}")
+
+def instrument(app, profiler):
+    # Flask hooks: start sampling the serving thread, decide at the end
+    from flask import request
+
+    @app.before_request
+    def start_profile():
+        rule = request.url_rule.rule if request.url_rule else "unmatched"
+        profiler.start(request.method, request.full_path.rstrip('?'), rule)
+
+    @app.after_request
+    def finish_profile(response):
+        if response.is_streamed:
+            # NDJSON views: the work happens while the body is sent, after
+            # this hook and teardown, so the profile ends when it is closed
+            profile = profiler.defer()
+            if profile is not None:
+                status = response.status_code
+                response.call_on_close(lambda: profiler.finish(status, profile))
+            return response
+        profiler.finish(response.status_code)
+        return response
+
+    @app.teardown_request
+    def drop_profile(exc):
+        # Requests that raised never reach after_request (streamed ones are
+        # finished on close)
+        profiler.finish(500)
+
+    return app
@@ -0,0 +1,146 @@
+import atexit
+import os
+import queue
+import threading
+
+import feature_store
+import graph_version
+
+# --- USER REGISTRATION ---
+# A registration is the user node written by /predict plus its typed links:
+#   {"name": ..., "house": ..., "links": [{"type": "FRIEND_OF", "target": ...}, ...]}
+# All registrations of a batch are written in one transaction.
+# A new user's id (the graph element id, unique since schema v2) is its name
+# with USER_ID_PREFIX, so it never takes the id of a dataset person (HP-API
+# ids, or the bare name when the feed has none).
+
+USER_ID_PREFIX = "user:"
+
+LINK_TYPES = {
+    'friends': 'FRIEND_OF',
+    'enemies': 'ENEMY_OF',
+    'family': 'SAME_FAMILY',
+    'partners': 'ROMANTIC_WITH'
+}
+
+def build_registration(name, house, profile):
+    links = []
+    for rel, rel_type in LINK_TYPES.items():
+        for target in sorted(set(profile.get(rel) or [])):
+            links.append({"type": rel_type, "target": target})
+    return {"name": name, "house": str(house), "links": links}
+
+def register_users(tx, registrations):
+    # Users first, then their links, in two statements: in one, matching link
+    # targets after merging users (a target can be a user of the same batch)
+    # puts an Eager barrier in the plan, which materialises the whole batch.
+    tx.run("""
+        UNWIND $users AS user
+        MERGE (u:Person {name: user.name})
+        SET u.house = user.house, u.isUser = true, u.id = coalesce(u.id, $prefix + user.name)
+    """, {"users": registrations, "prefix": USER_ID_PREFIX})
+    # Relationship types cannot be parameters: one FOREACH per type, of which
+    # only the one matching link.type runs for a given (type, target) pair.
+    tx.run("""
+        UNWIND $users AS user
+        MATCH (u:Person {name: user.name})
+        UNWIND user.links AS link
+        MATCH (t:Person {name: link.target})
+        FOREACH (_ IN CASE WHEN link.type = 'FRIEND_OF' THEN [1] ELSE [] END |
+            MERGE (u)-[:FRIEND_OF]->(t))
+        FOREACH (_ IN CASE WHEN link.type = 'ENEMY_OF' THEN [1] ELSE [] END |
+            MERGE (u)-[:ENEMY_OF]->(t))
+        FOREACH (_ IN CASE WHEN link.type = 'SAME_FAMILY' THEN [1] ELSE [] END |
+            MERGE (u)-[:SAME_FAMILY]->(t))
+        FOREACH (_ IN CASE WHEN link.type = 'ROMANTIC_WITH' THEN [1] ELSE [] END |
+            MERGE (u)-[:ROMANTIC_WITH]->(t))
+    """, {"users": [r for r in registrations if r["links"]]})
+    feature_store.refresh_neighbourhood(tx, [r["name"] for r in registrations])
+    graph_version.bump_users(tx)
+
+def read_registrations(tx):
+    # The stored registrations, in build_registration's shape, so a full
+    # reload (get_insert.py) can write them back after clearing the dataset
+    result = tx.run("""
+        MATCH (u:Person) WHERE u.isUser = true
+        OPTIONAL MATCH (u)-[r:FRIEND_OF|ENEMY_OF|SAME_FAMILY|ROMANTIC_WITH]->(t:Person)
+        WITH u, r, t ORDER BY type(r), t.name
+        RETURN u.name AS name, u.house AS house,
+               collect(CASE WHEN t IS NULL THEN null ELSE {type: type(r), target: t.name} END) AS links
+    """)
+    return [r.data() for r in result]
+
+def write_registrations(driver, registrations):
+    if not registrations:
+        return
+    with driver.session() as session:
+        session.execute_write(register_users, registrations)
+
+# --- WRITE-BEHIND ---
+# Registrations are queued in-process and drained by a background thread in
+# batched transactions, so /predict does not wait for the write. When the
+# queue is full the caller writes synchronously (backpressure, nothing lost).
+# The worker is started on first use in each process, so it is fork-safe.
+
+class RegistrationQueue:
+    def __init__(self, driver, maxsize=1000, batch_size=100, interval=0.5, on_write=None):
+        self.driver = driver
+        self.on_write = on_write
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="registration-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, registration):
+        self._ensure_worker()
+        try:
+            self.queue.put_nowait(registration)
+        except queue.Full:
+            self._write([registration])
+
+    def _write(self, batch):
+        write_registrations(self.driver, batch)
+        if self.on_write:
+            self.on_write()
+
+    def _run(self):
+        while not (self._stopped.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=self.interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"⚠️ Failed to write {len(batch)} registrations: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def flush(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self.queue.join()
+
+    def close(self):
+        self.flush()
+        self._stopped.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
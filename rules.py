@@ -0,0 +1,181 @@
+from collections import defaultdict
+from itertools import islice
+import os
+import time
+
+# --- RULE ENGINE ---
+# Rule-based relationships are derived from a key computed once per person
+# (surname, house). Persons are bucketed by that key and edge pairs are only
+# generated inside (or between) buckets, so the work is proportional to the
+# number of edges produced instead of the n² pairs of a cartesian MATCH.
+#
+# A rule is a dict:
+#   type  - relationship type written between the two persons
+#   key   - person dict -> group key (None = person takes no part in the rule)
+#   pairs - (groups, keys) -> iterator of (source_name, target_name);
+#           `keys` restricts generation to the given groups (None = all)
+#   implicit - optional; the relationship can be resolved from the House hub
+#              instead of being stored (see IMPLICIT_FRIENDS)
+#   blocks - optional; group sizes -> {(source key, target key): edge count},
+#            for rules whose groups are complete blocks. graph_summary.py
+#            counts those edges from the house sizes instead of reading them.
+# Adding a rule is just appending to RULES.
+#
+# IMPLICIT_FRIENDS=1: same-house friendship is not stored. The FRIEND_OF
+# clique of a house is n(n-1)/2 edges; instead two persons are implied
+# friends when they BELONG_TO the same House (not one of EXCLUDED_HOUSES),
+# which is n edges, and readers (feature_store.py, link_prediction.py,
+# graph_summary.py, the graph views) resolve it through the hub. Only explicit
+# friendships (registrations) are FRIEND_OF edges. Ingestion and the app must
+# run with the same setting; prune_implied() removes the stored cliques of a
+# graph loaded without it.
+
+EXCLUDED_HOUSES = {'', 'Unknown'}
+IMPLICIT_FRIENDS = os.getenv("IMPLICIT_FRIENDS", "0") == "1"
+
+def surname_key(person):
+    # Assumption: Last word is last name (same as split(name, ' ')[-1]).
+    name = person.get("name") or ""
+    if ' ' not in name:
+        return None
+    return name.split(' ')[-1]
+
+def house_key(person):
+    house = person.get("house")
+    if not house or house in EXCLUDED_HOUSES:
+        return None
+    return house
+
+def same_group(groups, keys=None):
+    # One edge per unordered pair of members of the same group
+    for key in (groups if keys is None else keys):
+        members = groups.get(key, [])
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                yield a, b
+
+def member_edges(members, names):
+    # The same_group edges of a group that have an endpoint in names
+    for a in names:
+        for b in members:
+            if b != a and (b not in names or a < b):
+                yield (a, b) if a < b else (b, a)
+
+def same_group_blocks(sizes):
+    return {(key, key): n * (n - 1) // 2 for key, n in sizes.items() if n > 1}
+
+def between(left, right):
+    # Edges in both directions between every member of two groups
+    def pairs(groups, keys=None):
+        if keys is not None and left not in keys and right not in keys:
+            return
+        for a in groups.get(left, []):
+            for b in groups.get(right, []):
+                yield a, b
+                yield b, a
+    return pairs
+
+def between_blocks(left, right):
+    def blocks(sizes):
+        n = sizes.get(left, 0) * sizes.get(right, 0)
+        return {(left, right): n, (right, left): n} if n else {}
+    return blocks
+
+RULES = [
+    # 1. SAME FAMILY (Same Last Name)
+    {"type": "SAME_FAMILY", "key": surname_key, "pairs": same_group},
+    # 2. FRIEND (AMI) = Same House
+    {"type": "FRIEND_OF", "key": house_key, "pairs": same_group, "blocks": same_group_blocks, "implicit": True},
+    # 3. ENEMY (ENNEMI) = Gryffindor vs Slytherin
+    {"type": "ENEMY_OF", "key": house_key, "pairs": between("Gryffindor", "Slytherin"),
+     "blocks": between_blocks("Gryffindor", "Slytherin")},
+]
+
+def stored_rules():
+    # The rules whose edges are written
+    return [rule for rule in RULES if not (IMPLICIT_FRIENDS and rule.get("implicit"))]
+
+def group_by(persons, key):
+    groups = defaultdict(set)
+    for p in persons:
+        k = key(p)
+        if k is not None:
+            groups[k].add(p["name"])
+    # Sorted members make pair generation (and edge direction) deterministic
+    return {k: sorted(names) for k, names in groups.items()}
+
+def rule_edges(rule, persons, keys=None):
+    return rule["pairs"](group_by(persons, rule["key"]), keys)
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+# --- CYPHER WRITERS ---
+# Relationship types cannot be parameters, they come from RULES (trusted).
+
+def merge_edges(tx, rel_type, pairs):
+    tx.run(f"""
+        UNWIND $pairs AS pair
+        MATCH (a:Person {{name: pair[0]}})
+        MATCH (b:Person {{name: pair[1]}})
+        MERGE (a)-[:{rel_type}]->(b)
+    """, {"pairs": pairs})
+
+def delete_edges(tx, rel_type, pairs):
+    tx.run(f"""
+        UNWIND $pairs AS pair
+        MATCH (a:Person {{name: pair[0]}})-[r:{rel_type}]->(b:Person {{name: pair[1]}})
+        DELETE r
+    """, {"pairs": pairs})
+
+def fetch_persons(tx):
+    # Registered users only get the links they asked for, never rule edges
+    result = tx.run("""
+        MATCH (p:Person) WHERE coalesce(p.isUser, false) = false
+        RETURN p.name AS name, p.house AS house
+    """)
+    return [r.data() for r in result]
+
+def write_edges(session, rel_type, pairs, batch_size, writer=merge_edges):
+    start = time.perf_counter()
+    written = 0
+    for chunk in batched(pairs, batch_size):
+        session.execute_write(writer, rel_type, chunk)
+        written += len(chunk)
+    elapsed = time.perf_counter() - start
+    rate = written / elapsed if elapsed > 0 else 0
+    print(f"    {rel_type}: {written} edges in {elapsed:.2f}s ({rate:.0f} edges/s)")
+    return written
+
+def apply_rules(session, persons, batch_size, rules=None):
+    total = 0
+    for rule in stored_rules() if rules is None else rules:
+        total += write_edges(session, rule["type"], rule_edges(rule, persons), batch_size)
+    return total
+
+def prune_batch(tx, batch_size):
+    record = tx.run("""
+        MATCH (a:Person)-[r:FRIEND_OF]->(b:Person)
+        WHERE EXISTS { (a)-[:BELONGS_TO]->(h:House)<-[:BELONGS_TO]-(b) WHERE NOT h.name IN $excluded }
+        WITH r LIMIT $limit
+        DELETE r
+        RETURN count(*) AS deleted
+    """, {"excluded": sorted(EXCLUDED_HOUSES), "limit": batch_size}).single()
+    return record["deleted"]
+
+def prune_implied(session, batch_size):
+    # Deletes stored FRIEND_OF edges that the House hub implies, in batches
+    start = time.perf_counter()
+    deleted = 0
+    while True:
+        n = session.execute_write(prune_batch, batch_size)
+        deleted += n
+        if n < batch_size:
+            break
+    print(f"    FRIEND_OF: pruned {deleted} implied edges in {time.perf_counter() - start:.2f}s")
+    return deleted
@@ -0,0 +1,111 @@
+from neo4j import GraphDatabase
+import argparse
+import os
+import time
+
+# --- SCHEMA MIGRATIONS ---
+# Every constraint and index of the graph (and the data fixes they need), as
+# numbered migrations applied in order. The last applied number is kept on
+# (:Meta {name: 'schema'}), next to the graph version node. Statements use IF
+# NOT EXISTS (data fixes only match what is not fixed yet), so a migration
+# that was cut halfway is simply run again. Schema and data changes cannot share a
+# transaction: each statement runs on its own, then the version is recorded.
+# Add a migration by appending to MIGRATIONS, never by editing an applied one.
+#
+# Applied by get_insert.py (every load), bulk_import.py --finish and
+# `python schema.py`; analytics.py and check_plans.py expect the latest
+# version and stop otherwise.
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "testpassword")
+# Seconds to wait for new indexes to come online
+INDEX_TIMEOUT = int(os.getenv("SCHEMA_INDEX_TIMEOUT", "300"))
+
+MIGRATIONS = [
+    (1, "unique person and house names", [
+        "CREATE CONSTRAINT person_name IF NOT EXISTS FOR (p:Person) REQUIRE p.name IS UNIQUE",
+        "CREATE CONSTRAINT house_name IF NOT EXISTS FOR (h:House) REQUIRE h.name IS UNIQUE",
+    ]),
+    (2, "unique graph node ids (Cytoscape element ids)", [
+        "CREATE CONSTRAINT person_id IF NOT EXISTS FOR (p:Person) REQUIRE p.id IS UNIQUE",
+    ]),
+    (3, "house filters (graph views, training, scoring)", [
+        "CREATE RANGE INDEX person_house IF NOT EXISTS FOR (p:Person) ON (p.house)",
+    ]),
+    (4, "name substring search (CONTAINS)", [
+        "CREATE TEXT INDEX person_name_text IF NOT EXISTS FOR (p:Person) ON (p.name)",
+    ]),
+    (5, "analytics scores (analytics.py)", [
+        "CREATE RANGE INDEX person_pagerank IF NOT EXISTS FOR (p:Person) ON (p.pagerank)",
+        "CREATE RANGE INDEX person_community IF NOT EXISTS FOR (p:Person) ON (p.community)",
+    ]),
+    (6, "single graph version node", [
+        "CREATE CONSTRAINT meta_name IF NOT EXISTS FOR (m:Meta) REQUIRE m.name IS UNIQUE",
+    ]),
+    (7, "namespaced user ids (registration.USER_ID_PREFIX)", [
+        # A user's id was its name, which can be the id of a dataset person
+        "MATCH (p:Person) WHERE p.isUser = true AND (p.id IS NULL OR p.id = p.name) SET p.id = 'user:' + p.name",
+    ]),
+]
+LATEST = MIGRATIONS[-1][0]
+
+def read_version(tx):
+    record = tx.run("MATCH (m:Meta {name: 'schema'}) RETURN m.version AS version").single()
+    return record["version"] if record and record["version"] is not None else 0
+
+def write_version(tx, number):
+    tx.run("""
+        MERGE (m:Meta {name: 'schema'})
+        SET m.version = $version, m.migrated_at = datetime()
+    """, {"version": number})
+
+def pending(current, target=LATEST):
+    return [m for m in MIGRATIONS if current < m[0] <= target]
+
+def migrate(session, target=LATEST, log=print):
+    # Applies the migrations after the recorded version; returns the new version
+    current = session.execute_read(read_version)
+    todo = pending(current, target)
+    for number, description, statements in todo:
+        start = time.perf_counter()
+        for statement in statements:
+            session.run(statement).consume()
+        session.execute_write(write_version, number)
+        log(f"  Schema v{number}: {description} ({time.perf_counter() - start:.2f}s)")
+    if todo:
+        session.run("CALL db.awaitIndexes($timeout)", {"timeout": INDEX_TIMEOUT}).consume()
+    return todo[-1][0] if todo else current
+
+def expected_names():
+    # Constraint / index names the migrations create, from their statements
+    return {statement.split(" IF NOT EXISTS")[0].split()[-1]
+            for _, _, statements in MIGRATIONS for statement in statements
+            if statement.startswith("CREATE ")}
+
+def status(session):
+    current = session.execute_read(read_version)
+    names = {r["name"] for r in session.run("SHOW INDEXES YIELD name")}
+    names |= {r["name"] for r in session.run("SHOW CONSTRAINTS YIELD name")}
+    return {
+        "version": current,
+        "latest": LATEST,
+        "pending": [number for number, _, _ in pending(current)],
+        "missing": sorted(expected_names() - names)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply the graph schema migrations")
+    parser.add_argument("--to", type=int, default=LATEST, help="target version")
+    parser.add_argument("--status", action="store_true", help="only show the applied version and missing indexes")
+    args = parser.parse_args()
+
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+    with driver.session() as session:
+        if args.status:
+            state = status(session)
+            print(f"Schema v{state['version']} (latest v{state['latest']}), "
+                  f"pending: {state['pending'] or 'none'}, missing: {', '.join(state['missing']) or 'none'}")
+        else:
+            print(f"✅ Schema at v{migrate(session, args.to)}")
+    driver.close()
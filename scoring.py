@@ -0,0 +1,348 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from neo4j import GraphDatabase
+import numpy as np
+import argparse
+import fcntl
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import feature_store
+import model_registry
+import rules
+
+# --- BULK SCORING ---
+# Scores every Person with the house and survival models and writes the
+# predictions back as p.predicted_house / p.predicted_alive (and p.scored_run):
+# - persons are read in pages of PAGE_SIZE, by keyset on p.name (served by
+#   the person_name constraint index)
+# - house features are the materialised p.house_features (feature_store.py),
+#   computed inline for persons that were never materialised; survival
+#   features are the distinct neighbour counts and the house code, encoded
+#   as /predict_survival does (survival_rows); --check NAME... compares both
+#   for stored persons
+# - pages are scored in worker processes, one vectorised predict per model
+#   and page, while the main process reads the next pages and writes finished
+#   ones back with one UNWIND per page, in page order
+# - after every written page the last name is saved to CHECKPOINT_FILE, with
+#   the progress; --resume (or POST {"resume": true}) continues after it
+# The job opens its own small Bolt pool and does not bump the graph version
+# (predictions are in no cached view), so the online endpoints only see the
+# extra read and write load.
+
+NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "testpassword")
+CHECKPOINT_FILE = os.getenv("SCORING_CHECKPOINT", "scoring_checkpoint.json")
+PAGE_SIZE = int(os.getenv("SCORING_PAGE_SIZE", "5000"))
+WORKERS = int(os.getenv("SCORING_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# A checkpoint not updated for this long belongs to a job that died
+STALE_SECONDS = 120
+
+MODEL_FILE = "house_classifier.pkl"
+ENCODERS_FILE = "encoders.pkl"
+SURVIVAL_MODEL_FILE = "survival_model.pkl"
+SURVIVAL_ENCODER_FILE = "survival_encoder.pkl"
+USE_COMPILED_MODELS = os.getenv("USE_COMPILED_MODELS", "1") == "1"
+SURVIVAL_COLUMNS = ['friends_count', 'enemy_count', 'fam_count', 'house_code']
+SURVIVAL_FALLBACK_HOUSE = 'Gryffindor'
+
+# Survival counts are distinct neighbours, as /predict_survival counts the
+# distinct names of a profile: rule edges are stored in both directions and a
+# registration FRIEND_OF can sit next to a rule one
+PAGE_QUERY = """
+    MATCH (p:Person)
+    WHERE p.name > $after
+    WITH p ORDER BY p.name LIMIT $limit
+""" + feature_store.FRIENDS_CLAUSE + """
+    RETURN p.name AS name, p.house AS house,
+           CASE WHEN p.house_features IS NULL THEN
+""" + feature_store.FEATURES_EXPRESSION + """
+           ELSE p.house_features END AS features,
+           housemates + COUNT {
+               MATCH (p)-[:FRIEND_OF]-(x:Person)
+               WHERE home IS NULL OR NOT (x)-[:BELONGS_TO]->(:House {name: home})
+               RETURN DISTINCT x
+           } AS friends,
+           COUNT { MATCH (p)-[:ENEMY_OF]-(x:Person) RETURN DISTINCT x } AS enemies,
+           COUNT { MATCH (p)-[:SAME_FAMILY]-(x:Person) RETURN DISTINCT x } AS family
+    ORDER BY name
+"""
+
+# The /predict_survival profile of stored persons (--check): neighbour names
+# per relation, with the housemates a House hub implies (IMPLICIT_FRIENDS)
+PROFILE_QUERY = """
+    UNWIND $names AS name
+    MATCH (p:Person {name: name})
+    RETURN p.name AS name, p.house AS house,
+           [(p)-[:FRIEND_OF]-(x:Person) | x.name] +
+           CASE WHEN $implicit THEN [(p)-[:BELONGS_TO]->(h:House)<-[:BELONGS_TO]-(x:Person)
+                                     WHERE NOT h.name IN $excluded AND x <> p | x.name]
+                ELSE [] END AS friends,
+           [(p)-[:ENEMY_OF]-(x:Person) | x.name] AS enemies,
+           [(p)-[:SAME_FAMILY]-(x:Person) | x.name] AS family
+"""
+
+WRITE_QUERY = """
+    UNWIND $rows AS row
+    MATCH (p:Person {name: row.name})
+    SET p.predicted_house = coalesce(row.house, p.predicted_house),
+        p.predicted_alive = coalesce(row.alive, p.predicted_alive),
+        p.scored_run = $run
+"""
+
+def count_persons(tx):
+    return tx.run("MATCH (p:Person) WHERE p.name IS NOT NULL RETURN count(p) AS n").single()["n"]
+
+def read_page(tx, after, limit):
+    # (names, houses, house features, survival counts) or None at the end
+    records = tx.run(PAGE_QUERY, feature_store.query_params(after=after, limit=limit)).data()
+    if not records:
+        return None
+    names = [r["name"] for r in records]
+    houses = np.array([r["house"] or "" for r in records], dtype=object)
+    features = np.array([r["features"] for r in records], dtype=np.int64).reshape(len(records), -1)
+    counts = np.array([[r["friends"], r["enemies"], r["family"]] for r in records], dtype=np.int64)
+    return names, houses, features, counts
+
+def read_named(tx, names):
+    # read_page() rows of the given persons, in name order
+    query = PAGE_QUERY.replace("WHERE p.name > $after", "WHERE p.name IN $names")
+    records = tx.run(query, feature_store.query_params(after="", names=list(names), limit=len(names))).data()
+    return ([r["name"] for r in records],
+            np.array([r["house"] or "" for r in records], dtype=object),
+            np.array([r["features"] for r in records], dtype=np.int64).reshape(len(records), -1),
+            np.array([[r["friends"], r["enemies"], r["family"]] for r in records], dtype=np.int64))
+
+def read_profiles(tx, names):
+    # {name: profile} as a /predict_survival body would describe the person
+    records = tx.run(PROFILE_QUERY, feature_store.query_params(
+        names=list(names), implicit=rules.IMPLICIT_FRIENDS)).data()
+    return {r["name"]: r for r in records}
+
+def write_page(tx, names, houses, alive, run):
+    rows = [{"name": n, "house": h, "alive": a} for n, h, a in zip(names, houses, alive)]
+    tx.run(WRITE_QUERY, {"rows": rows, "run": run}).consume()
+
+# --- WORKERS ---
+
+_registry = None
+
+def init_worker(use_compiled):
+    # Each worker loads both models once
+    global _registry
+    _registry = model_registry.ModelRegistry(check_interval=float('inf'), use_compiled=use_compiled)
+    _registry.register('house', MODEL_FILE, ENCODERS_FILE)
+    _registry.register('survival', SURVIVAL_MODEL_FILE, SURVIVAL_ENCODER_FILE)
+    _registry.warm(background=False)
+
+def score_page(names, houses, features, counts):
+    # A model that is not loaded leaves its prediction as it was (None)
+    house_model = _registry.get('house')
+    survival_model = _registry.get('survival')
+    if house_model is None and survival_model is None:
+        raise RuntimeError("No model loaded")
+    predicted = [None] * len(names)
+    if house_model is not None:
+        predicted = [str(h) for h in house_model.predict(features, feature_store.FEATURE_COLUMNS)]
+    alive = [None] * len(names)
+    if survival_model is not None:
+        rows = survival_rows(counts, houses, survival_model)
+        alive = [bool(a) for a in survival_model.predict(rows, SURVIVAL_COLUMNS)]
+    return names, predicted, alive
+
+def survival_rows(counts, houses, model):
+    # SURVIVAL_COLUMNS rows from (friends, enemies, family) counts and houses;
+    # unknown houses fall back to SURVIVAL_FALLBACK_HOUSE. Shared with
+    # /predict_survival, so both encode the same way.
+    classes = np.asarray(model.encoder_classes)
+    if SURVIVAL_FALLBACK_HOUSE not in classes:
+        raise ValueError(f"Survival encoder has no {SURVIVAL_FALLBACK_HOUSE!r} class to fall back to")
+    houses = np.asarray(houses, dtype=object)
+    houses = np.where(np.isin(houses, classes), houses, SURVIVAL_FALLBACK_HOUSE)
+    codes = np.searchsorted(classes, houses.astype(classes.dtype))
+    return np.column_stack([np.asarray(counts, dtype=np.int64).reshape(len(houses), 3), codes])
+
+def profile_counts(profile):
+    # (friends, enemies, family) of the /predict_survival body a client would
+    # send for the person, each neighbour listed once
+    return tuple(len(set(profile.get(key) or [])) for key in ('friends', 'enemies', 'family'))
+
+# --- CHECKPOINTS ---
+
+def load_checkpoint(path=None):
+    try:
+        with open(path or CHECKPOINT_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(state, path=None):
+    # Written whole and renamed, so readers never see half a file
+    path = path or CHECKPOINT_FILE
+    state["updated_at"] = time.time()
+    with open(path + ".tmp", 'w') as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+def claim(checkpoint_file=None):
+    # Exclusive lock on CHECKPOINT_FILE.lock, held for the whole run: the
+    # check and the claim are one flock() call, so two workers cannot both
+    # start, and the kernel drops the lock of a job that died. The file
+    # descriptor, or None when another job holds it.
+    fd = os.open((checkpoint_file or CHECKPOINT_FILE) + ".lock", os.O_CREAT | os.O_WRONLY, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+def is_running(state):
+    return bool(state and state.get("running") and time.time() - state.get("updated_at", 0) < STALE_SECONDS)
+
+# --- JOB ---
+
+def run(resume=False, page_size=PAGE_SIZE, workers=WORKERS, checkpoint_file=None, log=print):
+    previous = load_checkpoint(checkpoint_file) if resume else None
+    if previous and previous.get("finished_at"):
+        previous = None
+    state = {
+        "run": previous["run"] if previous else time.strftime("%Y%m%dT%H%M%S"),
+        "after": previous["after"] if previous else "",
+        "scored": previous["scored"] if previous else 0,
+        "total": None,
+        "running": True,
+        "started_at": time.time(),
+        "finished_at": None,
+        "rate": 0.0,
+        "error": None
+    }
+    save_checkpoint(state, checkpoint_file)
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), max_connection_pool_size=2)
+    # spawn: the admin endpoint starts the job from a threaded server process
+    context = multiprocessing.get_context("spawn")
+    scored_now = 0
+    try:
+        with driver.session() as session, ProcessPoolExecutor(
+                workers, mp_context=context, initializer=init_worker, initargs=(USE_COMPILED_MODELS,)) as pool:
+            state["total"] = session.execute_read(count_persons)
+            if state["after"]:
+                log(f"🔁 Resuming run {state['run']} after '{state['after']}' ({state['scored']} scored)")
+            after = state["after"]
+            pending = deque()
+            start = time.perf_counter()
+            while True:
+                page = session.execute_read(read_page, after, page_size)
+                if page is not None:
+                    after = page[0][-1]
+                    pending.append(pool.submit(score_page, *page))
+                # Up to two pages per worker in flight, written back in order
+                while pending and (page is None or len(pending) >= 2 * workers):
+                    names, houses, alive = pending.popleft().result()
+                    session.execute_write(write_page, names, houses, alive, state["run"])
+                    scored_now += len(names)
+                    state.update(after=names[-1], scored=state["scored"] + len(names),
+                                 rate=round(scored_now / (time.perf_counter() - start), 1))
+                    save_checkpoint(state, checkpoint_file)
+                    log(f"  Scored {state['scored']}/{state['total']} ({state['rate']}/s)")
+                if page is None:
+                    break
+        state.update(running=False, finished_at=time.time())
+        log(f"✅ Scored {state['scored']} persons (run {state['run']})")
+    except Exception as e:
+        state.update(running=False, error=str(e))
+        log(f"⚠️ Scoring stopped after '{state['after']}': {e}")
+        raise
+    finally:
+        save_checkpoint(state, checkpoint_file)
+        driver.close()
+    return state
+
+class ScoringJob:
+    # Runs the job in a background thread of the web process; the state is
+    # read back from the checkpoint file, so every worker reports the same.
+    # Only the holder of the claim() lock runs, whichever worker it is.
+    def __init__(self, checkpoint_file=None):
+        self.checkpoint_file = checkpoint_file
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def status(self):
+        return load_checkpoint(self.checkpoint_file) or {"running": False}
+
+    def start(self, resume=False, page_size=PAGE_SIZE, workers=WORKERS):
+        # False when a job is already running
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            lock = claim(self.checkpoint_file)
+            if lock is None:
+                return False
+            self._thread = threading.Thread(target=self._run, args=(lock, resume, page_size, workers),
+                                            name="bulk-scoring", daemon=True)
+            self._thread.start()
+            return True
+
+    def _run(self, lock, resume, page_size, workers):
+        try:
+            run(resume, page_size, workers, self.checkpoint_file)
+        except Exception:
+            pass  # recorded in the checkpoint
+        finally:
+            os.close(lock)
+
+# --- PARITY CHECK ---
+
+def check(names, log=print):
+    # Survival counts and prediction of the job against /predict_survival for
+    # the same stored persons (their profile read from the graph). Number of
+    # persons that differ.
+    init_worker(USE_COMPILED_MODELS)
+    survival_model = _registry.get('survival')
+    if survival_model is None:
+        raise RuntimeError("Survival model not loaded")
+    names = sorted(set(names))
+    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD), max_connection_pool_size=1)
+    try:
+        with driver.session() as session:
+            page = session.execute_read(read_named, names)
+            profiles = session.execute_read(read_profiles, names)
+    finally:
+        driver.close()
+    for name in sorted(set(names) - set(page[0])):
+        log(f"  ?  {name}: no such person")
+    if not page[0]:
+        return 0
+    _, _, alive = score_page(*page)
+    mismatches = 0
+    for name, counts, job_alive in zip(page[0], page[3], alive):
+        profile = profiles[name]
+        online = profile_counts(profile)
+        rows = survival_rows([online], [profile["house"] or ""], survival_model)
+        online_alive = bool(survival_model.predict(rows, SURVIVAL_COLUMNS)[0])
+        job = tuple(int(c) for c in counts)
+        if job == online and job_alive == online_alive:
+            log(f"  ✓  {name}: {job}, alive={job_alive}")
+        else:
+            mismatches += 1
+            log(f"  ✗  {name}: job {job}, alive={job_alive} / online {online}, alive={online_alive}")
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every Person with the house and survival models")
+    parser.add_argument("--resume", action="store_true", help=f"continue after the last page in {CHECKPOINT_FILE}")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="persons per page")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="scoring processes")
+    parser.add_argument("--check", nargs='+', metavar="NAME",
+                        help="compare the job's survival inputs and prediction with /predict_survival, score nothing")
+    args = parser.parse_args()
+
+    if args.check:
+        raise SystemExit(1 if check(args.check) else 0)
+    if claim() is None:
+        raise SystemExit(f"✗ A scoring job is already running ({CHECKPOINT_FILE}.lock)")
+    run(resume=args.resume, page_size=args.page_size, workers=args.workers)
@@ -0,0 +1,184 @@
+from bisect import bisect_left
+from collections import defaultdict
+import threading
+
+# --- NAME SEARCH INDEX ---
+# In-memory index over Person names (and their aliases) answering autocomplete
+# without touching Neo4j. Results are ranked in tiers:
+#   1. prefix of the full name or alias
+#   2. prefix of a later word ("pot" -> "Harry Potter")
+#   3. substring anywhere (found through the n-gram postings)
+#   4. fuzzy: trigram similarity above FUZZY_THRESHOLD (typos)
+# Inside a tier, more central persons (p.pagerank, analytics.py) come first,
+# then shorter names, then alphabetical order.
+
+FUZZY_THRESHOLD = 0.3
+
+def normalize(text):
+    return " ".join((text or "").lower().split())
+
+def grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def fuzzy_grams(text):
+    # Padded trigrams so word boundaries still count
+    return grams(f" {text} ", 3)
+
+class NameIndex:
+    def __init__(self, entries=()):
+        # entries: iterable of (name, aliases, pagerank or None)
+        self.names = []
+        self.pagerank = []
+        self.keys = []                    # (normalized key, name id), one per name/alias
+        self.starts = []                  # (text from a word start, key id, word position)
+        self.postings = defaultdict(set)  # 1..3-gram -> key ids
+        self.fuzzy = defaultdict(set)     # padded trigram -> fuzzy entry ids
+        self.fuzzy_entries = []           # (key id, number of padded trigrams)
+        seen = set()
+        for name, aliases, pagerank in entries:
+            if not name or name in seen:
+                continue
+            seen.add(name)
+            name_id = len(self.names)
+            self.names.append(name)
+            self.pagerank.append(pagerank or 0.0)
+            for key in {normalize(name), *(normalize(a) for a in aliases or [])}:
+                if key:
+                    self._add_key(key, name_id)
+        self.starts.sort()
+        self.sorted_names = [self.names[i] for i in sorted(range(len(self.names)),
+                                                           key=lambda i: (-self.pagerank[i], self.names[i]))]
+
+    def _add_key(self, key, name_id):
+        key_id = len(self.keys)
+        self.keys.append((key, name_id))
+        pos = 0
+        for word in key.split(' '):
+            self.starts.append((key[pos:], key_id, pos))
+            pos += len(word) + 1
+        for n in (1, 2, 3):
+            for g in grams(key, n):
+                self.postings[g].add(key_id)
+        # Whole key and each word, so a typo in one word of a long name still scores
+        words = key.split(' ')
+        for text in [key] + (words if len(words) > 1 else []):
+            text_grams = fuzzy_grams(text)
+            entry_id = len(self.fuzzy_entries)
+            self.fuzzy_entries.append((key_id, len(text_grams)))
+            for g in text_grams:
+                self.fuzzy[g].add(entry_id)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _prefix(self, q):
+        # Bisect over word starts: full-name prefixes (tier 0) and word prefixes (tier 1)
+        i = bisect_left(self.starts, (q,))
+        while i < len(self.starts) and self.starts[i][0].startswith(q):
+            _, key_id, pos = self.starts[i]
+            yield key_id, (0 if pos == 0 else 1)
+            i += 1
+
+    def _substring(self, q):
+        if len(q) <= 3:
+            return self.postings.get(q, set())
+        candidates = None
+        for g in grams(q, 3):
+            posting = self.postings.get(g)
+            if not posting:
+                return set()
+            candidates = set(posting) if candidates is None else candidates & posting
+        return {k for k in candidates if q in self.keys[k][0]}
+
+    def _fuzzy(self, q):
+        q_grams = fuzzy_grams(q)
+        overlap = defaultdict(int)
+        for g in q_grams:
+            for entry_id in self.fuzzy.get(g, ()):
+                overlap[entry_id] += 1
+        scores = {}
+        for entry_id, shared in overlap.items():
+            key_id, size = self.fuzzy_entries[entry_id]
+            score = 2.0 * shared / (len(q_grams) + size)
+            if score >= FUZZY_THRESHOLD and score > scores.get(key_id, 0.0):
+                scores[key_id] = score
+        return scores
+
+    def search(self, q, limit=10):
+        q = normalize(q)
+        if not q:
+            return self.sorted_names[:limit]
+
+        ranked = {}  # name id -> (tier, score, -pagerank, len, name)
+        def offer(key_id, rank):
+            name_id = self.keys[key_id][1]
+            name = self.names[name_id]
+            entry = rank + (-self.pagerank[name_id], len(name), name)
+            if name_id not in ranked or entry < ranked[name_id]:
+                ranked[name_id] = entry
+
+        # Lower tiers are only scanned when the better ones cannot fill the limit
+        for key_id, tier in self._prefix(q):
+            offer(key_id, (tier, 0.0))
+        if len(ranked) < limit:
+            for key_id in self._substring(q):
+                offer(key_id, (2, 0.0))
+        if len(ranked) < limit:
+            for key_id, score in self._fuzzy(q).items():
+                offer(key_id, (3, -score))
+
+        best = sorted(ranked.items(), key=lambda item: item[1])[:limit]
+        return [self.names[name_id] for name_id, _ in best]
+
+# --- INDEX LIFECYCLE ---
+
+def fetch_names(tx):
+    result = tx.run("""
+        MATCH (p:Person)
+        RETURN p.name AS name, p.alternate_names AS aliases, p.pagerank AS pagerank
+    """)
+    return [(r["name"], r["aliases"], r["pagerank"]) for r in result]
+
+class SearchIndex:
+    # Holds the current NameIndex and rebuilds it when the graph version moves.
+    # The new index is built aside and swapped in with one assignment, so
+    # concurrent searches always see a complete index.
+
+    def __init__(self, driver, version):
+        self.driver = driver
+        self.version = version
+        self.index = None
+        self.built_version = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            version = self.version.current()
+            if self.index is not None and version == self.built_version:
+                return self.index
+            with self.driver.session() as session:
+                entries = session.execute_read(fetch_names)
+            self.index = NameIndex(entries)
+            self.built_version = version
+            print(f"🔎 Search index built: {len(self.index)} names (graph v{version})")
+            return self.index
+
+    def warm(self, background=True):
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Search index not built yet: {e}")
+        if background:
+            threading.Thread(target=run, name="search-warmup", daemon=True).start()
+        else:
+            run()
+
+    def search(self, q, limit=10):
+        index = self.index
+        if index is None:
+            index = self.refresh()
+        elif self.version.current() != self.built_version and not self._lock.locked():
+            # Keep answering from the previous index while the new one is built
+            threading.Thread(target=self.refresh, daemon=True).start()
+        return index.search(q, limit)
@@ -1,79 +1,43 @@
 import pandas as pd
-from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.utils import resample
 from neo4j import GraphDatabase
+import argparse
 import pickle
 import os
 
+import feature_store
+
 MODEL_FILE = "house_classifier.pkl"
 NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "testpassword")
 
-def fetch_graph_data():
-    print("Fetching training data from Neo4j...")
-    driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
-    
-    query = """
-    MATCH (p:Person)
-    WHERE p.house IN ['Gryffindor', 'Slytherin', 'Ravenclaw', 'Hufflepuff']
-    
-    // Friends
-    OPTIONAL MATCH (p)-[:FRIEND_OF]-(f:Person)
-    WITH p, 
-         sum(CASE WHEN f.house='Gryffindor' THEN 1 ELSE 0 END) as friend_g,
-         sum(CASE WHEN f.house='Slytherin' THEN 1 ELSE 0 END) as friend_s,
-         sum(CASE WHEN f.house='Ravenclaw' THEN 1 ELSE 0 END) as friend_r,
-         sum(CASE WHEN f.house='Hufflepuff' THEN 1 ELSE 0 END) as friend_h
-
-    // Enemies
-    OPTIONAL MATCH (p)-[:ENEMY_OF]-(e:Person)
-    WITH p, friend_g, friend_s, friend_r, friend_h,
-         sum(CASE WHEN e.house='Gryffindor' THEN 1 ELSE 0 END) as enemy_g,
-         sum(CASE WHEN e.house='Slytherin' THEN 1 ELSE 0 END) as enemy_s,
-         sum(CASE WHEN e.house='Ravenclaw' THEN 1 ELSE 0 END) as enemy_r,
-         sum(CASE WHEN e.house='Hufflepuff' THEN 1 ELSE 0 END) as enemy_h
-         
-    // Family
-    OPTIONAL MATCH (p)-[:SAME_FAMILY]-(fam:Person)
-    WITH p, friend_g, friend_s, friend_r, friend_h, enemy_g, enemy_s, enemy_r, enemy_h,
-         sum(CASE WHEN fam.house='Gryffindor' THEN 1 ELSE 0 END) as fam_g,
-         sum(CASE WHEN fam.house='Slytherin' THEN 1 ELSE 0 END) as fam_s,
-         sum(CASE WHEN fam.house='Ravenclaw' THEN 1 ELSE 0 END) as fam_r,
-         sum(CASE WHEN fam.house='Hufflepuff' THEN 1 ELSE 0 END) as fam_h
+def fetch_graph_data(from_file=False):
+    # Features are read from the materialised store (see feature_store.py):
+    # one scan of p.house_features, or the exported .npz file.
+    if from_file:
+        print(f"Loading training data from {feature_store.FEATURES_FILE}...")
+        names, houses, X = feature_store.load_file()
+    else:
+        print("Fetching training data from Neo4j...")
+        driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
+        with driver.session() as session:
+            names, houses, X = session.execute_read(feature_store.read_matrix)
+            if len(X) == 0:
+                print("⚠️ Feature store empty, materialising now...")
+                feature_store.materialise_all(session)
+                names, houses, X = session.execute_read(feature_store.read_matrix)
+        driver.close()
 
-    // Romance (Weighted highly?)
-    OPTIONAL MATCH (p)-[:ROMANTIC_WITH]-(r:Person)
-    WITH p, friend_g, friend_s, friend_r, friend_h, enemy_g, enemy_s, enemy_r, enemy_h, fam_g, fam_s, fam_r, fam_h,
-         sum(CASE WHEN r.house='Gryffindor' THEN 1 ELSE 0 END) as love_g,
-         sum(CASE WHEN r.house='Slytherin' THEN 1 ELSE 0 END) as love_s,
-         sum(CASE WHEN r.house='Ravenclaw' THEN 1 ELSE 0 END) as love_r,
-         sum(CASE WHEN r.house='Hufflepuff' THEN 1 ELSE 0 END) as love_h
-         
-    RETURN p.name as name, p.house as house,
-           friend_g, friend_s, friend_r, friend_h,
-           enemy_g, enemy_s, enemy_r, enemy_h,
-           fam_g, fam_s, fam_r, fam_h,
-           love_g, love_s, love_r, love_h
-    """
-    
-    with driver.session() as session:
-        result = session.run(query)
-        data = [r.data() for r in result]
-        
-    driver.close()
-    return pd.DataFrame(data)
+    df = pd.DataFrame(X, columns=feature_store.FEATURE_COLUMNS)
+    df.insert(0, 'house', houses)
+    df.insert(0, 'name', names)
+    return df
 
-def train_balanced_model():
-    df = fetch_graph_data()
+def train_balanced_model(from_file=False):
+    df = fetch_graph_data(from_file)
     
-    features = [
-        'friend_g', 'friend_s', 'friend_r', 'friend_h',
-        'enemy_g', 'enemy_s', 'enemy_r', 'enemy_h',
-        'fam_g', 'fam_s', 'fam_r', 'fam_h',
-        'love_g', 'love_s', 'love_r', 'love_h'
-    ]
+    features = feature_store.FEATURE_COLUMNS
     
     # Filter to meaningful data
     df['total'] = df[features].sum(axis=1)
@@ -101,4 +65,8 @@ def train_balanced_model():
         pickle.dump(clf, f)
 
 if __name__ == "__main__":
-    train_balanced_model()
+    parser = argparse.ArgumentParser(description="Train the house classifier")
+    parser.add_argument("--from-file", action="store_true",
+                        help=f"train from the exported feature file ({feature_store.FEATURES_FILE})")
+    args = parser.parse_args()
+    train_balanced_model(args.from_file)